@@ -1,9 +1,19 @@
+import asyncio
 import json
+import uuid
+from contextlib import aclosing
+from datetime import datetime
+from typing import Literal
 
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from api.deps import get_current_user
+from core.chat_store import enqueue_message, flush_messages, reply_message_id
+from core.chat_streams import ChatStream, StreamEvent, get_stream, start_stream
+from core.persona_cache import get_system_prompt
+from core.streaming import StreamSender
 from core.supabase_client import get_supabase
 from core.graph import stream_chat
 
@@ -26,6 +36,17 @@ class MessageResponse(BaseModel):
     created_at: str
 
 
+class MessagePage(BaseModel):
+    items: list[MessageResponse]
+    next_cursor: str | None = None
+
+
+class ChatStreamRequest(BaseModel):
+    persona_id: str
+    content: str
+    client_message_id: str | None = None
+
+
 @router.post("/api/chat/thread", response_model=ThreadResponse, status_code=201)
 async def find_or_create_thread(
     body: ThreadCreate,
@@ -44,7 +65,6 @@ async def find_or_create_thread(
         .execute()
     )
     if not persona.data:
-        from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Persona not found")
 
     # 기존 스레드 조회
@@ -68,36 +88,91 @@ async def find_or_create_thread(
     return result.data[0]
 
 
-@router.get("/api/chat/thread/{thread_id}/messages", response_model=list[MessageResponse])
-async def get_thread_messages(
-    thread_id: str,
-    user: dict = Depends(get_current_user),
-):
-    """스레드의 메시지 목록 반환. 소유권 확인 후 created_at 순 정렬."""
-    sb = get_supabase()
-
-    # 스레드 소유권 확인
+def _verify_thread(sb, thread_id: str, user_id: str) -> None:
+    """스레드 소유권 검증. 실패 시 404."""
     thread = (
         sb.table("chat_threads")
         .select("id")
         .eq("id", thread_id)
-        .eq("user_id", user["id"])
+        .eq("user_id", user_id)
         .limit(1)
         .execute()
     )
     if not thread.data:
-        from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Thread not found")
 
-    result = (
+
+MESSAGE_PAGE_MAX = 100
+
+
+def _message_cursor(message: dict) -> str:
+    return f"{message['created_at']}|{message['id']}"
+
+
+def _past_cursor(query, cursor: str, op: Literal["lt", "gt"]):
+    """(created_at, id) 커서 이후 행만 조회 (같은 시각 메시지도 id로 구분).
+
+    id 없이 created_at만 넘겨도 됨 (클라이언트가 가진 마지막 메시지 시각).
+    """
+    created_at, _, message_id = cursor.partition("|")
+    try:
+        datetime.fromisoformat(created_at)
+        if message_id:
+            uuid.UUID(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not message_id:
+        return getattr(query, op)("created_at", created_at)
+    return query.or_(
+        f'created_at.{op}."{created_at}",'
+        f'and(created_at.eq."{created_at}",id.{op}.{message_id})'
+    )
+
+
+@router.get("/api/chat/thread/{thread_id}/messages", response_model=MessagePage)
+async def get_thread_messages(
+    thread_id: str,
+    user: dict = Depends(get_current_user),
+    limit: int = Query(default=50, ge=1, le=MESSAGE_PAGE_MAX),
+    before: str | None = Query(default=None),
+    since: str | None = Query(default=None),
+):
+    """스레드 메시지 페이지 ((created_at, id) keyset 페이지네이션).
+
+    기본/before: 최신순으로 limit개, next_cursor를 before로 넘기면 이전 페이지.
+    since: 재연결 시 delta 모드. 해당 커서(또는 시각) 이후 메시지를 오래된 순으로,
+    남은 게 있으면 next_cursor를 다음 since로 사용.
+    """
+    if before and since:
+        raise HTTPException(status_code=400, detail="Use either before or since")
+
+    sb = get_supabase()
+    _verify_thread(sb, thread_id, user["id"])
+
+    # 아직 버퍼에 있는 메시지까지 포함되도록 먼저 저장
+    await flush_messages()
+
+    query = (
         sb.table("chat_messages")
         .select("id, role, content, created_at")
         .eq("thread_id", thread_id)
-        .order("created_at", desc=False)
-        .execute()
+        .order("created_at", desc=since is None)
+        .order("id", desc=since is None)
+        .limit(limit + 1)  # 다음 페이지 존재 여부 확인용 +1
     )
+    if before:
+        query = _past_cursor(query, before, "lt")
+    if since:
+        query = _past_cursor(query, since, "gt")
+
+    messages = query.execute().data
 
-    return result.data
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = _message_cursor(messages[-1])
+
+    return MessagePage(items=messages, next_cursor=next_cursor)
 
 
 async def _authenticate_ws(websocket: WebSocket) -> dict | None:
@@ -113,8 +188,99 @@ async def _authenticate_ws(websocket: WebSocket) -> dict | None:
         return None
 
 
+# 생성 중 쌓아둘 수 있는 다음 메시지 수
+MAX_QUEUED_TURNS = 4
+
+
+async def _stream_reply(
+    websocket: WebSocket,
+    thread_id: str,
+    system_prompt: str,
+    content: str,
+    client_message_id: str,
+    persona_id: str | None = None,
+    user_id: str | None = None,
+) -> None:
+    """LLM 응답 스트리밍 + 저장. 취소되면 LLM 호출도 함께 중단하고 부분 응답 저장."""
+    # 토큰 청크는 짧은 윈도우로 묶어서 전송
+    sender = StreamSender(websocket.send_text)
+    try:
+        async with aclosing(stream_chat(
+            system_prompt=system_prompt,
+            user_message=content,
+            thread_id=thread_id,
+            client_message_id=client_message_id,
+            persona_id=persona_id,
+            user_id=user_id,
+        )) as chunks:
+            async for chunk in chunks:
+                sender.push(chunk)
+        full_response = await sender.finish()
+    except asyncio.CancelledError:
+        # 중단 전까지 생성된 부분은 전송 후 저장 (사용자가 본 내용과 기록 일치)
+        try:
+            partial = await sender.finish()
+        except Exception:
+            partial = sender.text
+            await sender.aclose()
+        if partial:
+            enqueue_message(thread_id, "assistant", partial, reply_message_id(client_message_id))
+        raise
+    except BaseException:
+        await sender.aclose()
+        raise
+
+    # 어시스턴트 응답 저장 (유저 메시지 id에서 파생 → 재시도에도 한 번만)
+    enqueue_message(thread_id, "assistant", full_response, reply_message_id(client_message_id))
+
+    # 완료 신호
+    await websocket.send_text(json.dumps({"type": "stream", "content": "", "done": True}))
+
+
+async def _handle_turn(websocket: WebSocket, sb, user: dict, thread_id: str, data: dict) -> None:
+    """메시지 한 건 처리: 검증 → 페르소나 조회 → 유저 메시지 저장 → 응답 스트리밍."""
+    persona_id = data.get("persona_id")
+    content = data.get("content", "")
+
+    if not persona_id or not content:
+        await websocket.send_text(
+            json.dumps({"type": "error", "content": "persona_id and content required"})
+        )
+        return
+
+    # 페르소나 system prompt (프로세스 캐시, 수정/삭제 시 무효화)
+    system_prompt = get_system_prompt(sb, persona_id, user["id"])
+    if system_prompt is None:
+        await websocket.send_text(
+            json.dumps({"type": "error", "content": "Persona not found"})
+        )
+        return
+
+    # 유저 메시지는 write-behind 버퍼로 저장 (생성 시작을 기다리게 하지 않음)
+    client_message_id = enqueue_message(
+        thread_id, "user", content, data.get("client_message_id")
+    )
+
+    try:
+        await _stream_reply(
+            websocket, thread_id, system_prompt, content, client_message_id, persona_id, user["id"],
+        )
+    except (asyncio.CancelledError, WebSocketDisconnect):
+        raise
+    except Exception as e:
+        await websocket.send_text(
+            json.dumps({"type": "error", "content": f"LLM error: {str(e)}"})
+        )
+
+
 @router.websocket("/ws/chat/{thread_id}")
 async def websocket_chat(websocket: WebSocket, thread_id: str):
+    """채팅 WebSocket.
+
+    수신(reader)과 응답 생성(turn runner)을 분리: 생성 중에도 메시지를 계속 읽고,
+    {"type": "stop"} 또는 연결 종료 시 진행 중인 생성을 취소 (LLM 호출까지 중단).
+    생성 중 도착한 메시지는 순서대로 다음 턴으로 처리.
+    """
     user = await _authenticate_ws(websocket)
     if not user:
         await websocket.close(code=4001, reason="Unauthorized")
@@ -123,69 +289,198 @@ async def websocket_chat(websocket: WebSocket, thread_id: str):
     await websocket.accept()
     sb = get_supabase()
 
+    turns: asyncio.Queue[dict] = asyncio.Queue(maxsize=MAX_QUEUED_TURNS)
+    current: asyncio.Task | None = None
+
+    async def run_turns() -> None:
+        nonlocal current
+        while True:
+            data = await turns.get()
+            current = asyncio.create_task(_handle_turn(websocket, sb, user, thread_id, data))
+            try:
+                await current
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise  # 연결 종료로 runner 자체가 취소됨
+                # stop 요청: 중단된 턴 완료 신호
+                await websocket.send_text(
+                    json.dumps({"type": "stream", "content": "", "done": True, "stopped": True})
+                )
+            finally:
+                current = None
+
+    runner = asyncio.create_task(run_turns())
     try:
         while True:
             raw = await websocket.receive_text()
             data = json.loads(raw)
-            persona_id = data.get("persona_id")
-            content = data.get("content", "")
 
-            if not persona_id or not content:
-                await websocket.send_text(
-                    json.dumps({"type": "error", "content": "persona_id and content required"})
-                )
-                continue
-
-            # 페르소나 조회
-            persona = (
-                sb.table("personas")
-                .select("system_prompt")
-                .eq("id", persona_id)
-                .eq("user_id", user["id"])
-                .limit(1)
-                .execute()
-            )
-            if not persona.data:
-                await websocket.send_text(
-                    json.dumps({"type": "error", "content": "Persona not found"})
-                )
+            if data.get("type") == "stop":
+                # 대기 중인 턴 폐기 + 진행 중인 생성 취소
+                while not turns.empty():
+                    turns.get_nowait()
+                if current is not None and not current.done():
+                    current.cancel()
                 continue
 
-            # 유저 메시지 DB 저장
-            sb.table("chat_messages").insert({
-                "thread_id": thread_id,
-                "role": "user",
-                "content": content,
-            }).execute()
-
-            # LangGraph 스트리밍 응답
+            if runner.done():
+                break  # 전송 실패 등으로 runner 종료 → 연결 정리
             try:
-                full_response = ""
-                async for chunk in stream_chat(
-                    system_prompt=persona.data[0]["system_prompt"],
-                    user_message=content,
-                    thread_id=thread_id,
-                ):
-                    full_response += chunk
-                    await websocket.send_text(
-                        json.dumps({"type": "stream", "content": chunk, "done": False})
-                    )
-
-                # 완료 신호
+                turns.put_nowait(data)
+            except asyncio.QueueFull:
                 await websocket.send_text(
-                    json.dumps({"type": "stream", "content": "", "done": True})
-                )
-
-                # 어시스턴트 응답 DB 저장
-                sb.table("chat_messages").insert({
-                    "thread_id": thread_id,
-                    "role": "assistant",
-                    "content": full_response,
-                }).execute()
-            except Exception as e:
-                await websocket.send_text(
-                    json.dumps({"type": "error", "content": f"LLM error: {str(e)}"})
+                    json.dumps({"type": "error", "content": "Too many pending messages"})
                 )
 
     except WebSocketDisconnect:
         pass
+    finally:
+        # 연결 종료 시 진행 중인 생성 취소 (고아 completion 방지) 후 남은 메시지 저장
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        await flush_messages()
+
+
+# --- SSE ---
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # 프록시 버퍼링 끄기
+}
+SSE_RETRY_MS = 2000
+
+
+def _format_sse(batch: list[StreamEvent]) -> str:
+    """이벤트 배치를 SSE 형식 한 덩어리로 (느린 클라이언트는 큰 배치로 묶여 전송)."""
+    return "".join(
+        f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        for event_id, event, data in batch
+    )
+
+
+def _parse_last_event_id(value: str | None) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+
+def _sse_response(stream: ChatStream, after: int) -> StreamingResponse:
+    async def body():
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        async for batch in stream.follow(after):
+            yield _format_sse(batch)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Stream-Id": stream.id},
+    )
+
+
+async def _generate_sse_reply(
+    stream: ChatStream,
+    system_prompt: str,
+    content: str,
+    client_message_id: str,
+    persona_id: str,
+) -> None:
+    """SSE 스트림용 응답 생성: 청크마다 delta 이벤트, 끝나면 done/stopped/error."""
+    parts: list[str] = []
+    try:
+        async with aclosing(stream_chat(
+            system_prompt=system_prompt,
+            user_message=content,
+            thread_id=stream.thread_id,
+            client_message_id=client_message_id,
+            persona_id=persona_id,
+            user_id=stream.user_id,
+        )) as chunks:
+            async for chunk in chunks:
+                parts.append(chunk)
+                stream.append("delta", {"content": chunk})
+    except asyncio.CancelledError:
+        # 중단/이탈: 생성된 부분까지만 저장
+        if parts:
+            enqueue_message(
+                stream.thread_id, "assistant", "".join(parts), reply_message_id(client_message_id)
+            )
+        stream.append("stopped", {"content": ""})
+        raise
+    except Exception as e:
+        stream.append("error", {"content": f"LLM error: {str(e)}"})
+        return
+
+    enqueue_message(
+        stream.thread_id, "assistant", "".join(parts), reply_message_id(client_message_id)
+    )
+    stream.append("done", {"content": ""})
+
+
+@router.post("/api/chat/thread/{thread_id}/stream")
+async def stream_thread_message(
+    thread_id: str,
+    body: ChatStreamRequest,
+    user: dict = Depends(get_current_user),
+    last_event_id: str | None = Header(default=None),
+):
+    """SSE 채팅: 메시지를 보내고 응답을 text/event-stream으로 수신.
+
+    스트림 id는 client_message_id (없으면 생성, X-Stream-Id 헤더로 반환).
+    같은 client_message_id로 재요청하면 새로 생성하지 않고 Last-Event-ID 이후부터 이어받음.
+    """
+    if not body.content:
+        raise HTTPException(status_code=400, detail="content required")
+
+    stream_id = body.client_message_id or str(uuid.uuid4())
+    existing = get_stream(user["id"], stream_id)
+    if existing is not None:
+        if existing.thread_id != thread_id:
+            raise HTTPException(status_code=409, detail="client_message_id already in use")
+        return _sse_response(existing, _parse_last_event_id(last_event_id))
+
+    sb = get_supabase()
+    _verify_thread(sb, thread_id, user["id"])
+    system_prompt = get_system_prompt(sb, body.persona_id, user["id"])
+    if system_prompt is None:
+        raise HTTPException(status_code=404, detail="Persona not found")
+
+    client_message_id = enqueue_message(thread_id, "user", body.content, stream_id)
+    stream = start_stream(
+        stream_id,
+        thread_id,
+        user["id"],
+        lambda s: _generate_sse_reply(
+            s, system_prompt, body.content, client_message_id, body.persona_id,
+        ),
+    )
+    return _sse_response(stream, 0)
+
+
+@router.get("/api/chat/stream/{stream_id}")
+async def resume_stream(
+    stream_id: str,
+    user: dict = Depends(get_current_user),
+    last_event_id: str | None = Header(default=None),
+):
+    """끊긴 SSE 스트림 재연결: Last-Event-ID 이후 이벤트를 재전송하고 이어서 수신.
+
+    다른 워커에서 생성된 스트림이거나 만료되면 404 → 메시지 기록으로 대체.
+    """
+    stream = get_stream(user["id"], stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return _sse_response(stream, _parse_last_event_id(last_event_id))
+
+
+@router.post("/api/chat/stream/{stream_id}/stop", status_code=202)
+async def stop_stream(
+    stream_id: str,
+    user: dict = Depends(get_current_user),
+):
+    """진행 중인 SSE 응답 생성 중단."""
+    stream = get_stream(user["id"], stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    stream.cancel()
+    return {"stopped": not stream.done}
@@ -1,18 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 
 from api.deps import get_current_user
+from core.follow_graph import get_follow_suggestions
+from core.image_derivatives import AVATAR_SIZE, variant_url
 from core.supabase_client import get_supabase
 from models.schemas import (
     FollowCreate,
     FollowResponse,
+    FollowSuggestion,
     PersonaProfileResponse,
     PostPersona,
 )
 
 router = APIRouter(prefix="/api/sns", tags=["follow"])
 
-STORAGE_BUCKET = "persona-images"
-
 
 def _verify_persona_ownership(sb, persona_id: str, user_id: str) -> None:
     """페르소나 소유권 검증."""
@@ -33,15 +34,15 @@ def _get_profile_image(sb, persona_id: str) -> str | None:
     try:
         result = (
             sb.table("persona_images")
-            .select("file_path")
+            .select("file_path, variants")
             .eq("persona_id", persona_id)
             .eq("is_profile", True)
             .limit(1)
             .execute()
         )
         if result.data:
-            return sb.storage.from_(STORAGE_BUCKET).get_public_url(
-                result.data[0]["file_path"]
+            return variant_url(
+                sb, result.data[0]["file_path"], result.data[0].get("variants"), AVATAR_SIZE
             )
     except Exception:
         pass
@@ -147,14 +148,14 @@ async def get_followers(
     try:
         img_result = (
             sb.table("persona_images")
-            .select("persona_id, file_path")
+            .select("persona_id, file_path, variants")
             .in_("persona_id", persona_ids)
             .eq("is_profile", True)
             .execute()
         )
         image_map = {
-            row["persona_id"]: sb.storage.from_(STORAGE_BUCKET).get_public_url(
-                row["file_path"]
+            row["persona_id"]: variant_url(
+                sb, row["file_path"], row.get("variants"), AVATAR_SIZE
             )
             for row in img_result.data
         }
@@ -195,14 +196,14 @@ async def get_following(
     try:
         img_result = (
             sb.table("persona_images")
-            .select("persona_id, file_path")
+            .select("persona_id, file_path, variants")
             .in_("persona_id", persona_ids)
             .eq("is_profile", True)
             .execute()
         )
         image_map = {
-            row["persona_id"]: sb.storage.from_(STORAGE_BUCKET).get_public_url(
-                row["file_path"]
+            row["persona_id"]: variant_url(
+                sb, row["file_path"], row.get("variants"), AVATAR_SIZE
             )
             for row in img_result.data
         }
@@ -219,6 +220,67 @@ async def get_following(
     ]
 
 
+@router.get("/persona/{persona_id}/suggestions", response_model=list[FollowSuggestion])
+async def get_follow_suggestions_for_persona(
+    persona_id: str,
+    limit: int = Query(default=10, ge=1, le=50),
+    user: dict = Depends(get_current_user),
+):
+    """팔로우 추천 (친구의 친구, 주기적으로 미리 계산된 결과)."""
+    sb = get_supabase()
+
+    # 마지막 계산 이후 팔로우한 페르소나는 제외
+    follows = (
+        sb.table("sns_follows")
+        .select("following_id")
+        .eq("follower_id", persona_id)
+        .execute()
+    )
+    following_ids = {f["following_id"] for f in follows.data}
+    suggestions = get_follow_suggestions(sb, persona_id, following_ids)[:limit]
+    if not suggestions:
+        return []
+
+    persona_ids = [s["id"] for s in suggestions]
+    personas = (
+        sb.table("personas")
+        .select("id, name")
+        .in_("id", persona_ids)
+        .execute()
+    )
+    name_map = {p["id"]: p["name"] for p in personas.data}
+
+    image_map: dict[str, str] = {}
+    try:
+        img_result = (
+            sb.table("persona_images")
+            .select("persona_id, file_path, variants")
+            .in_("persona_id", persona_ids)
+            .eq("is_profile", True)
+            .execute()
+        )
+        image_map = {
+            row["persona_id"]: variant_url(
+                sb, row["file_path"], row.get("variants"), AVATAR_SIZE
+            )
+            for row in img_result.data
+        }
+    except Exception:
+        pass
+
+    # 삭제된 페르소나는 건너뜀
+    return [
+        FollowSuggestion(
+            id=s["id"],
+            name=name_map[s["id"]],
+            profile_image_url=image_map.get(s["id"]),
+            score=s["score"],
+        )
+        for s in suggestions
+        if s["id"] in name_map
+    ]
+
+
 # --- Profile ---
 
 
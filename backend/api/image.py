@@ -1,14 +1,15 @@
 import logging
-import os
-import uuid
 
-import httpx
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from openai import OpenAI
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
 from pydantic import BaseModel
 
 from api.deps import get_current_user
-from core.image_gen import generate_lora_image, upload_image_to_storage
+from core.dispatcher import QueueFullError
+from core.image_derivatives import attach_derivatives, variant_url
+from core.image_gen import EmptyGenerationError, generate_image_to_storage
+from core.image_store import release_images
+from core.openai_client import OpenAITimeoutError
+from core.storage import ImageTooLargeError
 from core.supabase_client import get_supabase
 
 logger = logging.getLogger(__name__)
@@ -30,6 +31,7 @@ class ImageResponse(BaseModel):
     is_profile: bool
     created_at: str
     url: str
+    thumbnail_url: str | None = None
 
 
 def _image_url(file_path: str) -> str:
@@ -38,9 +40,11 @@ def _image_url(file_path: str) -> str:
 
 
 def _row_to_response(row: dict) -> ImageResponse:
+    variants = row.get("variants")
     return ImageResponse(
         **row,
         url=_image_url(row["file_path"]),
+        thumbnail_url=variant_url(get_supabase(), row["file_path"], variants, "md") if variants else None,
     )
 
 
@@ -59,54 +63,54 @@ def _get_persona(sb, persona_id: str, user_id: str) -> dict:
     return result.data[0]
 
 
-async def _generate_with_lora(persona: dict, prompt: str) -> str:
-    """LoRA 모델로 이미지 생성 후 Storage에 업로드. file_path 반환."""
+def _busy(e: QueueFullError) -> HTTPException:
+    """생성 큐 포화 시 503 + Retry-After."""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+
+async def _generate_with_lora(persona: dict, prompt: str) -> dict:
+    """LoRA 모델로 이미지 생성 후 Storage에 업로드. 업로드 결과 반환."""
     trigger = persona["lora_trigger_word"]
     # 프롬프트에 trigger word가 없으면 앞에 자동 삽입
     if trigger and trigger not in prompt:
         prompt = f"{trigger} {prompt}"
 
-    image_urls = await generate_lora_image(
-        lora_model=persona["lora_model_id"],
-        prompt=prompt,
-    )
-    if not image_urls:
-        raise HTTPException(status_code=502, detail="LoRA image generation returned no results")
-
-    result = await upload_image_to_storage(
-        image_url=image_urls[0],
-        persona_id=persona["id"],
-        user_id=persona["user_id"],
-    )
-    return result["file_path"]
+    try:
+        return await generate_image_to_storage(
+            prompt=prompt,
+            persona_id=persona["id"],
+            user_id=persona["user_id"],
+            lora_weights=persona["lora_model_id"],
+        )
+    except QueueFullError as e:
+        raise _busy(e)
+    except EmptyGenerationError as e:
+        raise HTTPException(status_code=502, detail=str(e))
 
 
-async def _generate_with_dalle(prompt: str) -> bytes:
-    """DALL-E로 이미지 생성. 이미지 바이트 반환."""
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+async def _generate_with_dalle(persona: dict, prompt: str) -> dict:
+    """DALL-E로 이미지 생성 후 Storage에 스트리밍 업로드. 업로드 결과 반환."""
     try:
-        result = client.images.generate(
-            model="dall-e-3",
+        return await generate_image_to_storage(
             prompt=prompt,
-            size="1024x1024",
-            n=1,
+            persona_id=persona["id"],
+            user_id=persona["user_id"],
         )
+    except QueueFullError as e:
+        raise _busy(e)
+    except OpenAITimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Image generation failed: {e}")
 
-    image_url = result.data[0].url
-
-    async with httpx.AsyncClient() as http:
-        resp = await http.get(image_url)
-        if resp.status_code != 200:
-            raise HTTPException(status_code=502, detail="Failed to download generated image")
-        return resp.content
-
 
 @router.post("/generate", response_model=ImageResponse, status_code=status.HTTP_201_CREATED)
 async def generate_image(
     persona_id: str,
     body: ImageGenerateRequest,
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user),
 ):
     sb = get_supabase()
@@ -115,9 +119,9 @@ async def generate_image(
     use_lora = persona.get("lora_status") == "ready" and persona.get("lora_model_id")
 
     if use_lora:
-        # LoRA 모델로 이미지 생성 + Storage 업로드 (image_gen 모듈 사용)
+        # LoRA 모델로 이미지 생성 + Storage 업로드 (동일 요청은 병합/캐시)
         try:
-            file_name = await _generate_with_lora(persona, body.prompt)
+            uploaded = await _generate_with_lora(persona, body.prompt)
         except HTTPException:
             raise
         except Exception as e:
@@ -126,16 +130,7 @@ async def generate_image(
 
     if not use_lora:
         # DALL-E 폴백
-        image_bytes = await _generate_with_dalle(body.prompt)
-
-        file_id = str(uuid.uuid4())
-        file_name = f"images/{file_id}.png"
-
-        sb.storage.from_(BUCKET).upload(
-            path=file_name,
-            file=image_bytes,
-            file_options={"content-type": "image/png", "upsert": "false"},
-        )
+        uploaded = await _generate_with_dalle(persona, body.prompt)
 
     # 기존 프로필 이미지 존재 여부 확인
     existing = (
@@ -152,11 +147,21 @@ async def generate_image(
     row = {
         "persona_id": persona_id,
         "user_id": user["id"],
-        "file_path": file_name,
+        "file_path": uploaded["file_path"],
         "prompt": body.prompt,
         "is_profile": is_profile,
     }
+    # 중복 blob이면 기존 썸네일 재사용
+    if uploaded.get("variants"):
+        row["variants"] = uploaded["variants"]
     insert_result = sb.table("persona_images").insert(row).execute()
+
+    # 썸네일 파생본 생성 (백그라운드)
+    if not uploaded.get("variants"):
+        background_tasks.add_task(
+            attach_derivatives,
+            "persona_images", "variants", insert_result.data[0]["id"], uploaded["file_path"],
+        )
     return _row_to_response(insert_result.data[0])
 
 
@@ -237,12 +242,15 @@ async def delete_image(
 
     was_profile = target.data[0]["is_profile"]
     file_path = target.data[0]["file_path"]
+    variants = target.data[0].get("variants")
 
     # DB 삭제
     sb.table("persona_images").delete().eq("id", image_id).execute()
 
-    # Supabase Storage에서 삭제
-    sb.storage.from_(BUCKET).remove([file_path])
+    # Supabase Storage에서 삭제 (다른 곳에서 참조하지 않는 blob만)
+    removable = release_images(sb, [(file_path, variants)])
+    if removable:
+        sb.storage.from_(BUCKET).remove(removable)
 
     # 프로필이었으면 다른 이미지를 자동 승격
     if was_profile:
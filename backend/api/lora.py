@@ -68,7 +68,9 @@ async def _build_training_zip(sb, persona_id: str) -> bytes:
         .eq("persona_id", persona_id)
         .execute()
     )
-    if not images.data or len(images.data) < 3:
+    # 같은 blob을 공유하는 이미지는 한 번만 다운로드 (content-addressed 경로)
+    file_paths = list(dict.fromkeys(row["file_path"] for row in images.data))
+    if len(file_paths) < 3:
         raise HTTPException(
             status_code=400,
             detail="At least 3 images are required to start LoRA training",
@@ -77,11 +79,11 @@ async def _build_training_zip(sb, persona_id: str) -> bytes:
     buf = io.BytesIO()
     async with httpx.AsyncClient() as http:
         with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-            for i, row in enumerate(images.data):
-                url = sb.storage.from_(BUCKET).get_public_url(row["file_path"])
+            for i, file_path in enumerate(file_paths):
+                url = sb.storage.from_(BUCKET).get_public_url(file_path)
                 resp = await http.get(url)
                 if resp.status_code == 200:
-                    ext = row["file_path"].rsplit(".", 1)[-1] if "." in row["file_path"] else "png"
+                    ext = file_path.rsplit(".", 1)[-1] if "." in file_path else "png"
                     zf.writestr(f"image_{i:03d}.{ext}", resp.content)
     buf.seek(0)
     return buf.read()
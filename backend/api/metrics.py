@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+
+from api.deps import get_current_user
+from core.budget import budget_metrics
+from core.chat_store import chat_store_metrics
+from core.dispatcher import dispatcher_metrics
+from core.llm_metrics import llm_metrics
+from core.usage import usage_metrics
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("/generation")
+async def generation_metrics(user: dict = Depends(get_current_user)):
+    """이미지 생성 큐 상태: provider/priority별 대기, 처리량, 거절, 대기 시간."""
+    return dispatcher_metrics()
+
+
+@router.get("/llm")
+async def llm_call_metrics(user: dict = Depends(get_current_user)):
+    """모델 티어별 LLM 호출 수, 지연 시간, 토큰 사용량, 프롬프트 캐시 적중."""
+    return llm_metrics()
+
+
+@router.get("/chat-store")
+async def chat_store_state(user: dict = Depends(get_current_user)):
+    """채팅 메시지 write-behind 버퍼: 대기 행 수, 배치 저장 수, 실패/유실 수."""
+    return chat_store_metrics()
+
+
+@router.get("/usage")
+async def llm_usage_state(user: dict = Depends(get_current_user)):
+    """LLM 사용량 집계 버퍼: 미저장 버킷/행 수, 저장 수, 실패/유실 수."""
+    return usage_metrics()
+
+
+@router.get("/budget")
+async def activity_budget_state(user: dict = Depends(get_current_user)):
+    """자동 활동 예산: 허용/저하/건너뜀 수, 백오프 중인 페르소나 수, 시간당 한도."""
+    return budget_metrics()
@@ -1,17 +1,25 @@
 import json
-import os
+import time
+from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from openai import OpenAI
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
 
 from api.deps import get_current_user
+from core.image_derivatives import AVATAR_SIZE, variant_url
+from core.image_store import release_images
+from core.openai_client import OpenAITimeoutError, call_openai
+from core.persona_cache import invalidate_system_prompt
+from core.persona_index import index_persona, remove_persona
+from core.search_index import index_document, remove_document
 from core.supabase_client import get_supabase
+from core.usage import flush_usage, record_usage, summarize_usage
 from models.schemas import (
     PersonaCreate,
     PersonaGenerate,
     PersonaGenerateResponse,
     PersonaUpdate,
     PersonaResponse,
+    PersonaUsageResponse,
 )
 
 router = APIRouter(prefix="/api/persona", tags=["persona"])
@@ -27,20 +35,32 @@ PERSONA_GENERATE_SYSTEM_PROMPT = """You are a creative AI persona designer. Give
 
 Respond ONLY with a valid JSON object. Use the same language as the user's input."""
 
+PERSONA_GENERATE_MODEL = "gpt-4o-mini"
+
 
 @router.post("/generate", response_model=PersonaGenerateResponse)
 async def generate_persona(
     body: PersonaGenerate,
     user: dict = Depends(get_current_user),
 ):
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": PERSONA_GENERATE_SYSTEM_PROMPT},
-            {"role": "user", "content": body.prompt},
-        ],
+    started = time.monotonic()
+    try:
+        response = await call_openai(
+            "persona_generate",
+            lambda client: client.chat.completions.create(
+                model=PERSONA_GENERATE_MODEL,
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": PERSONA_GENERATE_SYSTEM_PROMPT},
+                    {"role": "user", "content": body.prompt},
+                ],
+            ),
+        )
+    except OpenAITimeoutError as e:
+        record_usage("persona_gen", PERSONA_GENERATE_MODEL, started, user_id=user["id"], error=True)
+        raise HTTPException(status_code=504, detail=str(e))
+    record_usage(
+        "persona_gen", PERSONA_GENERATE_MODEL, started, user_id=user["id"], usage=response.usage,
     )
     data = json.loads(response.choices[0].message.content)
     return PersonaGenerateResponse(**data)
@@ -51,14 +71,15 @@ def _attach_profile_image(sb, persona: dict) -> dict:
     try:
         result = (
             sb.table("persona_images")
-            .select("file_path")
+            .select("file_path, variants")
             .eq("persona_id", persona["id"])
             .eq("is_profile", True)
             .limit(1)
             .execute()
         )
         if result.data:
-            persona["profile_image_url"] = sb.storage.from_(STORAGE_BUCKET).get_public_url(result.data[0]["file_path"])
+            row = result.data[0]
+            persona["profile_image_url"] = variant_url(sb, row["file_path"], row.get("variants"), AVATAR_SIZE)
     except Exception:
         pass
     return persona
@@ -72,13 +93,13 @@ def _attach_profile_images(sb, personas: list[dict]) -> list[dict]:
         persona_ids = [p["id"] for p in personas]
         result = (
             sb.table("persona_images")
-            .select("persona_id, file_path")
+            .select("persona_id, file_path, variants")
             .in_("persona_id", persona_ids)
             .eq("is_profile", True)
             .execute()
         )
         image_map = {
-            row["persona_id"]: sb.storage.from_(STORAGE_BUCKET).get_public_url(row["file_path"])
+            row["persona_id"]: variant_url(sb, row["file_path"], row.get("variants"), AVATAR_SIZE)
             for row in result.data
         }
         for p in personas:
@@ -108,6 +129,7 @@ def _build_system_prompt(data: dict) -> str:
 @router.post("", response_model=PersonaResponse, status_code=status.HTTP_201_CREATED)
 async def create_persona(
     body: PersonaCreate,
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user),
 ):
     sb = get_supabase()
@@ -116,12 +138,15 @@ async def create_persona(
     row["system_prompt"] = _build_system_prompt(row)
 
     result = sb.table("personas").insert(row).execute()
+    index_document("persona", result.data[0])
+    # 팔로우 후보 검색용 임베딩은 응답 후 계산
+    background_tasks.add_task(index_persona, result.data[0])
     return _attach_profile_image(sb, result.data[0])
 
 
 PERSONA_LIST_COLUMNS = (
     "id, user_id, name, personality, speaking_style, background, created_at, "
-    "persona_images(file_path)"
+    "persona_images(file_path, variants)"
 )
 
 
@@ -139,7 +164,7 @@ async def list_personas(user: dict = Depends(get_current_user)):
     for p in result.data:
         images = p.pop("persona_images", [])
         if images:
-            p["profile_image_url"] = sb.storage.from_(STORAGE_BUCKET).get_public_url(images[0]["file_path"])
+            p["profile_image_url"] = variant_url(sb, images[0]["file_path"], images[0].get("variants"), AVATAR_SIZE)
     return result.data
 
 
@@ -162,10 +187,44 @@ async def get_persona(
     return _attach_profile_image(sb, result.data[0])
 
 
+@router.get("/{persona_id}/usage", response_model=PersonaUsageResponse)
+async def get_persona_usage(
+    persona_id: str,
+    days: int = Query(default=7, ge=1, le=90),
+    user: dict = Depends(get_current_user),
+):
+    """페르소나의 LLM 사용량 (최근 days일): 기능/모델별 토큰, 캐시 토큰, 지연 시간."""
+    sb = get_supabase()
+    owned = (
+        sb.table("personas")
+        .select("id")
+        .eq("id", persona_id)
+        .eq("user_id", user["id"])
+        .limit(1)
+        .execute()
+    )
+    if not owned.data:
+        raise HTTPException(status_code=404, detail="Persona not found")
+
+    # 메모리에 집계 중인 사용량까지 포함
+    await flush_usage()
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    rows = (
+        sb.table("llm_usage")
+        .select("*")
+        .eq("persona_id", persona_id)
+        .gte("period_start", since)
+        .execute()
+        .data
+    )
+    return PersonaUsageResponse(persona_id=persona_id, since=since, items=summarize_usage(rows))
+
+
 @router.put("/{persona_id}", response_model=PersonaResponse)
 async def update_persona(
     persona_id: str,
     body: PersonaUpdate,
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user),
 ):
     sb = get_supabase()
@@ -196,6 +255,10 @@ async def update_persona(
         .eq("id", persona_id)
         .execute()
     )
+    invalidate_system_prompt(persona_id)
+    index_document("persona", result.data[0])
+    if "personality" in updates or "background" in updates:
+        background_tasks.add_task(index_persona, result.data[0])
     return _attach_profile_image(sb, result.data[0])
 
 
@@ -221,25 +284,29 @@ async def delete_persona(
     # Storage: 페르소나 이미지 삭제
     images = (
         sb.table("persona_images")
-        .select("file_path")
+        .select("file_path, variants")
         .eq("persona_id", persona_id)
         .execute()
     )
     if images.data:
-        paths = [img["file_path"] for img in images.data]
-        sb.storage.from_(STORAGE_BUCKET).remove(paths)
+        paths = release_images(sb, [(img["file_path"], img.get("variants")) for img in images.data])
+        if paths:
+            sb.storage.from_(STORAGE_BUCKET).remove(paths)
 
     # Storage: SNS 포스트 이미지 삭제 (CASCADE 전에 처리)
     posts = (
         sb.table("sns_posts")
-        .select("image_file_path")
+        .select("image_file_path, image_variants")
         .eq("persona_id", persona_id)
         .not_.is_("image_file_path", "null")
         .execute()
     )
     if posts.data:
-        post_paths = [p["image_file_path"] for p in posts.data]
-        sb.storage.from_(STORAGE_BUCKET).remove(post_paths)
+        post_paths = release_images(
+            sb, [(p["image_file_path"], p.get("image_variants")) for p in posts.data]
+        )
+        if post_paths:
+            sb.storage.from_(STORAGE_BUCKET).remove(post_paths)
 
     # Storage: LoRA 트레이닝 ZIP 삭제
     lora_files = sb.storage.from_(STORAGE_BUCKET).list(f"lora-training/{persona_id}")
@@ -248,4 +315,7 @@ async def delete_persona(
         sb.storage.from_(STORAGE_BUCKET).remove(lora_paths)
 
     sb.table("personas").delete().eq("id", persona_id).execute()
+    invalidate_system_prompt(persona_id)
+    remove_persona(persona_id)
+    remove_document("persona", persona_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
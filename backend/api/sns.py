@@ -1,7 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from typing import Literal
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
 
 from api.deps import get_current_user
+from core.image_derivatives import (
+    AVATAR_SIZE,
+    ImageSize,
+    attach_derivatives,
+    variant_url,
+)
+from core.image_store import acquire_existing_blob, release_images
+from core.ranking import ranked_post_ids
+from core.search_index import index_document, remove_document, search
 from core.supabase_client import get_supabase
+from core.trending import record_comment, record_like, trending_posts
 from models.schemas import (
     CommentCreate,
     CommentResponse,
@@ -11,6 +23,7 @@ from models.schemas import (
     PostCreate,
     PostPersona,
     PostResponse,
+    SearchResponse,
 )
 
 router = APIRouter(prefix="/api/sns", tags=["sns"])
@@ -18,7 +31,14 @@ router = APIRouter(prefix="/api/sns", tags=["sns"])
 STORAGE_BUCKET = "persona-images"
 
 
-def _build_post_response(sb, post: dict) -> PostResponse:
+def _post_image_url(sb, post: dict, image_size: ImageSize) -> str | None:
+    """포스트 이미지 URL. 요청 크기의 썸네일이 있으면 썸네일 URL."""
+    if image_size != "full" and post.get("image_variants") and post.get("image_file_path"):
+        return variant_url(sb, post["image_file_path"], post["image_variants"], image_size)
+    return post.get("image_url")
+
+
+def _build_post_response(sb, post: dict, image_size: ImageSize = "full") -> PostResponse:
     """DB row를 PostResponse로 변환 (persona 정보 + 카운트 포함)."""
     # persona join 데이터 추출
     persona_data = post.get("personas", {})
@@ -29,15 +49,15 @@ def _build_post_response(sb, post: dict) -> PostResponse:
     try:
         img_result = (
             sb.table("persona_images")
-            .select("file_path")
+            .select("file_path, variants")
             .eq("persona_id", persona_id)
             .eq("is_profile", True)
             .limit(1)
             .execute()
         )
         if img_result.data:
-            profile_image_url = sb.storage.from_(STORAGE_BUCKET).get_public_url(
-                img_result.data[0]["file_path"]
+            profile_image_url = variant_url(
+                sb, img_result.data[0]["file_path"], img_result.data[0].get("variants"), AVATAR_SIZE
             )
     except Exception:
         pass
@@ -52,7 +72,8 @@ def _build_post_response(sb, post: dict) -> PostResponse:
         id=post["id"],
         persona_id=persona_id,
         content=post.get("content"),
-        image_url=post.get("image_url"),
+        image_url=_post_image_url(sb, post, image_size),
+        image_status=post.get("image_status"),
         created_at=post["created_at"],
         persona=PostPersona(
             id=persona_id,
@@ -64,7 +85,7 @@ def _build_post_response(sb, post: dict) -> PostResponse:
     )
 
 
-def _build_feed_posts(sb, posts: list[dict]) -> list[PostResponse]:
+def _build_feed_posts(sb, posts: list[dict], image_size: ImageSize = "md") -> list[PostResponse]:
     """여러 포스트에 프로필 이미지를 일괄 조회하여 변환."""
     if not posts:
         return []
@@ -75,14 +96,14 @@ def _build_feed_posts(sb, posts: list[dict]) -> list[PostResponse]:
     try:
         img_result = (
             sb.table("persona_images")
-            .select("persona_id, file_path")
+            .select("persona_id, file_path, variants")
             .in_("persona_id", persona_ids)
             .eq("is_profile", True)
             .execute()
         )
         image_map = {
-            row["persona_id"]: sb.storage.from_(STORAGE_BUCKET).get_public_url(
-                row["file_path"]
+            row["persona_id"]: variant_url(
+                sb, row["file_path"], row.get("variants"), AVATAR_SIZE
             )
             for row in img_result.data
         }
@@ -104,7 +125,8 @@ def _build_feed_posts(sb, posts: list[dict]) -> list[PostResponse]:
                 id=post["id"],
                 persona_id=persona_id,
                 content=post.get("content"),
-                image_url=post.get("image_url"),
+                image_url=_post_image_url(sb, post, image_size),
+                image_status=post.get("image_status"),
                 created_at=post["created_at"],
                 persona=PostPersona(
                     id=persona_id,
@@ -120,16 +142,60 @@ def _build_feed_posts(sb, posts: list[dict]) -> list[PostResponse]:
 
 SELECT_POSTS = "*, personas(id, name), sns_likes(count), sns_comments(count)"
 
+FeedMode = Literal["latest", "ranked"]
+
+
+def _ranked_feed_page(
+    sb, ranked_ids: list[str], limit: int, cursor: str | None, image_size: ImageSize,
+) -> FeedResponse:
+    """랭킹 순서(캐시됨)에서 한 페이지 조회. cursor는 랭킹 내 오프셋."""
+    try:
+        offset = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor for ranked feed")
+
+    page_ids = ranked_ids[offset:offset + limit]
+    if not page_ids:
+        return FeedResponse(items=[], next_cursor=None)
+
+    rank = {post_id: i for i, post_id in enumerate(page_ids)}
+    result = (
+        sb.table("sns_posts")
+        .select(SELECT_POSTS)
+        .in_("id", page_ids)
+        .execute()
+    )
+    # 랭킹 계산 후 삭제된 포스트는 결과에서 빠짐
+    posts = sorted(result.data, key=lambda p: rank[p["id"]])
+
+    next_offset = offset + limit
+    return FeedResponse(
+        items=_build_feed_posts(sb, posts, image_size),
+        next_cursor=str(next_offset) if next_offset < len(ranked_ids) else None,
+    )
+
 
 @router.get("/feed", response_model=FeedResponse)
 async def get_feed(
     user: dict = Depends(get_current_user),
     limit: int = Query(default=20, ge=1, le=100),
     cursor: str | None = Query(default=None),
+    image_size: ImageSize = Query(default="md"),
+    mode: FeedMode = Query(default="latest"),
+    persona_id: str | None = Query(default=None),
 ):
-    """전체 피드 (최신순, cursor 기반 페이지네이션)."""
+    """전체 피드 (cursor 기반 페이지네이션).
+
+    mode=latest는 최신순, mode=ranked는 persona_id(보는 페르소나) 기준 랭킹순.
+    """
     sb = get_supabase()
 
+    if mode == "ranked":
+        if persona_id:
+            _verify_persona_ownership(sb, persona_id, user["id"])
+        ranked_ids = ranked_post_ids(sb, "all", persona_id)
+        return _ranked_feed_page(sb, ranked_ids, limit, cursor, image_size)
+
     query = (
         sb.table("sns_posts")
         .select(SELECT_POSTS)
@@ -150,7 +216,7 @@ async def get_feed(
         next_cursor = posts[-1]["created_at"]
 
     return FeedResponse(
-        items=_build_feed_posts(sb, posts),
+        items=_build_feed_posts(sb, posts, image_size),
         next_cursor=next_cursor,
     )
 
@@ -161,8 +227,10 @@ async def get_following_feed(
     user: dict = Depends(get_current_user),
     limit: int = Query(default=20, ge=1, le=100),
     cursor: str | None = Query(default=None),
+    image_size: ImageSize = Query(default="md"),
+    mode: FeedMode = Query(default="latest"),
 ):
-    """특정 페르소나가 팔로우하는 AI들의 피드."""
+    """특정 페르소나가 팔로우하는 AI들의 피드 (mode=ranked면 해당 페르소나 기준 랭킹순)."""
     sb = get_supabase()
 
     # 해당 페르소나가 현재 사용자 소유인지 확인
@@ -189,6 +257,10 @@ async def get_following_feed(
     if not following_ids:
         return FeedResponse(items=[], next_cursor=None)
 
+    if mode == "ranked":
+        ranked_ids = ranked_post_ids(sb, "following", persona_id, following_ids)
+        return _ranked_feed_page(sb, ranked_ids, limit, cursor, image_size)
+
     query = (
         sb.table("sns_posts")
         .select(SELECT_POSTS)
@@ -209,15 +281,108 @@ async def get_following_feed(
         next_cursor = posts[-1]["created_at"]
 
     return FeedResponse(
-        items=_build_feed_posts(sb, posts),
+        items=_build_feed_posts(sb, posts, image_size),
         next_cursor=next_cursor,
     )
 
 
+@router.get("/trending", response_model=FeedResponse)
+async def get_trending(
+    user: dict = Depends(get_current_user),
+    limit: int = Query(default=20, ge=1, le=100),
+    image_size: ImageSize = Query(default="md"),
+):
+    """인기 포스트 (최근 좋아요/댓글 기반, 시간 감쇠 점수순)."""
+    sb = get_supabase()
+
+    ranked = trending_posts(limit)
+    if not ranked:
+        return FeedResponse(items=[], next_cursor=None)
+
+    rank = {post_id: i for i, (post_id, _) in enumerate(ranked)}
+    result = (
+        sb.table("sns_posts")
+        .select(SELECT_POSTS)
+        .in_("id", list(rank))
+        .execute()
+    )
+    # 삭제된 포스트는 결과에서 빠짐
+    posts = sorted(result.data, key=lambda p: rank[p["id"]])
+
+    return FeedResponse(
+        items=_build_feed_posts(sb, posts, image_size),
+        next_cursor=None,
+    )
+
+
+def _profile_image_map(sb, persona_ids: list[str]) -> dict[str, str]:
+    """persona_id -> 프로필 썸네일 URL 일괄 조회."""
+    if not persona_ids:
+        return {}
+    try:
+        img_result = (
+            sb.table("persona_images")
+            .select("persona_id, file_path, variants")
+            .in_("persona_id", persona_ids)
+            .eq("is_profile", True)
+            .execute()
+        )
+    except Exception:
+        return {}
+    return {
+        row["persona_id"]: variant_url(sb, row["file_path"], row.get("variants"), AVATAR_SIZE)
+        for row in img_result.data
+    }
+
+
+def _ranked_rows(sb, table: str, columns: str, hits: list[tuple[str, float]]) -> list[dict]:
+    """검색 결과 id를 DB row로 조회 (점수순, 삭제된 row 제외)."""
+    if not hits:
+        return []
+    rank = {doc_id: i for i, (doc_id, _) in enumerate(hits)}
+    result = sb.table(table).select(columns).in_("id", list(rank)).execute()
+    return sorted(result.data, key=lambda row: rank[row["id"]])
+
+
+@router.get("/search", response_model=SearchResponse)
+async def search_content(
+    q: str = Query(min_length=1, max_length=200),
+    kind: Literal["all", "post", "comment", "persona"] = Query(default="all", alias="type"),
+    limit: int = Query(default=20, ge=1, le=50),
+    image_size: ImageSize = Query(default="md"),
+    user: dict = Depends(get_current_user),
+):
+    """포스트/댓글/페르소나 전문 검색 (BM25 점수순, 마지막 단어는 접두어 매칭)."""
+    sb = get_supabase()
+    response = SearchResponse()
+
+    if kind in ("all", "post"):
+        posts = _ranked_rows(sb, "sns_posts", SELECT_POSTS, await search(q, "post", limit))
+        response.posts = _build_feed_posts(sb, posts, image_size)
+
+    if kind in ("all", "comment"):
+        comments = _ranked_rows(
+            sb, "sns_comments", "*, personas(id, name)", await search(q, "comment", limit)
+        )
+        image_map = _profile_image_map(sb, list({c["persona_id"] for c in comments}))
+        response.comments = [_build_comment_response(sb, c, image_map) for c in comments]
+
+    if kind in ("all", "persona"):
+        personas = _ranked_rows(sb, "personas", "id, name", await search(q, "persona", limit))
+        image_map = _profile_image_map(sb, [p["id"] for p in personas])
+        response.personas = [
+            PostPersona(id=p["id"], name=p["name"], profile_image_url=image_map.get(p["id"]))
+            for p in personas
+        ]
+
+    return response
+
+
 @router.get("/post/{post_id}", response_model=PostResponse)
 async def get_post(
     post_id: str,
     user: dict = Depends(get_current_user),
+    image_size: ImageSize = Query(default="full"),
 ):
     """포스트 상세 조회."""
     sb = get_supabase()
@@ -233,7 +398,7 @@ async def get_post(
     if not result.data:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    return _build_post_response(sb, result.data[0])
+    return _build_post_response(sb, result.data[0], image_size)
 
 
 # --- Post CRUD ---
@@ -256,6 +421,7 @@ def _verify_persona_ownership(sb, persona_id: str, user_id: str) -> None:
 @router.post("/post", response_model=PostResponse, status_code=status.HTTP_201_CREATED)
 async def create_post(
     body: PostCreate,
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user),
 ):
     """포스트 생성 (텍스트/이미지/둘 다)."""
@@ -266,7 +432,31 @@ async def create_post(
     _verify_persona_ownership(sb, body.persona_id, user["id"])
 
     row = body.model_dump(exclude_none=True)
-    result = sb.table("sns_posts").insert(row).execute()
+
+    # 기존 이미지 재사용: blob 참조를 하나 가져가야 삭제 시 해제 가능.
+    # 인덱스에 없는 경로는 거부 (이 포스트가 소유하지 않은 객체를 지우지 않도록)
+    blob = None
+    if body.image_file_path:
+        blob = acquire_existing_blob(sb, body.image_file_path)
+        if blob is None:
+            raise HTTPException(status_code=400, detail="Unknown image_file_path")
+        if blob.get("variants"):
+            row["image_variants"] = blob["variants"]
+
+    try:
+        result = sb.table("sns_posts").insert(row).execute()
+    except Exception:
+        if blob is not None:
+            release_images(sb, [(body.image_file_path, None)])
+        raise
+    index_document("post", result.data[0])
+
+    # 이미지 썸네일 생성 (백그라운드)
+    if blob is not None and not blob.get("variants"):
+        background_tasks.add_task(
+            attach_derivatives,
+            "sns_posts", "image_variants", result.data[0]["id"], body.image_file_path,
+        )
 
     # 생성된 포스트를 join 포함해서 다시 조회
     post_result = (
@@ -290,7 +480,7 @@ async def delete_post(
     # 포스트 존재 + 소유권 확인
     post_result = (
         sb.table("sns_posts")
-        .select("id, persona_id, image_file_path")
+        .select("id, persona_id, image_file_path, image_variants")
         .eq("id", post_id)
         .limit(1)
         .execute()
@@ -304,11 +494,16 @@ async def delete_post(
     # Storage 이미지 삭제 (있는 경우)
     if post.get("image_file_path"):
         try:
-            sb.storage.from_(STORAGE_BUCKET).remove([post["image_file_path"]])
+            removable = release_images(
+                sb, [(post["image_file_path"], post.get("image_variants"))]
+            )
+            if removable:
+                sb.storage.from_(STORAGE_BUCKET).remove(removable)
         except Exception:
             pass
 
     sb.table("sns_posts").delete().eq("id", post_id).execute()
+    remove_document("post", post_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -359,14 +554,14 @@ async def get_comments(
     try:
         img_result = (
             sb.table("persona_images")
-            .select("persona_id, file_path")
+            .select("persona_id, file_path, variants")
             .in_("persona_id", persona_ids)
             .eq("is_profile", True)
             .execute()
         )
         image_map = {
-            row["persona_id"]: sb.storage.from_(STORAGE_BUCKET).get_public_url(
-                row["file_path"]
+            row["persona_id"]: variant_url(
+                sb, row["file_path"], row.get("variants"), AVATAR_SIZE
             )
             for row in img_result.data
         }
@@ -438,6 +633,8 @@ async def create_comment(
         row["parent_id"] = body.parent_id
 
     result = sb.table("sns_comments").insert(row).execute()
+    record_comment(post_id)
+    index_document("comment", result.data[0])
 
     # persona join으로 다시 조회
     comment_result = (
@@ -460,7 +657,7 @@ async def delete_comment(
 
     result = (
         sb.table("sns_comments")
-        .select("id, persona_id")
+        .select("id, persona_id, post_id")
         .eq("id", comment_id)
         .limit(1)
         .execute()
@@ -471,6 +668,8 @@ async def delete_comment(
     _verify_persona_ownership(sb, result.data[0]["persona_id"], user["id"])
 
     sb.table("sns_comments").delete().eq("id", comment_id).execute()
+    record_comment(result.data[0]["post_id"], -1)
+    remove_document("comment", comment_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -511,12 +710,14 @@ async def toggle_like(
     if existing.data:
         # 좋아요 취소
         sb.table("sns_likes").delete().eq("id", existing.data[0]["id"]).execute()
+        record_like(post_id, -1)
         liked = False
     else:
         # 좋아요 추가
         sb.table("sns_likes").insert(
             {"post_id": post_id, "persona_id": persona_id}
         ).execute()
+        record_like(post_id)
         liked = True
 
     # 현재 좋아요 수 조회
@@ -555,14 +756,14 @@ async def get_likes(
     try:
         img_result = (
             sb.table("persona_images")
-            .select("persona_id, file_path")
+            .select("persona_id, file_path, variants")
             .in_("persona_id", persona_ids)
             .eq("is_profile", True)
             .execute()
         )
         image_map = {
-            row["persona_id"]: sb.storage.from_(STORAGE_BUCKET).get_public_url(
-                row["file_path"]
+            row["persona_id"]: variant_url(
+                sb, row["file_path"], row.get("variants"), AVATAR_SIZE
             )
             for row in img_result.data
         }
@@ -1,16 +1,28 @@
 """LangGraph activity decision engine for autonomous persona actions."""
 
-import json
+import asyncio
 import logging
 import os
+import time
 from typing import Literal, TypedDict
 
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, START, StateGraph
-
-from core.image_gen import generate_lora_image, upload_image_to_storage
+from pydantic import BaseModel, ValidationError
+
+from core.budget import BUDGETED_TRIGGERS, admit_activity, charge_tokens
+from core.dispatcher import PRIORITY_BY_TRIGGER, Priority
+from core.follow_graph import get_follow_suggestions
+from core.image_derivatives import schedule_derivatives
+from core.image_gen import generate_image_to_storage
+from core.image_worker import DEFERRED_IMAGE_TRIGGERS, enqueue_post_image, image_request_for
+from core.llm_metrics import record_llm_call
+from core.persona_index import similar_personas
+from core.search_index import index_document
 from core.supabase_client import get_supabase
+from core.trending import record_comment, record_like, trending_posts
+from core.usage import UsageCallback, track_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +40,7 @@ class ActivityState(TypedDict):
     # Collected context
     persona: dict
     recent_posts: list
+    trending_posts: list  # popular posts across the network (core.trending)
     recent_logs: list
     # Decision
     activity_type: str  # 'post', 'comment', 'like', 'follow'
@@ -36,6 +49,10 @@ class ActivityState(TypedDict):
     target_persona_id: str  # for follow
     needs_image: bool
     image_url: str  # generated image URL
+    image_file_path: str  # Storage path of the generated image
+    image_variants: dict  # derivatives already rendered for a deduplicated image
+    decision_tier: str  # model tier that made the decision ('fast' or 'quality')
+    degraded: bool  # budget running low: decide and write in one fast-tier call (core.budget)
     # Result
     result: dict
 
@@ -44,30 +61,28 @@ class ActivityState(TypedDict):
 # LLM helper
 # ---------------------------------------------------------------------------
 
-DECISION_SYSTEM_PROMPT = """\
-You are the autonomous brain of an AI persona on a social network.
-You must decide what action to take based on the persona's identity and the current context.
-
+PERSONA_PROFILE = """\
 Persona info:
 - Name: {name}
 - Personality: {personality}
 - Speaking style: {speaking_style}
 - Background: {background}
+"""
 
+DECISION_INSTRUCTIONS = """\
 Available actions:
 1. "post" — Write a new SNS post (text, optionally with image)
 2. "comment" — Leave a comment on an existing post
 3. "like" — Like an existing post
 4. "follow" — Follow another persona
+5. "skip" — Do nothing this time (only if no other action fits)
 
-Respond with ONLY a JSON object (no markdown, no explanation) in this format:
-{{
-  "activity_type": "post" | "comment" | "like" | "follow",
-  "content": "the text content to post or comment (empty string if like/follow)",
-  "target_post_id": "post id to comment on or like (empty string if not applicable)",
-  "target_persona_id": "persona id to follow (empty string if not applicable)",
-  "needs_image": true | false
-}}
+Fill in every field of the decision:
+- activity_type: the chosen action
+- content: the text to post or comment (empty string for like/follow/skip)
+- target_post_id: post id to comment on or like (empty string if not applicable)
+- target_persona_id: persona id to follow (empty string if not applicable)
+- needs_image: whether a post should get an image
 
 Rules:
 - Pick an action that fits the command/situation and the persona's character.
@@ -78,19 +93,216 @@ Rules:
 - If no suitable target exists for comment/like/follow, fall back to creating a "post".
 """
 
+# Prompt layout: static instructions first, then the persona profile, with the
+# per-run context in the user message. The leading part is then byte-identical
+# across calls (across all personas for the instructions, across runs for the
+# profile), which is what provider-side prompt caching matches on.
+DECISION_SYSTEM_PROMPT = (
+    "You are the autonomous brain of an AI persona on a social network.\n"
+    "You must decide what action to take based on the persona's identity and the current context.\n\n"
+    + DECISION_INSTRUCTIONS
+    + "\n"
+    + PERSONA_PROFILE
+)
+
+BATCH_DECISION_SYSTEM_PROMPT = (
+    "You are the autonomous brain of several AI personas on a social network.\n"
+    "Each request below belongs to a different persona. Decide for each one independently, "
+    "using only that request's persona info and context, and return exactly one decision "
+    "per request_id. Write each post/comment content as that request's \"Content:\" line "
+    "asks.\n\n"
+    + DECISION_INSTRUCTIONS
+)
+
+
+class ActivityDecision(BaseModel):
+    """Schema the decision LLM must answer with (OpenAI strict JSON schema).
+
+    Every field is required so the schema stays valid in strict mode; fields
+    that do not apply to the chosen action are empty strings.
+    """
+
+    activity_type: Literal["post", "comment", "like", "follow", "skip"]
+    content: str
+    target_post_id: str
+    target_persona_id: str
+    needs_image: bool
+
+
+class BatchItemDecision(ActivityDecision):
+    request_id: str
 
-def _build_decision_llm() -> ChatOpenAI:
+
+class BatchDecision(BaseModel):
+    """One decision per request in a multi-persona batch."""
+
+    decisions: list[BatchItemDecision]
+
+
+COMPOSE_SYSTEM_PROMPT = (
+    "You write social network posts and comments as an AI persona, "
+    "in the persona's own voice and speaking style.\n"
+    "Reply with the text only — no quotes, no explanation.\n\n"
+    + PERSONA_PROFILE
+)
+
+# Model tiers: "fast" picks actions and targets, "quality" writes post/comment text
+MODEL_TIERS = {
+    "fast": os.environ.get("OPENAI_FAST_MODEL", "gpt-4o-mini"),
+    "quality": os.environ.get("OPENAI_MODEL", "gpt-4o"),
+}
+
+# Triggers whose decisions are made on the fast tier (content is then
+# composed separately on the quality tier)
+FAST_DECISION_TRIGGERS = {
+    t.strip()
+    for t in os.environ.get("ACTIVITY_FAST_DECISION_TRIGGERS", "auto").split(",")
+    if t.strip()
+}
+
+
+def _build_llm(tier: str, temperature: float = 0.8, cache_key: str | None = None) -> ChatOpenAI:
+    """``cache_key`` routes requests sharing a prompt prefix to the same provider cache."""
     return ChatOpenAI(
-        model=os.environ.get("OPENAI_MODEL", "gpt-4o"),
-        temperature=0.8,
+        model=MODEL_TIERS[tier],
+        temperature=temperature,
+        model_kwargs={"prompt_cache_key": cache_key} if cache_key else {},
     )
 
 
+def _cache_key(state: ActivityState) -> str:
+    return f"persona:{state['persona_id']}"
+
+
+def _usage_config(feature: str, state: ActivityState | None = None) -> dict:
+    """Run config that records the call's tokens and latency (core.usage)."""
+    if state is None:
+        return {"callbacks": [UsageCallback(feature)]}
+    return {"callbacks": [UsageCallback(feature, state["persona_id"], state.get("user_id"))]}
+
+
+def _structured(llm: ChatOpenAI):
+    return llm.with_structured_output(
+        ActivityDecision, method="json_schema", strict=True, include_raw=True,
+    )
+
+
+def validate_decision(decision: ActivityDecision, state: ActivityState) -> str | None:
+    """Check a decision against the context it was made in.
+
+    Returns:
+        A description of the problem, or None if the decision can be executed.
+    """
+    kind = decision.activity_type
+    if kind in ("post", "comment") and not decision.content.strip():
+        return f'"{kind}" requires non-empty content'
+    if kind in ("comment", "like"):
+        if not decision.target_post_id:
+            return f'"{kind}" requires target_post_id'
+        known = {p["id"] for p in _context_posts(state)}
+        if known and decision.target_post_id not in known:
+            return f"target_post_id {decision.target_post_id} is not one of the posts shown"
+    if kind == "follow":
+        if not decision.target_persona_id:
+            return '"follow" requires target_persona_id'
+        if decision.target_persona_id == state["persona_id"]:
+            return "a persona cannot follow itself"
+    return None
+
+
+def _parse_decision(output: dict, state: ActivityState) -> tuple[ActivityDecision | None, str | None]:
+    """Unpack an include_raw structured output into (decision, error)."""
+    decision = output.get("parsed")
+    if decision is None:
+        error = output.get("parsing_error")
+        return None, f"output did not match the schema: {error}"
+    if isinstance(decision, dict):
+        try:
+            decision = ActivityDecision.model_validate(decision)
+        except ValidationError as e:
+            return None, f"output did not match the schema: {e}"
+    return decision, validate_decision(decision, state)
+
+
+def _profile_fields(persona: dict) -> dict:
+    return {
+        "name": persona.get("name", "Unknown"),
+        "personality": persona.get("personality", ""),
+        "speaking_style": persona.get("speaking_style", ""),
+        "background": persona.get("background", ""),
+    }
+
+
+def _context_posts(state: ActivityState) -> list[dict]:
+    """Feed and trending posts the decision may target."""
+    return [*state.get("recent_posts", []), *state.get("trending_posts", [])]
+
+
+def _posts_summary(posts: list[dict]) -> str:
+    summary = ""
+    for p in posts:
+        author = p.get("personas", {}).get("name", "unknown")
+        summary += f"- [id:{p['id']}] by {author} (persona:{p['persona_id']}): {(p.get('content') or '(image only)')[:100]}\n"
+    return summary
+
+
+def _decision_context(state: ActivityState) -> str:
+    """Command, recent feed, trending posts and recent activity as shown to the decision LLM."""
+    posts_summary = _posts_summary(state.get("recent_posts", [])[:10])
+    trending_summary = _posts_summary(state.get("trending_posts", []))
+
+    logs_summary = ""
+    for log in state.get("recent_logs", [])[:5]:
+        detail = log.get("detail", {})
+        content = detail.get("content", "") if isinstance(detail, dict) else ""
+        logs_summary += f"- {log['activity_type']}: {(content or '')[:80]} ({log['created_at']})\n"
+
+    return (
+        f"Command: {state['command']}\n"
+        f"Triggered by: {state['triggered_by']}\n\n"
+        f"Recent feed posts:\n{posts_summary or '(no posts yet)'}\n\n"
+        f"Trending posts:\n{trending_summary or '(nothing trending)'}\n\n"
+        f"My recent activity:\n{logs_summary or '(no recent activity)'}"
+    )
+
+
+def _decision_updates(decision: ActivityDecision, tier: str) -> dict:
+    """State updates for a validated decision."""
+    return {
+        "activity_type": decision.activity_type,
+        "content": decision.content,
+        "target_post_id": decision.target_post_id,
+        "target_persona_id": decision.target_persona_id,
+        "needs_image": decision.activity_type == "post" and decision.needs_image,
+        "decision_tier": tier,
+    }
+
+
+async def _invoke_decision(
+    tier: str,
+    messages: list,
+    temperature: float = 0.8,
+    cache_key: str | None = None,
+    config: dict | None = None,
+) -> dict:
+    started = time.monotonic()
+    try:
+        output = await _structured(_build_llm(tier, temperature, cache_key)).ainvoke(messages, config)
+    except Exception:
+        record_llm_call(tier, started, error=True)
+        raise
+    record_llm_call(tier, started, output.get("raw"))
+    return output
+
+
 # ---------------------------------------------------------------------------
 # Nodes
 # ---------------------------------------------------------------------------
 
 
+TRENDING_CONTEXT_POSTS = 5
+
+
 async def collect_context(state: ActivityState) -> dict:
     """Query DB for persona info, recent feed posts, and recent activity logs."""
     sb = get_supabase()
@@ -99,7 +311,10 @@ async def collect_context(state: ActivityState) -> dict:
     # Fetch persona
     persona_result = (
         sb.table("personas")
-        .select("id, name, personality, speaking_style, background, system_prompt")
+        .select(
+            "id, name, personality, speaking_style, background, system_prompt, "
+            "lora_status, lora_model_id, lora_trigger_word"
+        )
         .eq("id", persona_id)
         .limit(1)
         .execute()
@@ -148,83 +363,172 @@ async def collect_context(state: ActivityState) -> dict:
     )
     recent_logs = logs_result.data
 
+    # Popular posts from the in-memory trending counters (not already in the feed)
+    shown = {p["id"] for p in recent_posts}
+    trending_ids = [
+        post_id for post_id, _ in trending_posts(TRENDING_CONTEXT_POSTS, exclude=shown)
+    ]
+    trending = []
+    if trending_ids:
+        trending_result = (
+            sb.table("sns_posts")
+            .select("id, persona_id, content, image_url, created_at, personas(id, name)")
+            .in_("id", trending_ids)
+            .neq("persona_id", persona_id)
+            .execute()
+        )
+        rank = {post_id: i for i, post_id in enumerate(trending_ids)}
+        trending = sorted(trending_result.data, key=lambda p: rank[p["id"]])
+
     return {
         "persona": persona,
         "recent_posts": recent_posts,
+        "trending_posts": trending,
         "recent_logs": recent_logs,
     }
 
 
 async def decide_activity(state: ActivityState) -> dict:
-    """Call LLM to decide what action to take based on command + context."""
-    persona = state["persona"]
-    llm = _build_decision_llm()
+    """Call LLM to decide what action to take based on command + context.
 
-    system_msg = DECISION_SYSTEM_PROMPT.format(
-        name=persona.get("name", "Unknown"),
-        personality=persona.get("personality", ""),
-        speaking_style=persona.get("speaking_style", ""),
-        background=persona.get("background", ""),
+    Triggers in FAST_DECISION_TRIGGERS decide on the fast tier; the text of a
+    resulting post/comment is then written by compose_content. Degraded runs
+    (low budget) decide and write the text on the fast tier in one call.
+    """
+    persona = state["persona"]
+    degraded = state.get("degraded", False)
+    fast = degraded or state.get("triggered_by") in FAST_DECISION_TRIGGERS
+    tier = "fast" if fast else "quality"
+
+    system_msg = DECISION_SYSTEM_PROMPT.format(**_profile_fields(persona))
+    user_msg = f"{_decision_context(state)}\n\nDecide what to do now."
+    if tier == "fast" and not degraded:
+        user_msg += " For a post or comment, content only needs a one-line note of what to say."
+
+    messages = [SystemMessage(content=system_msg), HumanMessage(content=user_msg)]
+    output = await _invoke_decision(
+        tier, messages, cache_key=_cache_key(state), config=_usage_config("decision", state),
     )
+    decision, error = _parse_decision(output, state)
+
+    if error:
+        # One cheap repair pass: show the model its answer and what was wrong
+        logger.info("Repairing activity decision for persona %s: %s", state["persona_id"], error)
+        raw = output.get("raw")
+        repair_messages = [
+            *messages,
+            raw if isinstance(raw, AIMessage) else AIMessage(content=str(raw or "")),
+            HumanMessage(
+                content=f"That decision is invalid: {error}. Return a corrected decision."
+            ),
+        ]
+        output = await _invoke_decision(
+            "fast", repair_messages, temperature=0,
+            cache_key=_cache_key(state), config=_usage_config("decision", state),
+        )
+        decision, error = _parse_decision(output, state)
 
-    # Build context summary for the LLM
-    posts_summary = ""
-    for p in state.get("recent_posts", [])[:10]:
-        author = p.get("personas", {}).get("name", "unknown")
-        posts_summary += f"- [id:{p['id']}] by {author} (persona:{p['persona_id']}): {(p.get('content') or '(image only)')[:100]}\n"
+    if error:
+        logger.warning("Skipping activity for persona %s: %s", state["persona_id"], error)
+        return {
+            "activity_type": "skip",
+            "content": "",
+            "target_post_id": "",
+            "target_persona_id": "",
+            "needs_image": False,
+            "decision_tier": tier,
+            "result": {"skipped": True, "reason": error},
+        }
 
-    logs_summary = ""
-    for log in state.get("recent_logs", [])[:5]:
-        detail = log.get("detail", {})
-        content = detail.get("content", "") if isinstance(detail, dict) else ""
-        logs_summary += f"- {log['activity_type']}: {(content or '')[:80]} ({log['created_at']})\n"
+    return _decision_updates(decision, tier)
+
+
+def route_start(
+    state: ActivityState,
+) -> Literal["collect_context", "decide_activity", "compose_content", "generate_image", "execute_action"]:
+    """Router: skip the steps already covered by a preset context/decision (batch mode)."""
+    if state.get("activity_type"):
+        return route_decision(state)
+    if state.get("persona"):
+        return "decide_activity"
+    return "collect_context"
 
-    user_msg = (
-        f"Command: {state['command']}\n"
-        f"Triggered by: {state['triggered_by']}\n\n"
-        f"Recent feed posts:\n{posts_summary or '(no posts yet)'}\n\n"
-        f"My recent activity:\n{logs_summary or '(no recent activity)'}\n\n"
-        f"Decide what to do now."
-    )
 
-    response = await llm.ainvoke([
-        SystemMessage(content=system_msg),
-        HumanMessage(content=user_msg),
-    ])
+def route_decision(
+    state: ActivityState,
+) -> Literal["compose_content", "generate_image", "execute_action"]:
+    """Router: write post/comment text on the quality tier if a fast decision chose one."""
+    if (
+        state.get("decision_tier") == "fast"
+        and not state.get("degraded")
+        and state.get("activity_type") in ("post", "comment")
+    ):
+        return "compose_content"
+    return check_image(state)
 
-    # Parse JSON from LLM response
-    raw = response.content.strip()
-    # Strip markdown code fences if present
-    if raw.startswith("```"):
-        raw = raw.split("\n", 1)[1] if "\n" in raw else raw[3:]
-        if raw.endswith("```"):
-            raw = raw[:-3]
-        raw = raw.strip()
 
+async def compose_content(state: ActivityState) -> dict:
+    """Write the post/comment text for a fast-tier decision on the quality tier.
+
+    The decision's content is only a note of what to say, so if no text comes
+    back the activity is skipped rather than publishing the note.
+    """
+    persona = state["persona"]
+    kind = state["activity_type"]
+    system_msg = COMPOSE_SYSTEM_PROMPT.format(**_profile_fields(persona))
+
+    user_msg = f"Write a {'comment' if kind == 'comment' else 'social media post'}.\n"
+    user_msg += f"Situation: {state['command']}\n"
+    if kind == "comment":
+        target = next(
+            (p for p in _context_posts(state) if p["id"] == state.get("target_post_id")),
+            {},
+        )
+        author = (target.get("personas") or {}).get("name", "someone")
+        user_msg += f"You are replying to this post by {author}: {(target.get('content') or '(image only)')[:300]}\n"
+    user_msg += f"What you want to say: {state.get('content', '')}"
+
+    started = time.monotonic()
     try:
-        decision = json.loads(raw)
-    except json.JSONDecodeError:
-        # Fallback: default to a simple post
-        decision = {
-            "activity_type": "post",
-            "content": f"({state['command']})",
-            "target_post_id": "",
-            "target_persona_id": "",
-            "needs_image": False,
-        }
+        response = await _build_llm("quality", cache_key=_cache_key(state)).ainvoke(
+            [SystemMessage(content=system_msg), HumanMessage(content=user_msg)],
+            _usage_config("compose", state),
+        )
+    except Exception:
+        record_llm_call("quality", started, error=True)
+        logger.warning("Composing %s failed for persona %s", kind, state["persona_id"], exc_info=True)
+        return _compose_skipped("composing the text failed")
+    record_llm_call("quality", started, response)
+
+    text = (response.content or "").strip()
+    if not text:
+        logger.warning("Composing %s returned no text for persona %s", kind, state["persona_id"])
+        return _compose_skipped("composed text was empty")
+    return {"content": text}
+
 
+def _compose_skipped(reason: str) -> dict:
+    """Skip instead of publishing the fast tier's note as the post/comment."""
     return {
-        "activity_type": decision.get("activity_type", "post"),
-        "content": decision.get("content", ""),
-        "target_post_id": decision.get("target_post_id", ""),
-        "target_persona_id": decision.get("target_persona_id", ""),
-        "needs_image": bool(decision.get("needs_image", False)),
+        "activity_type": "skip",
+        "content": "",
+        "needs_image": False,
+        "result": {"skipped": True, "reason": reason},
     }
 
 
+def _defers_image(state: ActivityState) -> bool:
+    """Whether this run publishes the post first and attaches the image later."""
+    return state.get("triggered_by") in DEFERRED_IMAGE_TRIGGERS
+
+
 def check_image(state: ActivityState) -> Literal["generate_image", "execute_action"]:
-    """Router: decide whether to generate an image."""
-    if state.get("needs_image") and state.get("activity_type") == "post":
+    """Router: decide whether to generate an image inline."""
+    if (
+        state.get("needs_image")
+        and state.get("activity_type") == "post"
+        and not _defers_image(state)
+    ):
         return "generate_image"
     return "execute_action"
 
@@ -235,50 +539,27 @@ async def generate_image(state: ActivityState) -> dict:
     persona_id = state["persona_id"]
     user_id = state["user_id"]
 
-    # Check if persona has a trained LoRA model
-    sb = get_supabase()
-    lora_result = (
-        sb.table("persona_images")
-        .select("lora_model")
-        .eq("persona_id", persona_id)
-        .neq("lora_model", None)
-        .limit(1)
-        .execute()
-    )
-
-    prompt = f"A photo of {persona.get('name', 'someone')}: {state['content'][:200]}"
-    image_url = ""
+    prompt, lora_weights = image_request_for(persona, state["content"])
 
+    uploaded: dict = {}
     try:
-        if lora_result.data and lora_result.data[0].get("lora_model"):
-            # Use LoRA model
-            lora_model = lora_result.data[0]["lora_model"]
-            urls = await generate_lora_image(lora_model=lora_model, prompt=prompt)
-            if urls:
-                upload_result = await upload_image_to_storage(urls[0], persona_id, user_id)
-                image_url = upload_result["public_url"]
-        else:
-            # DALL-E fallback via OpenAI
-            from openai import AsyncOpenAI
-
-            client = AsyncOpenAI()
-            dalle_response = await client.images.generate(
-                model="dall-e-3",
-                prompt=prompt,
-                n=1,
-                size="1024x1024",
-            )
-            if dalle_response.data:
-                remote_url = dalle_response.data[0].url
-                upload_result = await upload_image_to_storage(
-                    remote_url, persona_id, user_id
-                )
-                image_url = upload_result["public_url"]
+        # Identical requests (retries, duplicate schedules) are coalesced/cached
+        uploaded = await generate_image_to_storage(
+            prompt=prompt,
+            persona_id=persona_id,
+            user_id=user_id,
+            lora_weights=lora_weights,
+            priority=PRIORITY_BY_TRIGGER.get(state.get("triggered_by"), Priority.MANUAL),
+        )
     except Exception:
         # Image generation failed — proceed without image
-        pass
+        logger.warning("Image generation failed for persona %s", persona_id, exc_info=True)
 
-    return {"image_url": image_url}
+    return {
+        "image_url": uploaded.get("public_url", ""),
+        "image_file_path": uploaded.get("file_path", ""),
+        "image_variants": uploaded.get("variants") or {},
+    }
 
 
 async def execute_action(state: ActivityState) -> dict:
@@ -292,8 +573,31 @@ async def execute_action(state: ActivityState) -> dict:
         row = {"persona_id": persona_id, "content": state.get("content", "")}
         if state.get("image_url"):
             row["image_url"] = state["image_url"]
+            row["image_file_path"] = state.get("image_file_path") or None
+            if state.get("image_variants"):
+                row["image_variants"] = state["image_variants"]
+        defer_image = state.get("needs_image") and _defers_image(state)
+        if defer_image:
+            row["image_status"] = "pending"
         insert_result = sb.table("sns_posts").insert(row).execute()
         result = {"post_id": insert_result.data[0]["id"]} if insert_result.data else {}
+        if insert_result.data:
+            index_document("post", insert_result.data[0])
+        if insert_result.data and defer_image:
+            # Publish now; the image worker pool attaches the image later
+            enqueue_post_image({
+                "post_id": result["post_id"],
+                "persona": state["persona"],
+                "persona_id": persona_id,
+                "user_id": state["user_id"],
+                "content": state.get("content", ""),
+                "triggered_by": state.get("triggered_by", "manual"),
+            })
+            result["image_status"] = "pending"
+        if insert_result.data and state.get("image_file_path") and not state.get("image_variants"):
+            schedule_derivatives(
+                "sns_posts", "image_variants", insert_result.data[0]["id"], state["image_file_path"]
+            )
 
     elif activity_type == "comment":
         target_post_id = state.get("target_post_id", "")
@@ -302,6 +606,8 @@ async def execute_action(state: ActivityState) -> dict:
             row = {"persona_id": persona_id, "content": state.get("content", "")}
             insert_result = sb.table("sns_posts").insert(row).execute()
             result = {"post_id": insert_result.data[0]["id"]} if insert_result.data else {}
+            if insert_result.data:
+                index_document("post", insert_result.data[0])
         else:
             row = {
                 "post_id": target_post_id,
@@ -310,6 +616,9 @@ async def execute_action(state: ActivityState) -> dict:
             }
             insert_result = sb.table("sns_comments").insert(row).execute()
             result = {"comment_id": insert_result.data[0]["id"]} if insert_result.data else {}
+            if insert_result.data:
+                record_comment(target_post_id)
+                index_document("comment", insert_result.data[0])
 
     elif activity_type == "like":
         target_post_id = state.get("target_post_id", "")
@@ -330,6 +639,8 @@ async def execute_action(state: ActivityState) -> dict:
                     .execute()
                 )
                 result = {"like_id": insert_result.data[0]["id"]} if insert_result.data else {}
+                if insert_result.data:
+                    record_like(target_post_id)
             else:
                 result = {"already_liked": True}
 
@@ -355,6 +666,9 @@ async def execute_action(state: ActivityState) -> dict:
             else:
                 result = {"already_following": True}
 
+    elif activity_type == "skip":
+        result = state.get("result") or {"skipped": True}
+
     return {"result": result}
 
 
@@ -392,14 +706,34 @@ graph = StateGraph(ActivityState)
 
 graph.add_node("collect_context", collect_context)
 graph.add_node("decide_activity", decide_activity)
+graph.add_node("compose_content", compose_content)
 graph.add_node("generate_image", generate_image)
 graph.add_node("execute_action", execute_action)
 graph.add_node("log_activity", log_activity)
 
-graph.add_edge(START, "collect_context")
+graph.add_conditional_edges(
+    START,
+    route_start,
+    {
+        "collect_context": "collect_context",
+        "decide_activity": "decide_activity",
+        "compose_content": "compose_content",
+        "generate_image": "generate_image",
+        "execute_action": "execute_action",
+    },
+)
 graph.add_edge("collect_context", "decide_activity")
 graph.add_conditional_edges(
     "decide_activity",
+    route_decision,
+    {
+        "compose_content": "compose_content",
+        "generate_image": "generate_image",
+        "execute_action": "execute_action",
+    },
+)
+graph.add_conditional_edges(
+    "compose_content",
     check_image,
     {
         "generate_image": "generate_image",
@@ -418,20 +752,20 @@ activity_graph = graph.compile()
 # ---------------------------------------------------------------------------
 
 
-async def run_activity(
+def _initial_state(
     persona_id: str,
     command: str,
     triggered_by: str,
     user_id: str,
-) -> dict:
-    """Run the activity graph and return the result."""
-    initial_state: ActivityState = {
+) -> ActivityState:
+    return {
         "persona_id": persona_id,
         "command": command,
         "triggered_by": triggered_by,
         "user_id": user_id,
         "persona": {},
         "recent_posts": [],
+        "trending_posts": [],
         "recent_logs": [],
         "activity_type": "",
         "content": "",
@@ -439,10 +773,52 @@ async def run_activity(
         "target_persona_id": "",
         "needs_image": False,
         "image_url": "",
+        "image_file_path": "",
+        "image_variants": {},
+        "decision_tier": "",
+        "degraded": False,
         "result": {},
     }
 
-    final_state = await activity_graph.ainvoke(initial_state)
+
+async def run_activity(
+    persona_id: str,
+    command: str,
+    triggered_by: str,
+    user_id: str,
+    *,
+    preset: dict | None = None,
+    admitted: bool = False,
+) -> dict:
+    """Run the activity graph and return the result.
+
+    Scheduled/auto runs are admitted against the user's and persona's budget
+    first (core.budget) and skipped when it is exhausted; the tokens every run
+    used are charged afterwards.
+
+    Args:
+        preset: State already known to the caller (collected context and/or a
+            decision, as in batch mode); the graph skips the steps it covers.
+        admitted: The caller already admitted this run (batch mode).
+    """
+    initial_state = _initial_state(persona_id, command, triggered_by, user_id)
+    if not admitted and triggered_by in BUDGETED_TRIGGERS:
+        admission = admit_activity(user_id, persona_id)
+        if not admission.allowed:
+            logger.info(
+                "Skipping %s activity for persona %s: %s (retry in %.0fs)",
+                triggered_by, persona_id, admission.reason, admission.retry_after,
+            )
+            return _skipped_result(admission.reason, admission.retry_after)
+        initial_state["degraded"] = admission.degraded
+    if preset:
+        initial_state.update(preset)
+
+    with track_tokens() as spent:
+        try:
+            final_state = await activity_graph.ainvoke(initial_state)
+        finally:
+            charge_tokens(user_id, persona_id, spent.total)
 
     return {
         "activity_type": final_state.get("activity_type", ""),
@@ -454,11 +830,148 @@ async def run_activity(
     }
 
 
+def _skipped_result(reason: str, retry_after: float) -> dict:
+    return {
+        "activity_type": "skip",
+        "content": "",
+        "target_post_id": "",
+        "target_persona_id": "",
+        "image_url": "",
+        "result": {"skipped": True, "reason": reason, "retry_after": round(retry_after)},
+    }
+
+
 # ---------------------------------------------------------------------------
 # Auto-interaction engine
 # ---------------------------------------------------------------------------
 
 
+# Batch decision sizing: personas are packed into one request until either
+# limit is hit (token count is a rough chars/3 estimate of the prompt).
+BATCH_DECISION_MAX_SIZE = int(os.environ.get("BATCH_DECISION_MAX_SIZE", "8"))
+BATCH_DECISION_MAX_TOKENS = int(os.environ.get("BATCH_DECISION_MAX_TOKENS", "6000"))
+# Output tokens reserved per decision in a batch
+BATCH_DECISION_OUTPUT_TOKENS = 150
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 3 + 1
+
+
+def _batch_request_text(request_id: str, state: ActivityState) -> str:
+    profile = PERSONA_PROFILE.format(**_profile_fields(state["persona"]))
+    text = f"### request_id: {request_id}\n{profile}\n{_decision_context(state)}"
+    if state.get("degraded"):
+        # No compose step follows a degraded run, so the decision is the final text
+        return text + "\nContent: write the final post/comment text, not a note."
+    return text + "\nContent: a one-line note of what to say is enough."
+
+
+def batch_requests(
+    states: list[ActivityState],
+    *,
+    max_size: int = BATCH_DECISION_MAX_SIZE,
+    max_tokens: int = BATCH_DECISION_MAX_TOKENS,
+) -> list[list[ActivityState]]:
+    """Pack decision requests into batches that fit the size and token limits."""
+    budget = max_tokens - estimate_tokens(BATCH_DECISION_SYSTEM_PROMPT)
+    batches: list[list[ActivityState]] = []
+    current: list[ActivityState] = []
+    used = 0
+    for state in states:
+        cost = estimate_tokens(_batch_request_text("r00", state)) + BATCH_DECISION_OUTPUT_TOKENS
+        if current and (len(current) >= max_size or used + cost > budget):
+            batches.append(current)
+            current, used = [], 0
+        current.append(state)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def decide_batch(states: list[ActivityState]) -> list[dict | None]:
+    """Decide for several personas in one fast-tier structured request.
+
+    Each request is tagged with its own request_id and validated against its
+    own context, so one persona's bad answer does not affect the others.
+
+    Returns:
+        Decision state updates aligned with ``states``; None where the batch
+        gave no valid decision for that request.
+    """
+    ids = [f"r{i}" for i in range(len(states))]
+    user_msg = "\n\n".join(_batch_request_text(rid, st) for rid, st in zip(ids, states))
+    messages = [
+        SystemMessage(content=BATCH_DECISION_SYSTEM_PROMPT),
+        HumanMessage(content=f"{user_msg}\n\nDecide what each persona does now."),
+    ]
+
+    llm = _build_llm("fast", cache_key="decision-batch").with_structured_output(
+        BatchDecision, method="json_schema", strict=True, include_raw=True,
+    )
+    started = time.monotonic()
+    try:
+        output = await llm.ainvoke(messages, _usage_config("decision_batch"))
+    except Exception:
+        record_llm_call("fast", started, error=True)
+        logger.warning("Batch decision failed for %d personas", len(states), exc_info=True)
+        return [None] * len(states)
+    record_llm_call("fast", started, output.get("raw"))
+
+    parsed = output.get("parsed")
+    by_id = {d.request_id: d for d in parsed.decisions} if parsed else {}
+    results: list[dict | None] = []
+    for rid, state in zip(ids, states):
+        decision = by_id.get(rid)
+        error = "missing from batch" if decision is None else validate_decision(decision, state)
+        if error:
+            logger.info("Batch decision for persona %s rejected: %s", state["persona_id"], error)
+            results.append(None)
+        else:
+            results.append(_decision_updates(decision, "fast"))
+    return results
+
+
+async def _run_batch(states: list[ActivityState]) -> None:
+    """Decide a batch in one request, then run each persona's graph from its decision.
+
+    Requests the batch could not decide fall back to a single-persona
+    decision (with its own repair pass), reusing the collected context.
+    """
+    if len(states) > 1:
+        with track_tokens() as spent:
+            decisions = await decide_batch(states)
+        # One request for several personas: split its tokens evenly
+        for state in states:
+            charge_tokens(state["user_id"], state["persona_id"], spent.total // len(states))
+    else:
+        decisions = [None]
+
+    async def run(state: ActivityState, decision: dict | None) -> None:
+        preset = {
+            "persona": state["persona"],
+            "recent_posts": state["recent_posts"],
+            "trending_posts": state["trending_posts"],
+            "recent_logs": state["recent_logs"],
+            "degraded": state["degraded"],
+            **(decision or {}),
+        }
+        try:
+            await run_activity(
+                persona_id=state["persona_id"],
+                command=state["command"],
+                triggered_by=state["triggered_by"],
+                user_id=state["user_id"],
+                preset=preset,
+                admitted=True,
+            )
+        except Exception:
+            logger.exception("Auto-interact failed for persona %s", state["persona_id"])
+
+    await asyncio.gather(*(run(st, d) for st, d in zip(states, decisions)))
+
+
 async def auto_interact() -> None:
     """Run automatic inter-persona interactions.
 
@@ -466,6 +979,10 @@ async def auto_interact() -> None:
     persona it:
     1. Checks recent posts from followed personas and reacts (like/comment)
     2. Discovers new personas and auto-follows if interests align
+
+    Decisions for all personas are made in batches (see batch_requests) rather
+    than one LLM request per persona. Personas whose budget is exhausted are
+    left out of the round (core.budget).
     """
     sb = get_supabase()
 
@@ -484,16 +1001,37 @@ async def auto_interact() -> None:
     for row in active_schedules.data:
         persona_map[row["persona_id"]] = row["user_id"]
 
+    requests: list[ActivityState] = []
     for persona_id, user_id in persona_map.items():
         try:
-            await _auto_react_to_feed(persona_id, user_id)
-            await _auto_discover_and_follow(persona_id, user_id)
+            commands = [
+                c for c in (_feed_reaction_command(persona_id), _discovery_command(persona_id)) if c
+            ]
+            if not commands:
+                continue
+            # Budget check before spending anything on this persona
+            admission = admit_activity(user_id, persona_id, runs=len(commands))
+            if not admission.allowed:
+                logger.info(
+                    "Auto-interact skipped for persona %s: %s (retry in %.0fs)",
+                    persona_id, admission.reason, admission.retry_after,
+                )
+                continue
+            context = await collect_context(_initial_state(persona_id, "", "auto", user_id))
+            for command in commands:
+                state = _initial_state(persona_id, command, "auto", user_id)
+                state.update(context)
+                state["degraded"] = admission.degraded
+                requests.append(state)
         except Exception:
             logger.exception("Auto-interact failed for persona %s", persona_id)
 
+    for batch in batch_requests(requests):
+        await _run_batch(batch)
+
 
-async def _auto_react_to_feed(persona_id: str, user_id: str) -> None:
-    """React to recent posts in the persona's feed using the activity graph."""
+def _feed_reaction_command(persona_id: str) -> str | None:
+    """Command to react to unseen posts in the persona's feed, or None if there are none."""
     sb = get_supabase()
 
     # Get posts from followed personas in the last 24 hours that this persona
@@ -506,7 +1044,7 @@ async def _auto_react_to_feed(persona_id: str, user_id: str) -> None:
     )
     following_ids = [f["following_id"] for f in follows_result.data]
     if not following_ids:
-        return
+        return None
 
     recent_posts = (
         sb.table("sns_posts")
@@ -517,7 +1055,7 @@ async def _auto_react_to_feed(persona_id: str, user_id: str) -> None:
         .execute()
     )
     if not recent_posts.data:
-        return
+        return None
 
     # Check which posts we already interacted with (liked or commented)
     post_ids = [p["id"] for p in recent_posts.data]
@@ -546,28 +1084,21 @@ async def _auto_react_to_feed(persona_id: str, user_id: str) -> None:
     ]
 
     if not unseen_posts:
-        return
+        return None
 
-    # Run activity graph to react to new feed content
-    command = (
+    # Let the activity graph react to new feed content
+    return (
         "React to new posts in your feed. "
         "Like posts you enjoy, or comment if you have something meaningful to say. "
         "Be authentic to your personality."
     )
 
-    try:
-        await run_activity(
-            persona_id=persona_id,
-            command=command,
-            triggered_by="auto",
-            user_id=user_id,
-        )
-    except Exception:
-        logger.exception("Auto-react failed for persona %s", persona_id)
 
+DISCOVERY_CANDIDATES = 5
 
-async def _auto_discover_and_follow(persona_id: str, user_id: str) -> None:
-    """Discover and follow new personas with similar interests."""
+
+def _discovery_command(persona_id: str) -> str | None:
+    """Command to consider following new personas, or None if there are no candidates."""
     sb = get_supabase()
 
     # Get current following list
@@ -588,36 +1119,50 @@ async def _auto_discover_and_follow(persona_id: str, user_id: str) -> None:
         .execute()
     )
     if not persona_result.data:
-        return
-
-    # Find personas not yet followed (exclude self and already-followed)
-    exclude_ids = list(following_ids | {persona_id})
-    candidates = (
-        sb.table("personas")
-        .select("id, name, personality, background")
-        .not_.in_("id", exclude_ids)
-        .limit(5)
-        .execute()
-    )
-    if not candidates.data:
-        return
+        return None
+
+    # Friends-of-friends suggestions first, topped up with the most similar
+    # personas not yet followed (embedding index)
+    candidate_ids = [
+        s["id"] for s in get_follow_suggestions(sb, persona_id, following_ids)
+    ][:DISCOVERY_CANDIDATES]
+    if len(candidate_ids) < DISCOVERY_CANDIDATES:
+        try:
+            candidate_ids += similar_personas(
+                persona_id,
+                DISCOVERY_CANDIDATES - len(candidate_ids),
+                following_ids | set(candidate_ids),
+            )
+        except Exception:
+            logger.warning("Persona index unavailable for %s", persona_id, exc_info=True)
+    if candidate_ids:
+        rows = (
+            sb.table("personas")
+            .select("id, name, personality, background")
+            .in_("id", candidate_ids)
+            .execute()
+        ).data
+        rank = {pid: i for i, pid in enumerate(candidate_ids)}
+        candidates = sorted(rows, key=lambda c: rank[c["id"]])
+    else:
+        # Not embedded yet: any personas not yet followed (exclude self and already-followed)
+        exclude_ids = list(following_ids | {persona_id})
+        candidates = (
+            sb.table("personas")
+            .select("id, name, personality, background")
+            .not_.in_("id", exclude_ids)
+            .limit(DISCOVERY_CANDIDATES)
+            .execute()
+        ).data
+    if not candidates:
+        return None
 
     # Use the activity graph to decide whether to follow any of them
     candidate_descriptions = "\n".join(
         f"- {c['name']} (id:{c['id']}): {(c.get('personality') or '')[:80]}"
-        for c in candidates.data
+        for c in candidates
     )
-    command = (
+    return (
         f"Here are some personas you don't follow yet:\n{candidate_descriptions}\n\n"
         "If any of them seem interesting to you based on your personality, follow one."
     )
-
-    try:
-        await run_activity(
-            persona_id=persona_id,
-            command=command,
-            triggered_by="auto",
-            user_id=user_id,
-        )
-    except Exception:
-        logger.exception("Auto-discover failed for persona %s", persona_id)
@@ -0,0 +1,172 @@
+"""Per-user and per-persona LLM budgets for autonomous activity.
+
+Every user and persona has two token buckets: activity runs and LLM tokens,
+each refilling at an hourly rate up to one hour's worth. Scheduled and
+auto-interaction runs are admitted before they start:
+
+- a run takes one token from the run buckets;
+- the LLM tokens a run actually used (core.usage) are charged afterwards,
+  so a bucket may go into debt and then blocks runs until it refills;
+- below BUDGET_DEGRADE_LEVEL of any bucket, runs are degraded: the
+  decision and the text are written in one fast-tier call;
+- with a bucket empty the run is skipped and the persona backs off for at
+  least the refill time, doubling (from BUDGET_BACKOFF_BASE, up to
+  BUDGET_BACKOFF_MAX) while the budget stays exhausted. A tight schedule
+  thus stretches to a longer interval instead of queueing work.
+
+Manual commands are charged but never refused. Buckets live in this process
+only, like the other in-memory counters.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+
+BUDGET_USER_TOKENS_PER_HOUR = int(os.environ.get("BUDGET_USER_TOKENS_PER_HOUR", "200000"))
+BUDGET_PERSONA_TOKENS_PER_HOUR = int(os.environ.get("BUDGET_PERSONA_TOKENS_PER_HOUR", "60000"))
+BUDGET_USER_RUNS_PER_HOUR = int(os.environ.get("BUDGET_USER_RUNS_PER_HOUR", "120"))
+BUDGET_PERSONA_RUNS_PER_HOUR = int(os.environ.get("BUDGET_PERSONA_RUNS_PER_HOUR", "30"))
+BUDGET_DEGRADE_LEVEL = float(os.environ.get("BUDGET_DEGRADE_LEVEL", "0.25"))
+BUDGET_BACKOFF_BASE = float(os.environ.get("BUDGET_BACKOFF_BASE", "60"))
+BUDGET_BACKOFF_MAX = float(os.environ.get("BUDGET_BACKOFF_MAX", "3600"))
+
+# Triggers that are admitted against the budget (the rest are only charged)
+BUDGETED_TRIGGERS = {"schedule", "auto"}
+
+
+class TokenBucket:
+    """Token bucket that refills continuously and may be overdrawn."""
+
+    def __init__(self, per_hour: float, now: float):
+        self.capacity = per_hour
+        self.rate = per_hour / 3600
+        self.tokens = per_hour
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def level(self, now: float) -> float:
+        """Fill level in [0, 1]."""
+        self._refill(now)
+        return max(0.0, self.tokens) / self.capacity
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if they are now)."""
+        self._refill(now)
+        return max(0.0, amount - self.tokens) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= amount
+
+
+@dataclass(frozen=True)
+class Admission:
+    allowed: bool
+    degraded: bool = False
+    retry_after: float = 0.0  # seconds, when not allowed
+    reason: str = ""
+
+
+@dataclass
+class _Buckets:
+    runs: TokenBucket
+    tokens: TokenBucket
+
+
+class ActivityBudget:
+    """Run and token buckets per user and per persona, plus skip backoff."""
+
+    def __init__(self):
+        self._users: dict[str, _Buckets] = {}
+        self._personas: dict[str, _Buckets] = {}
+        # persona_id -> (paused until, consecutive skips)
+        self._backoff: dict[str, tuple[float, int]] = {}
+        self.admitted = 0
+        self.degraded = 0
+        self.skipped = 0
+
+    def _buckets(self, user_id: str, persona_id: str, now: float) -> tuple[_Buckets, _Buckets]:
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _Buckets(
+                TokenBucket(BUDGET_USER_RUNS_PER_HOUR, now),
+                TokenBucket(BUDGET_USER_TOKENS_PER_HOUR, now),
+            )
+        persona = self._personas.get(persona_id)
+        if persona is None:
+            persona = self._personas[persona_id] = _Buckets(
+                TokenBucket(BUDGET_PERSONA_RUNS_PER_HOUR, now),
+                TokenBucket(BUDGET_PERSONA_TOKENS_PER_HOUR, now),
+            )
+        return user, persona
+
+    def admit(self, user_id: str, persona_id: str, runs: int = 1, now: float | None = None) -> Admission:
+        """Admit ``runs`` activity runs for the persona, or refuse with a retry delay."""
+        now = time.monotonic() if now is None else now
+        paused_until, skips = self._backoff.get(persona_id, (0.0, 0))
+        if now < paused_until:
+            self.skipped += 1
+            return Admission(False, retry_after=paused_until - now, reason="backing off")
+
+        buckets = self._buckets(user_id, persona_id, now)
+        wait = max(
+            max(b.runs.wait_time(runs, now), b.tokens.wait_time(1, now)) for b in buckets
+        )
+        if wait > 0:
+            skips += 1
+            pause = min(BUDGET_BACKOFF_MAX, max(wait, BUDGET_BACKOFF_BASE * 2 ** (skips - 1)))
+            self._backoff[persona_id] = (now + pause, skips)
+            self.skipped += 1
+            return Admission(False, retry_after=pause, reason="budget exhausted")
+
+        self._backoff.pop(persona_id, None)
+        for b in buckets:
+            b.runs.take(runs, now)
+        level = min(min(b.runs.level(now), b.tokens.level(now)) for b in buckets)
+        degraded = level < BUDGET_DEGRADE_LEVEL
+        self.admitted += 1
+        self.degraded += int(degraded)
+        return Admission(True, degraded=degraded)
+
+    def charge(self, user_id: str, persona_id: str, tokens: int, now: float | None = None) -> None:
+        """Charge LLM tokens a run actually used."""
+        if tokens <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        for b in self._buckets(user_id, persona_id, now):
+            b.tokens.take(tokens, now)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "admitted": self.admitted,
+            "degraded": self.degraded,
+            "skipped": self.skipped,
+            "backing_off": sum(1 for until, _ in self._backoff.values() if until > now),
+            "users": len(self._users),
+            "personas": len(self._personas),
+        }
+
+
+_budget = ActivityBudget()
+
+
+def admit_activity(user_id: str, persona_id: str, runs: int = 1) -> Admission:
+    return _budget.admit(user_id, persona_id, runs)
+
+
+def charge_tokens(user_id: str, persona_id: str, tokens: int) -> None:
+    _budget.charge(user_id, persona_id, tokens)
+
+
+def budget_metrics() -> dict:
+    return {
+        **_budget.snapshot(),
+        "user_tokens_per_hour": BUDGET_USER_TOKENS_PER_HOUR,
+        "persona_tokens_per_hour": BUDGET_PERSONA_TOKENS_PER_HOUR,
+        "user_runs_per_hour": BUDGET_USER_RUNS_PER_HOUR,
+        "persona_runs_per_hour": BUDGET_PERSONA_RUNS_PER_HOUR,
+    }
@@ -0,0 +1,203 @@
+"""Write-behind persistence for chat messages.
+
+The chat WebSocket enqueues message rows here instead of inserting them on
+the streaming path. A background flusher writes them in batches across all
+connections when CHAT_FLUSH_SIZE rows are pending or every
+CHAT_FLUSH_INTERVAL seconds, and the remainder is flushed on disconnect and
+on shutdown. Rows carry a ``client_message_id`` and are upserted with
+``ignore_duplicates`` on (thread_id, client_message_id), so a retried batch
+or a resent client message is stored once, and the same id in another
+thread is a different message. ``created_at`` is set at enqueue time so batched rows keep
+their conversational order. A batch rejected because one of its threads
+was deleted is written row by row and the orphaned rows are dropped, so a
+deleted thread cannot block the buffer.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+from core.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+CHAT_FLUSH_SIZE = int(os.environ.get("CHAT_FLUSH_SIZE", "50"))
+CHAT_FLUSH_INTERVAL = float(os.environ.get("CHAT_FLUSH_INTERVAL", "0.5"))
+# Pending rows kept across failed flushes before the oldest are dropped
+CHAT_BUFFER_MAX = int(os.environ.get("CHAT_BUFFER_MAX", "10000"))
+
+
+class ChatMessageBuffer:
+    """Batches ``chat_messages`` rows and writes them from one flusher task."""
+
+    def __init__(self, flush_size: int, flush_interval: float, max_pending: int):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: list[dict] = []
+        self._lock: asyncio.Lock | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="chat-store-flusher")
+
+    def enqueue(self, row: dict) -> None:
+        self._ensure_started()
+        self._pending.append(row)
+        if len(self._pending) >= self.flush_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write all pending rows now. Returns the number of rows written.
+
+        Waits for a flush already in progress, so every row enqueued before
+        the call is stored when it returns.
+        """
+        self._ensure_started()
+        async with self._lock:
+            written = 0
+            while self._pending:
+                batch = self._pending[:self.flush_size]
+                del self._pending[:len(batch)]
+                try:
+                    await asyncio.to_thread(_write_batch, batch)
+                except Exception as e:
+                    retry = batch
+                    if _is_orphaned(e):
+                        # A thread in the batch was deleted; store the rest row by row
+                        stored, retry = await self._write_isolated(batch)
+                        written += stored
+                        if not retry:
+                            continue
+                    self.failures += 1
+                    logger.exception("Failed to flush %d chat messages; will retry", len(retry))
+                    # Put the batch back in front; upserts make the retry idempotent
+                    self._pending[:0] = retry
+                    overflow = len(self._pending) - self.max_pending
+                    if overflow > 0:
+                        del self._pending[:overflow]
+                        self.dropped += overflow
+                        logger.error("Chat message buffer full; dropped %d oldest rows", overflow)
+                    break
+                written += len(batch)
+                self.flushed += len(batch)
+                self.batches += 1
+            return written
+
+    async def _write_isolated(self, batch: list[dict]) -> tuple[int, list[dict]]:
+        """Write rows one at a time, dropping those whose thread no longer exists.
+
+        Returns:
+            (rows written, rows that failed for another reason and should be retried)
+        """
+        written = 0
+        retry: list[dict] = []
+        for row in batch:
+            try:
+                await asyncio.to_thread(_write_batch, [row])
+            except Exception as e:
+                if not _is_orphaned(e):
+                    retry.append(row)
+                    continue
+                self.dropped += 1
+                logger.warning("Dropping chat message for deleted thread %s", row["thread_id"])
+            else:
+                written += 1
+                self.flushed += 1
+        return written, retry
+
+    async def stop(self) -> None:
+        """Flush what is left and stop the flusher."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pending and self._loop is asyncio.get_running_loop():
+            await self.flush()
+        self._loop = None
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+
+def _is_orphaned(error: Exception) -> bool:
+    """Foreign key violation: the message's thread was deleted meanwhile."""
+    return getattr(error, "code", None) == "23503"
+
+
+def _write_batch(rows: list[dict]) -> None:
+    get_supabase().table("chat_messages").upsert(
+        rows, on_conflict="thread_id,client_message_id", ignore_duplicates=True
+    ).execute()
+
+
+_buffer = ChatMessageBuffer(CHAT_FLUSH_SIZE, CHAT_FLUSH_INTERVAL, CHAT_BUFFER_MAX)
+
+
+def enqueue_message(
+    thread_id: str,
+    role: str,
+    content: str,
+    client_message_id: str | None = None,
+) -> str:
+    """Queue a chat message for storage.
+
+    Returns:
+        The message's client_message_id (generated when not given).
+    """
+    client_message_id = client_message_id or str(uuid.uuid4())
+    _buffer.enqueue({
+        "thread_id": thread_id,
+        "role": role,
+        "content": content,
+        "client_message_id": client_message_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    })
+    return client_message_id
+
+
+def reply_message_id(client_message_id: str) -> str:
+    """client_message_id of the assistant reply to a user message."""
+    return f"{client_message_id}:assistant"
+
+
+async def flush_messages() -> int:
+    return await _buffer.flush()
+
+
+async def stop_chat_store() -> None:
+    await _buffer.stop()
+
+
+def chat_store_metrics() -> dict:
+    return {**_buffer.snapshot(), "flush_size": CHAT_FLUSH_SIZE, "flush_interval": CHAT_FLUSH_INTERVAL}
@@ -0,0 +1,151 @@
+"""Resumable chat reply streams for the SSE chat endpoint.
+
+A reply is generated by a task that is independent of the HTTP response
+and appends numbered events to a ``ChatStream``. Subscribers replay the
+events after their ``Last-Event-ID`` and then follow live ones, so a client
+whose connection drops can reconnect and continue where it left off.
+Events that pile up while a subscriber is writing are handed over as one
+batch, so slow clients get fewer, larger writes.
+
+A stream nobody is subscribed to is cancelled after SSE_RESUME_GRACE
+seconds (no paying for orphaned completions), and finished streams are
+kept for SSE_REPLAY_TTL seconds for late resumes. Streams live in this
+process only: a resume that reaches another worker gets a 404 and should
+fall back to the thread's message history. Streams are keyed by
+(user_id, stream_id), so two users picking the same client id never collide.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+SSE_REPLAY_TTL = float(os.environ.get("SSE_REPLAY_TTL", "300"))
+SSE_RESUME_GRACE = float(os.environ.get("SSE_RESUME_GRACE", "15"))
+
+# (event id, event name, data)
+StreamEvent = tuple[int, str, dict]
+
+
+class ChatStream:
+    """Append-only event log of one reply, followed by any number of subscribers."""
+
+    def __init__(self, stream_id: str, thread_id: str, user_id: str):
+        self.id = stream_id
+        self.thread_id = thread_id
+        self.user_id = user_id
+        self.events: list[StreamEvent] = []
+        self.done = False
+        self.finished_at: float | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+        self._orphan_timer: asyncio.TimerHandle | None = None
+
+    def append(self, event: str, data: dict) -> None:
+        self.events.append((len(self.events) + 1, event, data))
+        self._notify()
+
+    def close(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def start(self, run: Callable[["ChatStream"], Awaitable[None]]) -> None:
+        self.task = asyncio.create_task(self._run(run), name=f"chat-stream-{self.id}")
+        # Cancelled unless someone subscribes within the grace period
+        self._schedule_orphan_check()
+
+    async def _run(self, run: Callable[["ChatStream"], Awaitable[None]]) -> None:
+        try:
+            await run(self)
+        finally:
+            self.close()
+
+    def cancel(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    def _schedule_orphan_check(self) -> None:
+        if self._orphan_timer is not None:
+            self._orphan_timer.cancel()
+        self._orphan_timer = asyncio.get_running_loop().call_later(
+            SSE_RESUME_GRACE, self._cancel_if_orphaned
+        )
+
+    def _cancel_if_orphaned(self) -> None:
+        self._orphan_timer = None
+        if self.subscribers == 0 and not self.done:
+            logger.info("Chat stream %s has no subscribers; cancelling generation", self.id)
+            self.cancel()
+
+    async def follow(self, after: int = 0) -> AsyncIterator[list[StreamEvent]]:
+        """Batches of events with id > ``after``, until the stream is done."""
+        self.subscribers += 1
+        if self._orphan_timer is not None:
+            self._orphan_timer.cancel()
+            self._orphan_timer = None
+        try:
+            position = max(after, 0)
+            while True:
+                changed = self._changed
+                if position < len(self.events):
+                    batch = self.events[position:]
+                    position += len(batch)
+                    yield batch
+                    continue
+                if self.done:
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self._schedule_orphan_check()
+
+
+_streams: dict[tuple[str, str], ChatStream] = {}
+
+
+def _sweep() -> None:
+    now = time.monotonic()
+    expired = [
+        key
+        for key, stream in _streams.items()
+        if stream.finished_at is not None and now - stream.finished_at > SSE_REPLAY_TTL
+    ]
+    for key in expired:
+        del _streams[key]
+
+
+def get_stream(user_id: str, stream_id: str) -> ChatStream | None:
+    _sweep()
+    return _streams.get((user_id, stream_id))
+
+
+def start_stream(
+    stream_id: str,
+    thread_id: str,
+    user_id: str,
+    run: Callable[[ChatStream], Awaitable[None]],
+) -> ChatStream:
+    """Register a stream and start generating it with ``run``."""
+    _sweep()
+    stream = ChatStream(stream_id, thread_id, user_id)
+    _streams[(user_id, stream_id)] = stream
+    stream.start(run)
+    return stream
+
+
+async def stop_chat_streams() -> None:
+    """Cancel in-flight generations (shutdown)."""
+    tasks = [s.task for s in _streams.values() if s.task is not None and not s.task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
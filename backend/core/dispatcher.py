@@ -0,0 +1,228 @@
+"""Priority-aware, rate-limited dispatcher for paid image generation calls.
+
+Every Replicate / DALL-E call goes through a per-provider queue. Workers pick
+the highest-priority job first (interactive > manual > schedule > auto), and a
+token bucket keeps each provider under its rate limit. Queues are bounded per
+priority class so a flood of batch work is rejected instead of starving
+user-facing requests.
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    MANUAL = 1
+    SCHEDULE = 2
+    AUTO = 3
+
+
+PRIORITY_BY_TRIGGER = {
+    "manual": Priority.MANUAL,
+    "schedule": Priority.SCHEDULE,
+    "auto": Priority.AUTO,
+}
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a provider queue has no room for the job's priority class."""
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Seconds until ``tokens`` are available."""
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.wait_time(tokens))
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    call: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+@dataclass
+class _PriorityStats:
+    queued: int = 0
+    submitted: int = 0
+    rejected: int = 0
+    completed: int = 0
+    failed: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+
+
+class ProviderQueue:
+    """Bounded priority queue + token bucket + worker pool for one provider."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        rate_per_minute: float,
+        burst: int,
+        concurrency: int,
+        max_queue_per_priority: int,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.concurrency = concurrency
+        self.max_queue_per_priority = max_queue_per_priority
+        self.in_flight = 0
+        self.stats = {p: _PriorityStats() for p in Priority}
+        self._seq = itertools.count()
+        self._queue: asyncio.PriorityQueue[_Job] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._workers and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"dispatch-{self.name}-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._loop = None
+
+    async def submit(self, priority: Priority, call: Callable[[], Awaitable[Any]]) -> Any:
+        self._ensure_started()
+        stats = self.stats[priority]
+        if stats.queued >= self.max_queue_per_priority:
+            stats.rejected += 1
+            raise QueueFullError(f"{self.name} queue is full for {priority.name.lower()} work")
+
+        future = asyncio.get_running_loop().create_future()
+        stats.queued += 1
+        stats.submitted += 1
+        self._queue.put_nowait(_Job(priority, next(self._seq), call, future, time.monotonic()))
+        return await future
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            await self.bucket.acquire()
+            # A higher-priority job may have arrived while waiting for a token
+            self._queue.put_nowait(job)
+            job = self._queue.get_nowait()
+
+            stats = self.stats[Priority(job.priority)]
+            stats.queued -= 1
+            if job.future.done():  # submitter gave up (cancelled)
+                continue
+
+            waited = time.monotonic() - job.enqueued_at
+            stats.wait_total += waited
+            stats.wait_max = max(stats.wait_max, waited)
+
+            self.in_flight += 1
+            try:
+                result = await job.call()
+            except Exception as e:
+                stats.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                stats.completed += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        started = sum(s.completed + s.failed for s in self.stats.values())
+        return {
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "tokens_available": round(self.bucket._tokens, 2),
+            "dispatched": started,
+            "priorities": {
+                p.name.lower(): {
+                    "queued": s.queued,
+                    "submitted": s.submitted,
+                    "rejected": s.rejected,
+                    "completed": s.completed,
+                    "failed": s.failed,
+                    "avg_wait_s": round(s.wait_total / max(1, s.completed + s.failed), 3),
+                    "max_wait_s": round(s.wait_max, 3),
+                }
+                for p, s in self.stats.items()
+            },
+        }
+
+
+def _provider_from_env(name: str, env: str, *, rate: int, burst: int, concurrency: int) -> ProviderQueue:
+    return ProviderQueue(
+        name,
+        rate_per_minute=float(os.environ.get(f"{env}_RATE_PER_MIN", rate)),
+        burst=int(os.environ.get(f"{env}_BURST", burst)),
+        concurrency=int(os.environ.get(f"{env}_CONCURRENCY", concurrency)),
+        max_queue_per_priority=int(os.environ.get(f"{env}_MAX_QUEUE", "50")),
+    )
+
+
+PROVIDERS: dict[str, ProviderQueue] = {
+    "replicate": _provider_from_env("replicate", "REPLICATE", rate=60, burst=10, concurrency=4),
+    "openai_images": _provider_from_env("openai_images", "OPENAI_IMAGES", rate=15, burst=5, concurrency=4),
+}
+
+
+async def dispatch(provider: str, priority: Priority, call: Callable[[], Awaitable[Any]]) -> Any:
+    """Run ``call`` through the provider's queue and return its result."""
+    return await PROVIDERS[provider].submit(priority, call)
+
+
+async def stop_dispatcher() -> None:
+    """Stop all provider workers (called on app shutdown)."""
+    for provider in PROVIDERS.values():
+        await provider.stop()
+
+
+def dispatcher_metrics() -> dict:
+    """Queue depth, throughput, rejections and wait times per provider/priority."""
+    return {name: provider.snapshot() for name, provider in PROVIDERS.items()}
@@ -0,0 +1,152 @@
+"""Friends-of-friends follow suggestions, precomputed by a periodic job.
+
+The ``sns_follows`` edge list is loaded into a compact CSR adjacency
+(offsets + targets NumPy arrays over integer node ids). For every persona,
+the personas followed by the ones it follows are scored — each 2-hop path
+counts 1 / log(2 + out-degree of the middle persona), so prolific followers
+weigh less (Adamic-Adar) — and the top-N are stored in
+``follow_suggestions``, one row per persona, for O(1) reads.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+from core.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+FOLLOW_SUGGESTIONS_TOP_N = int(os.environ.get("FOLLOW_SUGGESTIONS_TOP_N", "20"))
+_PAGE_SIZE = 1000
+_UPSERT_CHUNK = 500
+
+
+class FollowGraph:
+    """Directed follow graph in CSR form: out-edges of node i are
+    ``targets[offsets[i]:offsets[i + 1]]``."""
+
+    def __init__(self, edges: list[tuple[str, str]]):
+        self.ids: list[str] = []
+        self.index: dict[str, int] = {}
+        for follower, following in edges:
+            for pid in (follower, following):
+                if pid not in self.index:
+                    self.index[pid] = len(self.ids)
+                    self.ids.append(pid)
+
+        n = len(self.ids)
+        sources = np.fromiter((self.index[f] for f, _ in edges), dtype=np.int64, count=len(edges))
+        targets = np.fromiter((self.index[t] for _, t in edges), dtype=np.int64, count=len(edges))
+        # Sorted and deduplicated by (source, target)
+        pairs = np.unique(sources * max(n, 1) + targets)
+        sources, self.targets = np.divmod(pairs, max(n, 1))
+
+        self.offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=self.offsets[1:])
+        self.weights = 1.0 / np.log(2 + np.diff(self.offsets))
+
+    def following(self, node: int) -> np.ndarray:
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def out_degree(self, node: int) -> int:
+        return int(self.offsets[node + 1] - self.offsets[node])
+
+    def suggest(self, node: int, top_n: int) -> list[tuple[str, float]]:
+        """Top-N 2-hop candidates for ``node`` that it does not follow yet."""
+        followed = self.following(node)
+        if not len(followed) or top_n <= 0:
+            return []
+
+        # Concatenated out-edges of every followed persona, each path
+        # weighted by its middle persona
+        ends = self.offsets[followed + 1]
+        lengths = ends - self.offsets[followed]
+        paths = np.repeat(ends - lengths.cumsum(), lengths) + np.arange(lengths.sum())
+        candidates = self.targets[paths]
+        path_weights = np.repeat(self.weights[followed], lengths)
+
+        keep = ~np.isin(candidates, followed) & (candidates != node)
+        candidates, slots = np.unique(candidates[keep], return_inverse=True)
+        if not len(candidates):
+            return []
+        scores = np.bincount(slots, weights=path_weights[keep])
+
+        top_n = min(top_n, len(candidates))
+        best = np.argpartition(-scores, top_n - 1)[:top_n]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.ids[candidates[i]], round(float(scores[i]), 4)) for i in best]
+
+    def suggest_all(self, top_n: int) -> dict[str, list[tuple[str, float]]]:
+        return {
+            self.ids[node]: self.suggest(node, top_n)
+            for node in range(len(self.ids))
+            if self.out_degree(node)
+        }
+
+
+def _load_edges(sb) -> list[tuple[str, str]]:
+    edges: list[tuple[str, str]] = []
+    start = 0
+    while True:
+        page = (
+            sb.table("sns_follows")
+            .select("follower_id, following_id")
+            .order("id")
+            .range(start, start + _PAGE_SIZE - 1)
+            .execute()
+        )
+        edges.extend((r["follower_id"], r["following_id"]) for r in page.data)
+        if len(page.data) < _PAGE_SIZE:
+            break
+        start += _PAGE_SIZE
+    return edges
+
+
+async def refresh_follow_suggestions() -> int:
+    """Recompute and store suggestions for every persona that follows someone.
+
+    Returns:
+        Number of personas whose suggestions were stored.
+    """
+    sb = get_supabase()
+    edges = _load_edges(sb)
+    # Graph build and scoring are CPU-bound; keep them off the event loop
+    suggestions = await asyncio.to_thread(
+        lambda: FollowGraph(edges).suggest_all(FOLLOW_SUGGESTIONS_TOP_N)
+    )
+
+    computed_at = datetime.now(timezone.utc).isoformat()
+    rows = [
+        {
+            "persona_id": persona_id,
+            "suggestions": [{"id": pid, "score": score} for pid, score in items],
+            "computed_at": computed_at,
+        }
+        for persona_id, items in suggestions.items()
+    ]
+    for i in range(0, len(rows), _UPSERT_CHUNK):
+        sb.table("follow_suggestions").upsert(rows[i:i + _UPSERT_CHUNK]).execute()
+
+    logger.info("Follow suggestions refreshed (%d personas, %d edges)", len(rows), len(edges))
+    return len(rows)
+
+
+def get_follow_suggestions(sb, persona_id: str, exclude: set[str] | None = None) -> list[dict]:
+    """Stored suggestions for a persona, best first, as ``{"id", "score"}`` dicts.
+
+    ``exclude`` drops personas followed since the last refresh.
+    """
+    result = (
+        sb.table("follow_suggestions")
+        .select("suggestions")
+        .eq("persona_id", persona_id)
+        .limit(1)
+        .execute()
+    )
+    if not result.data:
+        return []
+    exclude = exclude or set()
+    return [s for s in result.data[0]["suggestions"] if s["id"] not in exclude]
@@ -1,58 +1,200 @@
+import asyncio
+import hashlib
 import os
+import time
+from collections import deque
 from typing import AsyncIterator
 
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.graph import StateGraph, MessagesState, START, END
 
-memory = InMemorySaver()
+from core.cache import SingleFlight, TTLCache
+from core.chat_store import flush_messages, reply_message_id
+from core.llm_metrics import record_llm_call
+from core.usage import UsageCallback
+from core.supabase_client import get_supabase
 
+# 대화 기록의 원본은 chat_messages 하나. 메모리에는 스레드별 최근 컨텍스트 창만
+# 캐시하고, 처음 사용할 때(재시작 후 포함) DB에서 한 번 채움. 이후 턴은 스레드의
+# 최신 행 하나만 조회해서, 이 워커가 모르는 메시지면(다른 워커가 처리한 턴) 다시 채움.
+# 저장은 chat_store write-behind 버퍼가 턴 단위로 묶어서 처리.
+CHAT_CONTEXT_MESSAGES = int(os.environ.get("CHAT_CONTEXT_MESSAGES", "40"))
+CHAT_CONTEXT_TTL = float(os.environ.get("CHAT_CONTEXT_TTL", "600"))
+# 창이 넘치면 한 번에 이만큼 덜어냄. 한 메시지씩 밀어내면 매 턴 프롬프트 앞부분이
+# 바뀌어 provider 프롬프트 캐시가 맞지 않음
+CHAT_CONTEXT_TRIM = int(os.environ.get("CHAT_CONTEXT_TRIM", "10"))
 
-def _build_llm() -> ChatOpenAI:
+# 컨텍스트 창: (메시지 키, 메시지). 키는 client_message_id (없는 예전 행은 id)
+ContextWindow = deque[tuple[str | None, BaseMessage]]
+
+_contexts: TTLCache[str, ContextWindow] = TTLCache(ttl=CHAT_CONTEXT_TTL, maxsize=2048)
+_hydration: SingleFlight[str] = SingleFlight()
+
+
+def _build_llm(cache_key: str | None = None) -> ChatOpenAI:
     return ChatOpenAI(
         model=os.environ.get("OPENAI_MODEL", "gpt-4o-mini"),
         temperature=0.7,
         streaming=True,
+        stream_usage=True,
+        model_kwargs={"prompt_cache_key": cache_key} if cache_key else {},
     )
 
 
-def chat_node(state: MessagesState) -> dict:
-    """LLM을 호출하여 응답 생성."""
-    llm = _build_llm()
-    response = llm.invoke(state["messages"])
+async def chat_node(state: MessagesState, config: RunnableConfig) -> dict:
+    """LLM을 호출하여 응답 생성 (async: 스트림 취소 시 요청도 중단)."""
+    llm = _build_llm(config.get("configurable", {}).get("prompt_cache_key"))
+    started = time.monotonic()
+    try:
+        response = await llm.ainvoke(state["messages"], config)
+    except Exception:
+        record_llm_call("chat", started, error=True)
+        raise
+    record_llm_call("chat", started, response)
     return {"messages": [response]}
 
 
-# 그래프 구성
+# 그래프 구성 (체크포인터 없음: 컨텍스트는 매 턴 chat_messages 기반으로 주입)
 graph = StateGraph(MessagesState)
 graph.add_node("chat", chat_node)
 graph.add_edge(START, "chat")
 graph.add_edge("chat", END)
 
-chat_graph = graph.compile(checkpointer=memory)
+chat_graph = graph.compile()
+
+
+def _to_message(row: dict) -> BaseMessage:
+    if row["role"] == "assistant":
+        return AIMessage(content=row["content"])
+    return HumanMessage(content=row["content"])
+
+
+def _row_key(row: dict) -> str:
+    return row.get("client_message_id") or row["id"]
+
+
+def _fetch_tail(thread_id: str) -> list[dict]:
+    """최근 CHAT_CONTEXT_MESSAGES개 (최신순)."""
+    return (
+        get_supabase()
+        .table("chat_messages")
+        .select("id, client_message_id, role, content")
+        .eq("thread_id", thread_id)
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(CHAT_CONTEXT_MESSAGES)
+        .execute()
+        .data
+    )
+
+
+def _fetch_newest(thread_id: str) -> dict | None:
+    """스레드의 가장 최근 행 (id만, 인덱스 조회 한 번)."""
+    rows = (
+        get_supabase()
+        .table("chat_messages")
+        .select("id, client_message_id")
+        .eq("thread_id", thread_id)
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(1)
+        .execute()
+        .data
+    )
+    return rows[0] if rows else None
+
+
+async def _hydrate(thread_id: str) -> ContextWindow:
+    """chat_messages에서 최근 CHAT_CONTEXT_MESSAGES개로 컨텍스트 복원."""
+    # write-behind 버퍼에 남은 메시지까지 포함
+    await flush_messages()
+    rows = await asyncio.to_thread(_fetch_tail, thread_id)
+    return deque((_row_key(r), _to_message(r)) for r in reversed(rows))
+
+
+def _trim(context: ContextWindow) -> None:
+    """창이 CHAT_CONTEXT_MESSAGES를 넘으면 오래된 메시지를 CHAT_CONTEXT_TRIM개 단위로 제거."""
+    if len(context) > CHAT_CONTEXT_MESSAGES:
+        keep = max(1, CHAT_CONTEXT_MESSAGES - CHAT_CONTEXT_TRIM)
+        while len(context) > keep:
+            context.popleft()
+
+
+async def _is_current(thread_id: str, context: ContextWindow, client_message_id: str | None) -> bool:
+    """DB의 최신 행이 이 워커가 아는 메시지인지 (아직 버퍼에 있는 자기 행은 DB에 없어도 됨)."""
+    newest = await asyncio.to_thread(_fetch_newest, thread_id)
+    if newest is None:
+        return True
+    key = _row_key(newest)
+    return key == client_message_id or any(k == key for k, _ in reversed(context))
+
+
+def prompt_cache_key(system_prompt: str) -> str:
+    """같은 system prompt(페르소나)의 요청을 같은 provider 캐시로 보내기 위한 키."""
+    return "chat:" + hashlib.sha256(system_prompt.encode()).hexdigest()[:16]
+
+
+async def load_context(thread_id: str, client_message_id: str | None = None) -> ContextWindow:
+    """스레드의 최근 대화 컨텍스트 (캐시 → 없거나 다른 워커가 턴을 처리했으면 DB에서 복원).
+
+    client_message_id: 이번 턴 유저 메시지의 id. 이미 저장됐으면 복원 결과 끝에
+    포함되므로 제거 (이번 턴에서 따로 붙임).
+    """
+    context = _contexts.get(thread_id)
+    if context is not None and await _is_current(thread_id, context, client_message_id):
+        return context
+
+    context, _ = await _hydration.do(thread_id, lambda: _hydrate(thread_id))
+    if client_message_id is not None and context and context[-1][0] == client_message_id:
+        context.pop()
+    _contexts.set(thread_id, context)
+    return context
 
 
 async def stream_chat(
     system_prompt: str,
     user_message: str,
     thread_id: str,
+    *,
+    client_message_id: str | None = None,
+    persona_id: str | None = None,
+    user_id: str | None = None,
 ) -> AsyncIterator[str]:
-    """페르소나 system_prompt + 유저 메시지로 스트리밍 응답 생성."""
-    config = {"configurable": {"thread_id": thread_id}}
-
-    # 매 요청마다 최신 system prompt 주입 (페르소나 수정 즉시 반영)
-    messages = [
-        SystemMessage(content=system_prompt),
-        {"role": "user", "content": user_message},
-    ]
-
-    async for event in chat_graph.astream_events(
-        {"messages": messages},
-        config=config,
-        version="v2",
-    ):
-        if event["event"] == "on_chat_model_stream":
-            chunk = event["data"]["chunk"]
-            if chunk.content:
-                yield chunk.content
+    """페르소나 system_prompt + 최근 대화 + 유저 메시지로 스트리밍 응답 생성.
+
+    호출 측이 유저/어시스턴트 메시지를 chat_messages에 저장하고, 여기서는 같은
+    내용을 캐시된 컨텍스트에 반영 (중단 시 부분 응답까지).
+    client_message_id: 이번 턴 유저 메시지의 id (다른 워커의 턴과 구분하는 키).
+    persona_id/user_id: 토큰/지연 시간 사용량 집계용 (core.usage).
+    """
+    context = await load_context(thread_id, client_message_id)
+    user = HumanMessage(content=user_message)
+
+    # 매 요청마다 최신 system prompt 주입 (페르소나 수정 즉시 반영, 기록에는 저장 안 함).
+    # system prompt → 이전 대화 → 새 메시지 순서라 앞부분이 턴마다 바이트 단위로 같음
+    messages = [SystemMessage(content=system_prompt), *(m for _, m in context), user]
+
+    parts: list[str] = []
+    try:
+        async for event in chat_graph.astream_events(
+            {"messages": messages},
+            config={
+                "configurable": {"prompt_cache_key": prompt_cache_key(system_prompt)},
+                "callbacks": [UsageCallback("chat", persona_id, user_id)],
+            },
+            version="v2",
+        ):
+            if event["event"] == "on_chat_model_stream":
+                chunk = event["data"]["chunk"]
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+    finally:
+        context.append((client_message_id, user))
+        if parts:
+            reply_id = reply_message_id(client_message_id) if client_message_id else None
+            context.append((reply_id, AIMessage(content="".join(parts))))
+        _trim(context)
+        _contexts.set(thread_id, context)
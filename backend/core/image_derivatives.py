@@ -0,0 +1,164 @@
+"""Thumbnail derivatives (WebP/AVIF) for uploaded images.
+
+Derivatives are rendered in a process pool so image decoding and encoding
+never run on the event loop. The worker downloads the original itself, so
+the full-size image is never held in the API process. Uploads and row
+updates use the sync Supabase client, so they run in a worker thread.
+"""
+
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Literal
+
+import httpx
+from PIL import Image, features
+
+from core.storage import BUCKET
+from core.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+ImageSize = Literal["sm", "md", "full"]
+
+# size name -> max edge in pixels
+DERIVATIVE_SIZES: dict[str, int] = {"sm": 256, "md": 512}
+DERIVATIVE_FORMATS: tuple[str, ...] = ("webp", "avif") if features.check("avif") else ("webp",)
+
+# Profile images are only ever rendered as avatars
+AVATAR_SIZE = "sm"
+
+_pool: ProcessPoolExecutor | None = None
+_tasks: set[asyncio.Task] = set()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=int(os.environ.get("IMAGE_DERIVATIVE_WORKERS", "2")),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_derivative_pool() -> None:
+    """Shut down the derivative process pool (called on app shutdown)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def derivative_path(file_path: str, size: str, fmt: str) -> str:
+    """Deterministic Storage path of a derivative for the given original."""
+    stem = file_path.rsplit(".", 1)[0]
+    return f"derivatives/{stem}/{size}.{fmt}"
+
+
+def derivative_paths(variants: dict | None) -> list[str]:
+    """Flatten a variants map into the list of stored derivative paths."""
+    if not variants:
+        return []
+    return [path for formats in variants.values() for path in formats.values()]
+
+
+def variant_path(
+    file_path: str,
+    variants: dict | None,
+    size: str = "full",
+    fmt: str = "webp",
+) -> str:
+    """Pick the derivative path for ``size``; falls back to the original."""
+    if size == "full" or not variants:
+        return file_path
+    return (variants.get(size) or {}).get(fmt) or file_path
+
+
+def variant_url(
+    sb,
+    file_path: str,
+    variants: dict | None,
+    size: str = "full",
+    fmt: str = "webp",
+) -> str:
+    """Public URL of the derivative for ``size`` (original if not rendered yet)."""
+    return sb.storage.from_(BUCKET).get_public_url(variant_path(file_path, variants, size, fmt))
+
+
+def _render_derivatives(source_url: str) -> dict[str, dict[str, bytes]]:
+    """Process-pool worker: download the original and encode every derivative."""
+    with httpx.Client(timeout=60.0) as http:
+        resp = http.get(source_url)
+        resp.raise_for_status()
+        image = Image.open(io.BytesIO(resp.content))
+        image.load()
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    rendered: dict[str, dict[str, bytes]] = {}
+    for size, edge in DERIVATIVE_SIZES.items():
+        thumb = image.copy()
+        thumb.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        rendered[size] = {}
+        for fmt in DERIVATIVE_FORMATS:
+            buf = io.BytesIO()
+            thumb.save(buf, format=fmt.upper(), quality=80)
+            rendered[size][fmt] = buf.getvalue()
+    return rendered
+
+
+async def create_derivatives(file_path: str) -> dict:
+    """Render and upload all derivatives of ``file_path``.
+
+    Returns:
+        variants map, e.g. {"sm": {"webp": path, "avif": path}, "md": {...}}.
+    """
+    sb = get_supabase()
+    source_url = sb.storage.from_(BUCKET).get_public_url(file_path)
+
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(_get_pool(), _render_derivatives, source_url)
+    return await asyncio.to_thread(_upload_derivatives, sb, file_path, rendered)
+
+
+def _upload_derivatives(sb, file_path: str, rendered: dict[str, dict[str, bytes]]) -> dict:
+    variants: dict[str, dict[str, str]] = {}
+    for size, formats in rendered.items():
+        variants[size] = {}
+        for fmt, data in formats.items():
+            path = derivative_path(file_path, size, fmt)
+            sb.storage.from_(BUCKET).upload(
+                path=path,
+                file=data,
+                file_options={"content-type": f"image/{fmt}", "upsert": "true"},
+            )
+            variants[size][fmt] = path
+    return variants
+
+
+def _store_variants(table: str, column: str, row_id: str, file_path: str, variants: dict) -> None:
+    sb = get_supabase()
+    sb.table(table).update({column: variants}).eq("id", row_id).execute()
+    # Content-addressed blobs keep their derivatives for later duplicates
+    sb.table("image_blobs").update({"variants": variants}).eq("file_path", file_path).execute()
+
+
+async def attach_derivatives(table: str, column: str, row_id: str, file_path: str) -> None:
+    """Render derivatives of ``file_path`` and store the map on ``table.column``."""
+    try:
+        variants = await create_derivatives(file_path)
+        await asyncio.to_thread(_store_variants, table, column, row_id, file_path, variants)
+    except Exception:
+        logger.exception("Derivative generation failed for %s", file_path)
+
+
+def schedule_derivatives(table: str, column: str, row_id: str, file_path: str) -> None:
+    """Fire-and-forget variant of attach_derivatives for non-request contexts."""
+    task = asyncio.create_task(attach_derivatives(table, column, row_id, file_path))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
@@ -1,14 +1,20 @@
 """Replicate LoRA training and image generation module."""
 
+import hashlib
+import json
+import logging
 import os
-import uuid
 
-import httpx
 import replicate
 
+from core.cache import SingleFlight, TTLCache
+from core.dispatcher import Priority, dispatch
+from core.image_store import acquire_blob, store_image
+from core.openai_client import call_openai
+from core.storage import BUCKET
 from core.supabase_client import get_supabase
 
-BUCKET = "persona-images"
+logger = logging.getLogger(__name__)
 
 # Flux dev LoRA trainer on Replicate
 LORA_TRAINER_MODEL = "ostris/flux-dev-lora-trainer"
@@ -19,6 +25,20 @@ LORA_TRAINER_VERSION = (
 # Flux dev model for inference with LoRA weights
 FLUX_DEV_MODEL = "black-forest-labs/flux-dev"
 
+DALLE_MODEL = "dall-e-3"
+DALLE_SIZE = "1024x1024"
+
+# Identical generations (model, LoRA weights, prompt, params) within the TTL
+# are served from the stored image instead of calling the paid model again.
+IMAGE_CACHE_TTL = float(os.environ.get("IMAGE_CACHE_TTL", "600"))
+
+_generation_cache: TTLCache[str, dict] = TTLCache(ttl=IMAGE_CACHE_TTL, maxsize=1024)
+_generation_flight: SingleFlight[str] = SingleFlight()
+
+
+class EmptyGenerationError(RuntimeError):
+    """Raised when a provider returns no images."""
+
 
 async def start_lora_training(
     *,
@@ -142,7 +162,11 @@ async def upload_image_to_storage(
     persona_id: str,
     user_id: str,
 ) -> dict:
-    """Download an image from URL and upload to Supabase Storage.
+    """Stream an image from URL into Supabase Storage (content-addressed).
+
+    The image is piped chunk by chunk and stored once per SHA-256 (see
+    core.image_store); re-uploads of identical bytes reuse the existing
+    object and take another reference on it.
 
     Args:
         image_url: URL of the generated image to download.
@@ -150,27 +174,132 @@ async def upload_image_to_storage(
         user_id: The owner user ID.
 
     Returns:
-        dict with file_path and public_url.
+        dict with file_path, public_url, size, sha256, variants (already
+        rendered derivatives of a deduplicated blob, else None), and
+        deduplicated.
     """
-    async with httpx.AsyncClient() as http:
-        resp = await http.get(image_url)
-        if resp.status_code != 200:
-            raise RuntimeError(f"Failed to download image: HTTP {resp.status_code}")
-        image_bytes = resp.content
+    stored = await store_image(image_url)
 
     sb = get_supabase()
-    file_id = str(uuid.uuid4())
-    file_path = f"images/{file_id}.png"
+    public_url = sb.storage.from_(BUCKET).get_public_url(stored["file_path"])
+
+    return {**stored, "public_url": public_url}
+
+
+async def generate_dalle_image(prompt: str) -> str:
+    """Generate an image with DALL-E via the shared OpenAI client.
 
-    sb.storage.from_(BUCKET).upload(
-        path=file_path,
-        file=image_bytes,
-        file_options={"content-type": "image/png", "upsert": "false"},
+    Returns:
+        URL of the generated image (valid for a limited time).
+    """
+    result = await call_openai(
+        "image_generate",
+        lambda client: client.images.generate(
+            model=DALLE_MODEL,
+            prompt=prompt,
+            size=DALLE_SIZE,
+            n=1,
+        ),
     )
+    if not result.data:
+        raise EmptyGenerationError("DALL-E returned no images")
+    return result.data[0].url
 
-    public_url = sb.storage.from_(BUCKET).get_public_url(file_path)
 
-    return {
-        "file_path": file_path,
-        "public_url": public_url,
-    }
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace and case so trivially different prompts coalesce."""
+    return " ".join(prompt.split()).casefold()
+
+
+def generation_key(
+    model: str,
+    lora_weights: str | None,
+    prompt: str,
+    params: dict | None = None,
+) -> str:
+    """Cache / single-flight key for a generation request."""
+    payload = json.dumps(
+        [model, lora_weights, normalize_prompt(prompt), params or {}],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def _generate_and_upload(
+    model: str,
+    prompt: str,
+    lora_weights: str | None,
+    persona_id: str,
+    user_id: str,
+    priority: Priority,
+) -> dict:
+    if model == FLUX_DEV_MODEL:
+        urls = await dispatch(
+            "replicate",
+            priority,
+            lambda: generate_lora_image(lora_model=lora_weights, prompt=prompt),
+        )
+        if not urls:
+            raise EmptyGenerationError("LoRA image generation returned no results")
+        image_url = urls[0]
+    else:
+        image_url = await dispatch("openai_images", priority, lambda: generate_dalle_image(prompt))
+    return await upload_image_to_storage(image_url, persona_id, user_id)
+
+
+async def generate_image_to_storage(
+    *,
+    prompt: str,
+    persona_id: str,
+    user_id: str,
+    lora_weights: str | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+) -> dict:
+    """Generate an image (LoRA if weights are given, else DALL-E) and store it.
+
+    Concurrent identical requests share one in-flight generation, and repeats
+    within IMAGE_CACHE_TTL are served from storage. Every caller receives its
+    own reference on the stored blob. Provider calls are queued by
+    ``priority`` in core.dispatcher.
+
+    Raises:
+        QueueFullError: the provider queue for this priority is saturated.
+
+    Returns:
+        Upload result (see upload_image_to_storage) plus ``cached``.
+    """
+    model = FLUX_DEV_MODEL if lora_weights else DALLE_MODEL
+    params = {"size": DALLE_SIZE} if model == DALLE_MODEL else {}
+    key = generation_key(model, lora_weights, prompt, params)
+
+    cached = _generation_cache.get(key)
+    if cached is None:
+        result, shared = await _generation_flight.do(
+            key,
+            lambda: _generate_and_upload(
+                model, prompt, lora_weights, persona_id, user_id, priority,
+            ),
+        )
+        _generation_cache.set(key, result)
+        if not shared:
+            return {**result, "cached": False}
+        cached = result
+
+    # Reuse the stored image: take another reference on its blob
+    sb = get_supabase()
+    try:
+        blob = acquire_blob(sb, cached["sha256"], cached["file_path"], cached.get("size"))
+    except Exception:
+        logger.exception("Failed to reference cached image %s", cached["file_path"])
+        _generation_cache.invalidate(key)
+        raise
+    if blob.get("created"):
+        # Every reference was released (image deleted) since it was cached
+        sb.rpc("release_image_blob", {"p_file_path": cached["file_path"]}).execute()
+        _generation_cache.invalidate(key)
+        return await generate_image_to_storage(
+            prompt=prompt, persona_id=persona_id, user_id=user_id,
+            lora_weights=lora_weights, priority=priority,
+        )
+    return {**cached, "variants": blob.get("variants"), "deduplicated": True, "cached": True}
@@ -0,0 +1,137 @@
+"""Content-addressed image storage with reference counting.
+
+Images are stored once per SHA-256 at ``images/{sha256}.png``. The
+``image_blobs`` table (docs/sql/008) maps hash -> path and counts how many
+persona_images / sns_posts rows reference the object, so identical bytes
+share one object and deletes only remove blobs nobody references anymore.
+"""
+
+import logging
+import uuid
+
+from storage3.exceptions import StorageApiError
+
+from core.image_derivatives import derivative_paths
+from core.storage import BUCKET, stream_url_to_storage
+from core.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+
+def blob_path(sha256: str) -> str:
+    return f"images/{sha256}.png"
+
+
+def acquire_blob(sb, sha256: str, file_path: str, size: int | None = None) -> dict:
+    """Take one reference on a blob, creating its index row if needed.
+
+    Returns:
+        dict with file_path, ref_count, variants, and created.
+    """
+    result = sb.rpc(
+        "acquire_image_blob",
+        {"p_sha256": sha256, "p_file_path": file_path, "p_size": size},
+    ).execute()
+    return result.data[0]
+
+
+def _is_conflict(error: StorageApiError) -> bool:
+    """Whether Storage refused the move because the destination already exists."""
+    return str(error.status) == "409" or "already exists" in (error.message or "").lower()
+
+
+def _abandon_blob(sb, bucket, file_path: str, tmp_path: str) -> None:
+    """Undo a blob whose object could not be put in place: drop the reference
+    taken for it (and with it the index row) and the temporary upload."""
+    try:
+        sb.rpc("release_image_blob", {"p_file_path": file_path}).execute()
+    except Exception:
+        logger.exception("Failed to release blob %s after a failed move", file_path)
+    try:
+        bucket.remove([tmp_path])
+    except Exception:
+        logger.exception("Failed to remove temporary upload %s", tmp_path)
+
+
+def acquire_existing_blob(sb, file_path: str) -> dict | None:
+    """Take one reference on the indexed blob at ``file_path``.
+
+    For a path that is already stored (e.g. a persona image reused for a
+    post). Returns None when the path is not in the blob index, in which case
+    the caller must not record it as a reference it owns.
+    """
+    indexed = (
+        sb.table("image_blobs")
+        .select("sha256, size")
+        .eq("file_path", file_path)
+        .limit(1)
+        .execute()
+    )
+    if not indexed.data:
+        return None
+    row = indexed.data[0]
+    return acquire_blob(sb, row["sha256"], file_path, row.get("size"))
+
+
+async def store_image(source_url: str) -> dict:
+    """Stream an image into Storage, deduplicating by content hash.
+
+    The bytes are first streamed to a temporary path while hashing. If the
+    hash is already indexed the temporary object is dropped and the existing
+    blob gains a reference; otherwise it is moved to its content address.
+
+    Returns:
+        dict with file_path, size, sha256, variants (of an existing blob,
+        if any), and deduplicated.
+    """
+    tmp_path = f"tmp/{uuid.uuid4()}.png"
+    stored = await stream_url_to_storage(source_url, tmp_path, hash_content=True)
+
+    sb = get_supabase()
+    bucket = sb.storage.from_(BUCKET)
+    blob = acquire_blob(sb, stored["sha256"], blob_path(stored["sha256"]), stored["size"])
+
+    if blob["created"]:
+        try:
+            bucket.move(tmp_path, blob["file_path"])
+        except StorageApiError as e:
+            if not _is_conflict(e):
+                _abandon_blob(sb, bucket, blob["file_path"], tmp_path)
+                raise
+            # An object with identical content is already at the address
+            logger.warning("Blob %s already present, dropping upload", blob["file_path"])
+            bucket.remove([tmp_path])
+        except Exception:
+            _abandon_blob(sb, bucket, blob["file_path"], tmp_path)
+            raise
+    else:
+        bucket.remove([tmp_path])
+
+    return {
+        "file_path": blob["file_path"],
+        "size": stored["size"],
+        "sha256": stored["sha256"],
+        "variants": blob.get("variants"),
+        "deduplicated": not blob["created"],
+    }
+
+
+def release_images(sb, images: list[tuple[str, dict | None]]) -> list[str]:
+    """Drop one reference per (file_path, variants) pair.
+
+    Returns:
+        Storage paths (originals + derivatives) that are no longer referenced
+        and can be removed. Paths outside the blob index (legacy uploads) are
+        always returned.
+    """
+    removable: list[str] = []
+    for file_path, variants in images:
+        try:
+            remaining = sb.rpc("release_image_blob", {"p_file_path": file_path}).execute().data
+        except Exception:
+            logger.exception("Failed to release blob %s", file_path)
+            continue
+        if remaining is None or remaining <= 0:
+            removable.extend([file_path, *derivative_paths(variants)])
+    return removable
+
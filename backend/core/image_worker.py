@@ -0,0 +1,202 @@
+"""Background image worker pool for posts published ahead of their image.
+
+Scheduled and auto activity can publish a post as text right away with
+``image_status='pending'``; the image is generated here and attached to the
+post when ready, so graph runs are not held up by 10-40s generations.
+
+The queue lives in this process only. Posts whose job was lost (shutdown,
+crash) are picked up again by ``recover_pending_images`` at startup once
+they have been pending for IMAGE_RECOVER_AFTER seconds; whichever
+generation attaches first wins and a duplicate releases its image.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import TypedDict
+
+from core.dispatcher import PRIORITY_BY_TRIGGER, Priority
+from core.image_derivatives import schedule_derivatives
+from core.image_gen import generate_image_to_storage
+from core.image_store import release_images
+from core.storage import BUCKET
+from core.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+IMAGE_WORKER_QUEUE_SIZE = int(os.environ.get("IMAGE_WORKER_QUEUE_SIZE", "100"))
+# Pending longer than this, a post's job is assumed lost (not queued elsewhere)
+IMAGE_RECOVER_AFTER = int(os.environ.get("IMAGE_RECOVER_AFTER", "900"))
+
+# Activity triggers whose post images are generated after publishing
+DEFERRED_IMAGE_TRIGGERS = {
+    t.strip()
+    for t in os.environ.get("ACTIVITY_DEFERRED_IMAGE_TRIGGERS", "schedule,auto").split(",")
+    if t.strip()
+}
+
+
+class PostImageJob(TypedDict):
+    post_id: str
+    persona: dict
+    persona_id: str
+    user_id: str
+    content: str
+    triggered_by: str
+
+
+_queue: asyncio.Queue[PostImageJob] | None = None
+_workers: list[asyncio.Task] = []
+
+
+def image_request_for(persona: dict, content: str) -> tuple[str, str | None]:
+    """Build the image prompt and LoRA weights (if trained) for a persona post."""
+    lora_weights = None
+    if persona.get("lora_status") == "ready" and persona.get("lora_model_id"):
+        lora_weights = persona["lora_model_id"]
+
+    prompt = f"A photo of {persona.get('name', 'someone')}: {content[:200]}"
+    if lora_weights and persona.get("lora_trigger_word"):
+        prompt = f"{persona['lora_trigger_word']} {prompt}"
+    return prompt, lora_weights
+
+
+async def attach_post_image(job: PostImageJob) -> None:
+    """Generate the image for a pending post and attach it."""
+    sb = get_supabase()
+    prompt, lora_weights = image_request_for(job["persona"], job["content"])
+    try:
+        uploaded = await generate_image_to_storage(
+            prompt=prompt,
+            persona_id=job["persona_id"],
+            user_id=job["user_id"],
+            lora_weights=lora_weights,
+            priority=PRIORITY_BY_TRIGGER.get(job.get("triggered_by"), Priority.AUTO),
+        )
+    except Exception:
+        logger.warning("Deferred image failed for post %s", job["post_id"], exc_info=True)
+        sb.table("sns_posts").update({"image_status": "failed"}).eq(
+            "id", job["post_id"]
+        ).eq("image_status", "pending").execute()
+        return
+
+    updates = {
+        "image_url": uploaded["public_url"],
+        "image_file_path": uploaded["file_path"],
+        "image_status": "ready",
+    }
+    if uploaded.get("variants"):
+        updates["image_variants"] = uploaded["variants"]
+    result = (
+        sb.table("sns_posts")
+        .update(updates)
+        .eq("id", job["post_id"])
+        .eq("image_status", "pending")
+        .execute()
+    )
+
+    if not result.data:
+        # The post was deleted, or a recovered duplicate job attached first
+        logger.info("Post %s is gone or settled; releasing its deferred image", job["post_id"])
+        removable = release_images(sb, [(uploaded["file_path"], uploaded.get("variants"))])
+        if removable:
+            sb.storage.from_(BUCKET).remove(removable)
+        return
+
+    if not uploaded.get("variants"):
+        schedule_derivatives("sns_posts", "image_variants", job["post_id"], uploaded["file_path"])
+
+
+async def _worker(queue: asyncio.Queue[PostImageJob]) -> None:
+    while True:
+        job = await queue.get()
+        try:
+            await attach_post_image(job)
+        except Exception:
+            logger.exception("Image worker failed on post %s", job["post_id"])
+        finally:
+            queue.task_done()
+
+
+def start_image_workers() -> None:
+    """Start the worker pool on the running event loop (idempotent)."""
+    global _queue
+    if _workers:
+        return
+    _queue = asyncio.Queue(maxsize=IMAGE_WORKER_QUEUE_SIZE)
+    for _ in range(IMAGE_WORKERS):
+        _workers.append(asyncio.create_task(_worker(_queue)))
+    logger.info("Image workers started (%d)", IMAGE_WORKERS)
+
+
+async def stop_image_workers() -> None:
+    """Cancel the worker pool.
+
+    Queued posts keep image_status='pending' and are recovered by the next
+    ``recover_pending_images``.
+    """
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+
+
+def enqueue_post_image(job: PostImageJob) -> bool:
+    """Queue image generation for a published post.
+
+    Returns:
+        False when the queue is full (the post is marked image_status='failed').
+    """
+    start_image_workers()
+    try:
+        _queue.put_nowait(job)
+    except asyncio.QueueFull:
+        logger.warning("Image queue full, dropping image for post %s", job["post_id"])
+        get_supabase().table("sns_posts").update(
+            {"image_status": "failed"}
+        ).eq("id", job["post_id"]).execute()
+        return False
+    return True
+
+
+async def recover_pending_images() -> int:
+    """Re-enqueue posts left pending by a lost job (call at startup).
+
+    Posts whose persona no longer exists are marked failed, as are the ones
+    that do not fit in the queue.
+
+    Returns:
+        Number of posts re-enqueued.
+    """
+    sb = get_supabase()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=IMAGE_RECOVER_AFTER)
+    result = await asyncio.to_thread(
+        lambda: sb.table("sns_posts")
+        .select("id, persona_id, content, personas(*)")
+        .eq("image_status", "pending")
+        .lt("created_at", cutoff.isoformat())
+        .order("created_at")
+        .execute()
+    )
+
+    recovered = 0
+    for post in result.data or []:
+        persona = post.get("personas")
+        if not persona:
+            sb.table("sns_posts").update({"image_status": "failed"}).eq("id", post["id"]).execute()
+            continue
+        recovered += enqueue_post_image({
+            "post_id": post["id"],
+            "persona": persona,
+            "persona_id": post["persona_id"],
+            "user_id": persona["user_id"],
+            "content": post.get("content") or "",
+            "triggered_by": "auto",
+        })
+    if result.data:
+        logger.info("Recovered %d of %d pending post images", recovered, len(result.data))
+    return recovered
@@ -0,0 +1,77 @@
+"""In-process latency and token counters for LLM calls, grouped by model tier.
+
+Cached input tokens are the part of the prompt the provider served from its
+prompt cache (a repeated prefix); the hit ratio shows whether prompt layout
+and ``prompt_cache_key`` routing keep those prefixes stable.
+"""
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from langchain_core.messages import BaseMessage
+
+
+@dataclass
+class _TierStats:
+    calls: int = 0
+    errors: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    cache_hits: int = 0
+    output_tokens: int = 0
+
+
+_stats: defaultdict[str, _TierStats] = defaultdict(_TierStats)
+
+
+def record_llm_call(
+    tier: str,
+    started: float,
+    message: BaseMessage | None = None,
+    *,
+    error: bool = False,
+) -> None:
+    """Record one call that started at ``started`` (time.monotonic()).
+
+    Token counts, including cache reads, come from the response's
+    ``usage_metadata`` when present.
+    """
+    latency = time.monotonic() - started
+    stats = _stats[tier]
+    stats.calls += 1
+    stats.errors += int(error)
+    stats.latency_total += latency
+    stats.latency_max = max(stats.latency_max, latency)
+
+    usage = getattr(message, "usage_metadata", None) or {}
+    stats.input_tokens += usage.get("input_tokens", 0)
+    stats.output_tokens += usage.get("output_tokens", 0)
+    cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    stats.cached_input_tokens += cached
+    stats.cache_hits += int(cached > 0)
+
+
+def llm_metrics() -> dict:
+    """Per-tier call count, latency, token usage and prompt cache hits since process start."""
+    return {
+        tier: {
+            "calls": s.calls,
+            "errors": s.errors,
+            "avg_latency_s": round(s.latency_total / max(1, s.calls), 3),
+            "max_latency_s": round(s.latency_max, 3),
+            "input_tokens": s.input_tokens,
+            "cached_input_tokens": s.cached_input_tokens,
+            "cache_hit_calls": s.cache_hits,
+            "cached_input_ratio": round(s.cached_input_tokens / max(1, s.input_tokens), 3),
+            "output_tokens": s.output_tokens,
+            "avg_tokens": round((s.input_tokens + s.output_tokens) / max(1, s.calls), 1),
+        }
+        for tier, s in _stats.items()
+    }
+
+
+def reset_llm_metrics() -> None:
+    _stats.clear()
@@ -0,0 +1,61 @@
+"""Shared AsyncOpenAI client with per-endpoint concurrency limits and timeouts."""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, TypeVar
+
+from openai import AsyncOpenAI
+
+T = TypeVar("T")
+
+_openai: AsyncOpenAI | None = None
+
+# endpoint name -> (max concurrent calls, timeout in seconds incl. queue wait)
+ENDPOINT_LIMITS: dict[str, tuple[int, float]] = {
+    "persona_generate": (
+        int(os.environ.get("OPENAI_PERSONA_GENERATE_CONCURRENCY", "8")),
+        float(os.environ.get("OPENAI_PERSONA_GENERATE_TIMEOUT", "30")),
+    ),
+    "image_generate": (
+        int(os.environ.get("OPENAI_IMAGE_GENERATE_CONCURRENCY", "4")),
+        float(os.environ.get("OPENAI_IMAGE_GENERATE_TIMEOUT", "90")),
+    ),
+    "embeddings": (
+        int(os.environ.get("OPENAI_EMBEDDINGS_CONCURRENCY", "4")),
+        float(os.environ.get("OPENAI_EMBEDDINGS_TIMEOUT", "30")),
+    ),
+}
+
+_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+class OpenAITimeoutError(TimeoutError):
+    """Raised when an OpenAI call (or its wait for a free slot) exceeds the endpoint timeout."""
+
+
+def get_openai() -> AsyncOpenAI:
+    global _openai
+    if _openai is None:
+        _openai = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    return _openai
+
+
+def _semaphore(endpoint: str) -> asyncio.Semaphore:
+    if endpoint not in _semaphores:
+        _semaphores[endpoint] = asyncio.Semaphore(ENDPOINT_LIMITS[endpoint][0])
+    return _semaphores[endpoint]
+
+
+async def call_openai(endpoint: str, call: Callable[[AsyncOpenAI], Awaitable[T]]) -> T:
+    """Run ``call(client)`` under the endpoint's concurrency limit and timeout.
+
+    The timeout covers both waiting for a free slot and the request itself, so
+    callers never hang longer than the configured budget.
+    """
+    timeout = ENDPOINT_LIMITS[endpoint][1]
+    try:
+        async with asyncio.timeout(timeout):
+            async with _semaphore(endpoint):
+                return await call(get_openai())
+    except TimeoutError as e:
+        raise OpenAITimeoutError(f"OpenAI {endpoint} timed out after {timeout:.0f}s") from e
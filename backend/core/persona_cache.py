@@ -0,0 +1,42 @@
+"""Process-wide TTL cache of persona system prompts for the chat hot path.
+
+Every chat turn needs the persona's system prompt; caching it keeps the
+personas lookup off the path to the first streamed token. Entries are
+invalidated by ``update_persona`` / ``delete_persona`` and expire after
+PERSONA_PROMPT_TTL seconds to bound staleness across workers.
+"""
+
+import os
+
+from core.cache import TTLCache
+
+PERSONA_PROMPT_TTL = float(os.environ.get("PERSONA_PROMPT_TTL", "300"))
+
+# persona_id -> (owner user_id, system_prompt)
+_prompts: TTLCache[str, tuple[str, str]] = TTLCache(ttl=PERSONA_PROMPT_TTL, maxsize=4096)
+
+
+def get_system_prompt(sb, persona_id: str, user_id: str) -> str | None:
+    """System prompt of a persona owned by ``user_id``, or None if not found/owned."""
+    cached = _prompts.get(persona_id)
+    if cached is not None:
+        owner_id, system_prompt = cached
+        return system_prompt if owner_id == user_id else None
+
+    result = (
+        sb.table("personas")
+        .select("user_id, system_prompt")
+        .eq("id", persona_id)
+        .eq("user_id", user_id)
+        .limit(1)
+        .execute()
+    )
+    if not result.data:
+        return None
+    system_prompt = result.data[0]["system_prompt"]
+    _prompts.set(persona_id, (user_id, system_prompt))
+    return system_prompt
+
+
+def invalidate_system_prompt(persona_id: str) -> None:
+    _prompts.invalidate(persona_id)
@@ -0,0 +1,257 @@
+"""Persona embedding index for follow discovery.
+
+Each persona's personality + background is embedded once (on create/update,
+or by the periodic backfill) and stored in ``persona_embeddings``. The
+vectors are held in an in-process index so the auto engine can pick the most
+similar not-yet-followed personas without scanning the personas table.
+"""
+
+import hashlib
+import logging
+import os
+import time
+
+import numpy as np
+
+from core.openai_client import call_openai
+from core.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.environ.get("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.environ.get("PERSONA_EMBEDDING_DIMENSIONS", "256"))
+# Reload from the DB after this many seconds to pick up other workers' writes
+PERSONA_INDEX_REFRESH = float(os.environ.get("PERSONA_INDEX_REFRESH", "600"))
+BACKFILL_BATCH_SIZE = 100
+_PAGE_SIZE = 1000
+
+
+def persona_text(persona: dict) -> str:
+    """Text that represents a persona's interests for similarity search."""
+    return (
+        f"Personality: {persona.get('personality') or ''}\n"
+        f"Background: {persona.get('background') or ''}"
+    )
+
+
+def _source_hash(text: str) -> str:
+    return hashlib.sha256(f"{EMBEDDING_MODEL}:{EMBEDDING_DIMENSIONS}:{text}".encode()).hexdigest()
+
+
+def _normalize(vectors) -> np.ndarray:
+    """L2-normalize a vector, or each row of a matrix, as float32."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class PersonaIndex:
+    """Exact cosine-similarity index over L2-normalized persona vectors.
+
+    Vectors are rows of one float32 matrix (grown by doubling), so a query
+    is a single matrix-vector product.
+    """
+
+    def __init__(self):
+        self._ids: list[str] = []
+        self._pos: dict[str, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self.loaded_at: float | None = None
+
+    def _reserve(self, rows: int, dims: int) -> None:
+        if rows <= self._matrix.shape[0]:
+            return
+        grown = np.zeros((max(rows, 2 * self._matrix.shape[0], 64), dims), dtype=np.float32)
+        if self._ids:
+            grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = grown
+
+    def upsert(self, persona_id: str, vector) -> None:
+        vector = _normalize(vector)
+        pos = self._pos.get(persona_id)
+        if pos is None:
+            pos = len(self._ids)
+            self._reserve(pos + 1, vector.shape[0])
+            self._pos[persona_id] = pos
+            self._ids.append(persona_id)
+        self._matrix[pos] = vector
+
+    def remove(self, persona_id: str) -> None:
+        pos = self._pos.pop(persona_id, None)
+        if pos is None:
+            return
+        last = len(self._ids) - 1
+        last_id = self._ids.pop()
+        if last_id != persona_id:
+            self._ids[pos] = last_id
+            self._matrix[pos] = self._matrix[last]
+            self._pos[last_id] = pos
+
+    def get(self, persona_id: str) -> np.ndarray | None:
+        pos = self._pos.get(persona_id)
+        return None if pos is None else self._matrix[pos].copy()
+
+    def replace_all(self, rows: list[tuple[str, list[float]]]) -> None:
+        self._ids, self._pos = [], {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        for persona_id, vector in rows:
+            self.upsert(persona_id, vector)
+        self.loaded_at = time.monotonic()
+
+    def top_k(self, query: np.ndarray, k: int, exclude: set[str]) -> list[tuple[str, float]]:
+        """The ``k`` most similar personas not in ``exclude``, best first."""
+        n = len(self._ids)
+        if not n or k <= 0:
+            return []
+        scores = self._matrix[:n] @ query
+        for persona_id in exclude:
+            pos = self._pos.get(persona_id)
+            if pos is not None:
+                scores[pos] = -np.inf
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._ids[i], float(scores[i])) for i in top if scores[i] != -np.inf]
+
+    def similarities(self, query: np.ndarray, persona_ids) -> dict[str, float]:
+        """Cosine similarity of ``query`` to each of ``persona_ids`` in the index."""
+        found = [pid for pid in persona_ids if pid in self._pos]
+        if not found:
+            return {}
+        scores = self._matrix[[self._pos[pid] for pid in found]] @ query
+        return dict(zip(found, scores.tolist()))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+_index = PersonaIndex()
+
+
+def _ensure_loaded(sb) -> PersonaIndex:
+    if _index.loaded_at is not None and time.monotonic() - _index.loaded_at < PERSONA_INDEX_REFRESH:
+        return _index
+
+    rows: list[tuple[str, list[float]]] = []
+    start = 0
+    while True:
+        page = (
+            sb.table("persona_embeddings")
+            .select("persona_id, embedding")
+            .eq("model", EMBEDDING_MODEL)
+            .range(start, start + _PAGE_SIZE - 1)
+            .execute()
+        )
+        rows.extend((r["persona_id"], r["embedding"]) for r in page.data)
+        if len(page.data) < _PAGE_SIZE:
+            break
+        start += _PAGE_SIZE
+
+    _index.replace_all(rows)
+    logger.info("Persona index loaded (%d personas)", len(_index))
+    return _index
+
+
+async def embed_texts(texts: list[str]) -> list[list[float]]:
+    response = await call_openai(
+        "embeddings",
+        lambda client: client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=texts,
+            dimensions=EMBEDDING_DIMENSIONS,
+        ),
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+def _store(sb, rows: list[tuple[str, str, list[float]]]) -> None:
+    """Upsert (persona_id, source_hash, embedding) rows and update the index."""
+    sb.table("persona_embeddings").upsert([
+        {
+            "persona_id": persona_id,
+            "model": EMBEDDING_MODEL,
+            "embedding": _normalize(vector).tolist(),
+            "source_hash": source_hash,
+        }
+        for persona_id, source_hash, vector in rows
+    ]).execute()
+    for persona_id, _, vector in rows:
+        _index.upsert(persona_id, vector)
+
+
+async def index_persona(persona: dict) -> None:
+    """Embed a persona (if its text changed) and add it to the index.
+
+    Safe to run as a background task: failures are logged, not raised.
+    """
+    try:
+        sb = get_supabase()
+        source_hash = _source_hash(persona_text(persona))
+        existing = (
+            sb.table("persona_embeddings")
+            .select("source_hash")
+            .eq("persona_id", persona["id"])
+            .limit(1)
+            .execute()
+        )
+        if existing.data and existing.data[0]["source_hash"] == source_hash:
+            return
+        [vector] = await embed_texts([persona_text(persona)])
+        _store(sb, [(persona["id"], source_hash, vector)])
+    except Exception:
+        logger.exception("Failed to index persona %s", persona.get("id"))
+
+
+async def backfill_persona_embeddings(limit: int = BACKFILL_BATCH_SIZE) -> int:
+    """Embed personas that have no (or a stale) embedding, in one batch.
+
+    Returns:
+        Number of personas embedded.
+    """
+    sb = get_supabase()
+    personas = sb.table("personas").select("id, personality, background").execute().data
+    stored = {
+        r["persona_id"]: r["source_hash"]
+        for r in sb.table("persona_embeddings").select("persona_id, source_hash").execute().data
+    }
+
+    pending = []
+    for persona in personas:
+        source_hash = _source_hash(persona_text(persona))
+        if stored.get(persona["id"]) != source_hash:
+            pending.append((persona, source_hash))
+        if len(pending) >= limit:
+            break
+    if not pending:
+        return 0
+
+    vectors = await embed_texts([persona_text(p) for p, _ in pending])
+    _store(sb, [(p["id"], h, v) for (p, h), v in zip(pending, vectors)])
+    logger.info("Backfilled %d persona embeddings", len(pending))
+    return len(pending)
+
+
+def remove_persona(persona_id: str) -> None:
+    """Drop a deleted persona from the in-memory index (the row cascades)."""
+    _index.remove(persona_id)
+
+
+def similar_personas(persona_id: str, k: int, exclude: set[str]) -> list[str]:
+    """Ids of the ``k`` personas most similar to ``persona_id``, excluding ``exclude``.
+
+    Returns an empty list when the persona has no embedding yet.
+    """
+    index = _ensure_loaded(get_supabase())
+    query = index.get(persona_id)
+    if query is None:
+        return []
+    return [pid for pid, _ in index.top_k(query, k, exclude | {persona_id})]
+
+
+def persona_similarities(persona_id: str, others: set[str]) -> dict[str, float]:
+    """Cosine similarity of ``persona_id`` to each of ``others`` that has an embedding."""
+    index = _ensure_loaded(get_supabase())
+    query = index.get(persona_id)
+    if query is None:
+        return {}
+    return index.similarities(query, others)
@@ -9,6 +9,9 @@ from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
 from core.activity import auto_interact, run_activity
+from core.follow_graph import refresh_follow_suggestions
+from core.persona_index import backfill_persona_embeddings
+from core.search_index import SEARCH_INDEX_REFRESH, refresh_search_index
 from core.supabase_client import get_supabase
 
 logger = logging.getLogger(__name__)
@@ -133,10 +136,46 @@ def _register_auto_interact_job() -> None:
     logger.info("Auto-interact job registered (every 1 hour)")
 
 
+def _register_persona_index_job() -> None:
+    """Register the periodic persona embedding backfill (runs every 30 minutes)."""
+    scheduler.add_job(
+        backfill_persona_embeddings,
+        trigger=IntervalTrigger(minutes=30),
+        id="persona_embeddings",
+        replace_existing=True,
+    )
+    logger.info("Persona embedding backfill job registered (every 30 minutes)")
+
+
+def _register_follow_suggestions_job() -> None:
+    """Register the periodic follow suggestion refresh (runs every hour)."""
+    scheduler.add_job(
+        refresh_follow_suggestions,
+        trigger=IntervalTrigger(hours=1),
+        id="follow_suggestions",
+        replace_existing=True,
+    )
+    logger.info("Follow suggestions job registered (every 1 hour)")
+
+
+def _register_search_index_job() -> None:
+    """Register the search index delta refresh (runs every SEARCH_INDEX_REFRESH seconds)."""
+    scheduler.add_job(
+        refresh_search_index,
+        trigger=IntervalTrigger(seconds=SEARCH_INDEX_REFRESH),
+        id="search_index",
+        replace_existing=True,
+    )
+    logger.info("Search index refresh job registered (every %.0f seconds)", SEARCH_INDEX_REFRESH)
+
+
 def start_scheduler() -> None:
     """Start the scheduler and load all active schedules."""
     load_all_schedules()
     _register_auto_interact_job()
+    _register_persona_index_job()
+    _register_follow_suggestions_job()
+    _register_search_index_job()
     scheduler.start()
     logger.info("Activity scheduler started")
 
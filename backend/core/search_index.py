@@ -0,0 +1,366 @@
+"""In-process full-text index over posts, comments and personas.
+
+Documents are tokenised with a light Korean-aware analyser: text is split
+into Hangul / Latin-digit runs, trailing particles (조사) are stripped from
+Hangul words, and every Hangul word also contributes its character bigrams
+so compounds match their parts ("고양이사진" ↔ "사진"). Matches are ranked
+with BM25; the last query word is also expanded as a prefix over the
+vocabulary for search-as-you-type.
+
+The index is built from the DB in a worker thread on the first search and
+kept current by the write paths (``index_document`` / ``remove_document``).
+Other workers' writes reach it through ``search_changes``, a change log
+filled by DB triggers: the scheduler calls ``refresh_search_index`` every
+SEARCH_INDEX_REFRESH seconds, which re-reads only the documents changed
+since the last refresh. Each worker still holds its own copy of the index.
+"""
+
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from core.cache import SingleFlight
+from core.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+SearchKind = Literal["post", "comment", "persona"]
+DocKey = tuple[str, str]  # (kind, id)
+
+SEARCH_INDEX_REFRESH = float(os.environ.get("SEARCH_INDEX_REFRESH", "30"))
+# Changes are re-read this far back from the cursor: a transaction that
+# commits late carries an older changed_at than rows already applied
+SEARCH_CHANGE_OVERLAP = float(os.environ.get("SEARCH_CHANGE_OVERLAP", "60"))
+# search_changes rows older than this are deleted by the refresh
+SEARCH_CHANGE_RETENTION = float(os.environ.get("SEARCH_CHANGE_RETENTION", "86400"))
+PREFIX_EXPANSIONS = 20
+_PAGE_SIZE = 1000
+_FETCH_CHUNK = 200
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Query term weights: whole words/stems, prefix expansions, Hangul bigrams
+WORD_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.7
+BIGRAM_WEIGHT = 0.4
+
+_TOKEN_RE = re.compile(r"[가-힣]+|[0-9a-z]+")
+_HANGUL_RE = re.compile(r"[가-힣]+")
+# Common particles and endings, longest first so "에서는" wins over "는"
+_PARTICLES = sorted(
+    (
+        "에서는", "으로는", "에게서", "이라고", "이라는", "에서", "에게", "한테", "으로",
+        "이랑", "까지", "부터", "처럼", "보다", "라고", "라는", "하고", "이나", "이다",
+        "입니다", "은", "는", "이", "가", "을", "를", "에", "의", "도", "로", "와", "과",
+        "랑", "만", "요",
+    ),
+    key=len,
+    reverse=True,
+)
+
+# Source table and searchable columns per kind
+_SOURCES: dict[str, tuple[str, str]] = {
+    "post": ("sns_posts", "id, content"),
+    "comment": ("sns_comments", "id, content"),
+    "persona": ("personas", "id, name, personality, background"),
+}
+
+
+def document_text(kind: str, row: dict) -> str:
+    """Searchable text of a DB row of the given kind."""
+    if kind == "persona":
+        return " ".join(row.get(field) or "" for field in ("name", "personality", "background"))
+    return row.get("content") or ""
+
+
+def _words(text: str) -> list[str]:
+    return _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def _stem(word: str) -> str | None:
+    """Word without its trailing particle, if one leaves at least one syllable."""
+    for particle in _PARTICLES:
+        if word.endswith(particle) and len(word) > len(particle):
+            return word[: -len(particle)]
+    return None
+
+
+def _bigrams(word: str) -> list[str]:
+    return [word[i:i + 2] for i in range(len(word) - 1)] if len(word) > 2 else []
+
+
+def analyze(text: str) -> list[str]:
+    """Index terms of a text (words, particle-stripped stems, Hangul bigrams)."""
+    terms: list[str] = []
+    for word in _words(text):
+        terms.append(word)
+        if _HANGUL_RE.fullmatch(word):
+            stem = _stem(word)
+            if stem:
+                terms.append(stem)
+            terms.extend(_bigrams(word))
+    return terms
+
+
+class SearchIndex:
+    """Inverted index with BM25 scoring over (kind, id) documents."""
+
+    def __init__(self):
+        self._postings: defaultdict[str, dict[DocKey, int]] = defaultdict(dict)
+        self._doc_terms: dict[DocKey, Counter] = {}
+        self._doc_len: dict[DocKey, int] = {}
+        self._total_len = 0
+        self._vocab: list[str] | None = None  # sorted, rebuilt lazily for prefix lookups
+        self.loaded_at: float | None = None
+
+    def add(self, kind: str, doc_id: str, text: str) -> None:
+        key = (kind, doc_id)
+        self.remove(kind, doc_id)
+        terms = Counter(analyze(text))
+        if not terms:
+            return
+        for term, tf in terms.items():
+            if term not in self._postings:
+                self._vocab = None
+            self._postings[term][key] = tf
+        self._doc_terms[key] = terms
+        self._doc_len[key] = sum(terms.values())
+        self._total_len += self._doc_len[key]
+
+    def remove(self, kind: str, doc_id: str) -> None:
+        key = (kind, doc_id)
+        terms = self._doc_terms.pop(key, None)
+        if terms is None:
+            return
+        for term in terms:
+            docs = self._postings[term]
+            docs.pop(key, None)
+            if not docs:
+                del self._postings[term]
+                self._vocab = None
+        self._total_len -= self._doc_len.pop(key)
+
+    def replace_all(self, docs: list[tuple[str, str, str]]) -> None:
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}
+        self._doc_len = {}
+        self._total_len = 0
+        self._vocab = None
+        for kind, doc_id, text in docs:
+            self.add(kind, doc_id, text)
+        self.loaded_at = time.monotonic()
+
+    def _prefix_terms(self, prefix: str) -> list[str]:
+        if self._vocab is None:
+            self._vocab = sorted(self._postings)
+        start = bisect.bisect_left(self._vocab, prefix)
+        matches = []
+        for term in self._vocab[start:]:
+            if not term.startswith(prefix) or len(matches) >= PREFIX_EXPANSIONS:
+                break
+            if term != prefix:
+                matches.append(term)
+        return matches
+
+    def query_terms(self, query: str, prefix: bool = True) -> dict[str, float]:
+        """Weighted terms of a query; the last word is expanded as a prefix."""
+        weights: dict[str, float] = {}
+
+        def add(term: str, weight: float) -> None:
+            weights[term] = max(weights.get(term, 0.0), weight)
+
+        words = _words(query)
+        for word in words:
+            add(word, WORD_WEIGHT)
+            if _HANGUL_RE.fullmatch(word):
+                stem = _stem(word)
+                if stem:
+                    add(stem, WORD_WEIGHT)
+                for bigram in _bigrams(word):
+                    add(bigram, BIGRAM_WEIGHT)
+        if prefix and words:
+            for term in self._prefix_terms(words[-1]):
+                add(term, PREFIX_WEIGHT)
+        return weights
+
+    def search(self, query: str, kind: str, limit: int) -> list[tuple[str, float]]:
+        """Top (id, score) matches of one kind, best first."""
+        n_docs = len(self._doc_terms)
+        if not n_docs:
+            return []
+        avg_len = self._total_len / n_docs
+
+        scores: defaultdict[str, float] = defaultdict(float)
+        for term, weight in self.query_terms(query).items():
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for key, tf in docs.items():
+                if key[0] != kind:
+                    continue
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[key] / avg_len)
+                scores[key[1]] += weight * idf * tf * (BM25_K1 + 1) / norm
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(doc_id, round(score, 4)) for doc_id, score in best]
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+
+# (kind, id, text); text is None for documents that no longer exist
+Change = tuple[str, str, str | None]
+
+_index = SearchIndex()
+_cursor: datetime | None = None  # changed_at of the newest applied change
+_loads: SingleFlight[str] = SingleFlight()
+
+
+def _load_documents(sb) -> list[tuple[str, str, str]]:
+    docs: list[tuple[str, str, str]] = []
+    for kind, (table, columns) in _SOURCES.items():
+        start = 0
+        while True:
+            page = (
+                sb.table(table)
+                .select(columns)
+                .order("id")
+                .range(start, start + _PAGE_SIZE - 1)
+                .execute()
+            )
+            docs.extend((kind, row["id"], document_text(kind, row)) for row in page.data)
+            if len(page.data) < _PAGE_SIZE:
+                break
+            start += _PAGE_SIZE
+    return docs
+
+
+def _latest_change(sb) -> datetime | None:
+    result = (
+        sb.table("search_changes")
+        .select("changed_at")
+        .order("changed_at", desc=True)
+        .limit(1)
+        .execute()
+    )
+    return datetime.fromisoformat(result.data[0]["changed_at"]) if result.data else None
+
+
+def _load_all() -> tuple[SearchIndex, datetime | None]:
+    """Build a full index (runs in a worker thread)."""
+    sb = get_supabase()
+    # Read before the documents so writes made during the load are replayed
+    cursor = _latest_change(sb)
+    index = SearchIndex()
+    index.replace_all(_load_documents(sb))
+    return index, cursor
+
+
+def _read_changes(sb, since: datetime | None) -> list[dict]:
+    rows: list[dict] = []
+    start = 0
+    while True:
+        query = sb.table("search_changes").select("kind, doc_id, deleted, changed_at")
+        if since is not None:
+            query = query.gte("changed_at", (since - timedelta(seconds=SEARCH_CHANGE_OVERLAP)).isoformat())
+        page = query.order("changed_at").order("id").range(start, start + _PAGE_SIZE - 1).execute()
+        rows.extend(page.data)
+        if len(page.data) < _PAGE_SIZE:
+            return rows
+        start += _PAGE_SIZE
+
+
+def _fetch_changes(since: datetime | None) -> tuple[list[Change], datetime | None]:
+    """Current text of every document changed since ``since`` (runs in a worker thread)."""
+    sb = get_supabase()
+    rows = _read_changes(sb, since)
+
+    # Oldest first, so the last change of a document wins
+    latest: dict[DocKey, bool] = {}
+    for row in rows:
+        if row["kind"] in _SOURCES:
+            latest[(row["kind"], row["doc_id"])] = row["deleted"]
+
+    changes: list[Change] = []
+    live: defaultdict[str, list[str]] = defaultdict(list)
+    for (kind, doc_id), deleted in latest.items():
+        if deleted:
+            changes.append((kind, doc_id, None))
+        else:
+            live[kind].append(doc_id)
+    for kind, ids in live.items():
+        table, columns = _SOURCES[kind]
+        texts: dict[str, str] = {}
+        for i in range(0, len(ids), _FETCH_CHUNK):
+            result = sb.table(table).select(columns).in_("id", ids[i:i + _FETCH_CHUNK]).execute()
+            texts.update((row["id"], document_text(kind, row)) for row in result.data)
+        # A row missing here was deleted after its change was logged
+        changes.extend((kind, doc_id, texts.get(doc_id)) for doc_id in ids)
+
+    expired = datetime.now(timezone.utc) - timedelta(seconds=SEARCH_CHANGE_RETENTION)
+    sb.table("search_changes").delete().lt("changed_at", expired.isoformat()).execute()
+
+    cursor = datetime.fromisoformat(rows[-1]["changed_at"]) if rows else since
+    return changes, cursor
+
+
+def apply_changes(index: SearchIndex, changes: list[Change]) -> None:
+    for kind, doc_id, text in changes:
+        if text is None:
+            index.remove(kind, doc_id)
+        else:
+            index.add(kind, doc_id, text)
+
+
+async def _load() -> None:
+    global _index, _cursor
+    index, cursor = await asyncio.to_thread(_load_all)
+    _index, _cursor = index, cursor
+    logger.info("Search index loaded (%d documents)", len(index))
+
+
+async def _ensure_loaded() -> SearchIndex:
+    if _index.loaded_at is None:
+        await _loads.do("all", _load)
+    return _index
+
+
+async def refresh_search_index() -> None:
+    """Apply documents changed since the last refresh, by any worker (scheduler job)."""
+    global _cursor
+    if _index.loaded_at is None:
+        return  # the first search loads everything
+    changes, cursor = await asyncio.to_thread(_fetch_changes, _cursor)
+    apply_changes(_index, changes)
+    _cursor = cursor
+    if changes:
+        logger.debug("Search index refreshed (%d changed documents)", len(changes))
+
+
+def index_document(kind: SearchKind, row: dict) -> None:
+    """Add or replace a row in the index after it was written to the DB."""
+    if _index.loaded_at is None:
+        return  # picked up by the first full load
+    _index.add(kind, row["id"], document_text(kind, row))
+
+
+def remove_document(kind: SearchKind, doc_id: str) -> None:
+    """Drop a deleted row from the index."""
+    _index.remove(kind, doc_id)
+
+
+async def search(query: str, kind: SearchKind, limit: int) -> list[tuple[str, float]]:
+    """Top (id, score) matches of ``kind`` for a query, best first."""
+    return (await _ensure_loaded()).search(query, kind, limit)
@@ -0,0 +1,93 @@
+"""Streaming transfer of remote files into Supabase Storage."""
+
+import hashlib
+import os
+
+import httpx
+
+BUCKET = "persona-images"
+
+# Size cap for generated images (default 20MB)
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when a streamed file exceeds the configured size cap."""
+
+
+def _storage_headers(content_type: str, upsert: bool) -> dict:
+    key = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+    return {
+        "Authorization": f"Bearer {key}",
+        "apikey": key,
+        "Content-Type": content_type,
+        "cache-control": "max-age=3600",
+        "x-upsert": "true" if upsert else "false",
+    }
+
+
+async def stream_url_to_storage(
+    source_url: str,
+    file_path: str,
+    *,
+    content_type: str = "image/png",
+    max_bytes: int = MAX_IMAGE_BYTES,
+    hash_content: bool = False,
+    upsert: bool = False,
+) -> dict:
+    """Pipe a remote file into Storage chunk by chunk without buffering it.
+
+    The download is consumed as an async iterator and handed to the Storage
+    upload as a chunked request body, so only one chunk is held in memory at
+    a time. Exceeding ``max_bytes`` aborts the upload before it is committed.
+
+    Args:
+        source_url: URL of the file to download (e.g. provider output URL).
+        file_path: Destination path inside the bucket.
+        content_type: Content type stored with the object.
+        max_bytes: Size cap; ImageTooLargeError is raised when exceeded.
+        hash_content: Compute a SHA-256 digest while streaming.
+        upsert: Overwrite an existing object at the same path.
+
+    Returns:
+        dict with file_path, size, and sha256 (None unless hash_content).
+    """
+    storage_url = os.environ["SUPABASE_URL"].rstrip("/")
+    digest = hashlib.sha256() if hash_content else None
+    size = 0
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0)) as http:
+        async with http.stream("GET", source_url) as resp:
+            if resp.status_code != 200:
+                raise RuntimeError(f"Failed to download image: HTTP {resp.status_code}")
+
+            declared = resp.headers.get("content-length")
+            if declared and int(declared) > max_bytes:
+                raise ImageTooLargeError(f"Image is {declared} bytes (limit {max_bytes})")
+
+            async def body():
+                nonlocal size
+                async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ImageTooLargeError(f"Image exceeds {max_bytes} bytes")
+                    if digest is not None:
+                        digest.update(chunk)
+                    yield chunk
+
+            upload = await http.post(
+                f"{storage_url}/storage/v1/object/{BUCKET}/{file_path}",
+                content=body(),
+                headers=_storage_headers(content_type, upsert),
+            )
+            if upload.status_code >= 300:
+                raise RuntimeError(
+                    f"Storage upload failed: HTTP {upload.status_code} {upload.text[:200]}"
+                )
+
+    return {
+        "file_path": file_path,
+        "size": size,
+        "sha256": digest.hexdigest() if digest is not None else None,
+    }
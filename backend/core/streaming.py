@@ -0,0 +1,114 @@
+"""Coalescing sender for streamed LLM tokens over a WebSocket.
+
+Token chunks are pushed without awaiting the socket; a writer task joins
+whatever arrived within a short window (STREAM_COALESCE_WINDOW) or up to
+STREAM_MAX_CHARS into one ``stream`` frame. A send that takes longer than
+STREAM_SLOW_SEND means the client is not keeping up (the ASGI server waits
+for its write buffer to drain), so the window doubles up to
+STREAM_MAX_WINDOW and batches grow; fast sends shrink it back.
+"""
+
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable
+
+STREAM_COALESCE_WINDOW = float(os.environ.get("STREAM_COALESCE_WINDOW", "0.03"))
+STREAM_MAX_WINDOW = float(os.environ.get("STREAM_MAX_WINDOW", "0.5"))
+STREAM_MAX_CHARS = int(os.environ.get("STREAM_MAX_CHARS", "512"))
+STREAM_SLOW_SEND = float(os.environ.get("STREAM_SLOW_SEND", "0.05"))
+
+
+class StreamSender:
+    """Batches pushed chunks into ``stream`` frames sent by a writer task."""
+
+    def __init__(
+        self,
+        send_text: Callable[[str], Awaitable[None]],
+        *,
+        window: float = STREAM_COALESCE_WINDOW,
+        max_window: float = STREAM_MAX_WINDOW,
+        max_chars: int = STREAM_MAX_CHARS,
+        slow_send: float = STREAM_SLOW_SEND,
+    ):
+        self._send_text = send_text
+        self.base_window = window
+        self.window = window
+        self.max_window = max_window
+        self.max_chars = max_chars
+        self.slow_send = slow_send
+        self._parts: list[str] = []  # full response
+        self._pending: list[str] = []
+        self._pending_chars = 0
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.chunks = 0
+        self.frames = 0
+        self._task = asyncio.create_task(self._run(), name="stream-sender")
+
+    def push(self, chunk: str) -> None:
+        """Queue a chunk. Raises the writer's error if the socket already failed."""
+        if self._task.done():
+            self._task.result()
+        self._parts.append(chunk)
+        self._pending.append(chunk)
+        self._pending_chars += len(chunk)
+        self.chunks += 1
+        self._ready.set()
+
+    def _batch_chars(self) -> int:
+        # Slow clients get proportionally larger batches
+        return int(self.max_chars * self.window / self.base_window) if self.base_window else self.max_chars
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                if self._closed:
+                    return
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            # Coalescing window: collect more chunks unless the batch is full
+            deadline = loop.time() + self.window
+            while not self._closed and self._pending_chars < self._batch_chars():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            text = "".join(self._pending)
+            self._pending.clear()
+            self._pending_chars = 0
+            started = loop.time()
+            await self._send_text(json.dumps({"type": "stream", "content": text, "done": False}))
+            self.frames += 1
+            self._adapt(loop.time() - started)
+
+    def _adapt(self, elapsed: float) -> None:
+        if elapsed > self.slow_send:
+            self.window = min(max(self.window, 0.001) * 2, self.max_window)
+        else:
+            self.window = max(self.base_window, self.window / 2)
+
+    @property
+    def text(self) -> str:
+        """Everything pushed so far, sent or not."""
+        return "".join(self._parts)
+
+    async def finish(self) -> str:
+        """Send what is left and return the full response text."""
+        self._closed = True
+        self._ready.set()
+        await self._task
+        return self.text
+
+    async def aclose(self) -> None:
+        """Stop the writer without sending the remainder (error paths)."""
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
@@ -0,0 +1,187 @@
+"""In-memory trending post counters.
+
+Likes and comments are counted into fixed time buckets covering a sliding
+window (TRENDING_WINDOW). A post's trending score is the sum of its bucket
+counts, each decayed exponentially by the bucket's age (TRENDING_HALF_LIFE),
+so fresh engagement outweighs older engagement and nothing older than the
+window counts at all. Likes and comments are counted separately, so an
+unlike only takes back like weight (newest buckets first) and a deleted
+comment only comment weight; a score never drops below zero. After a
+restart the window is rebuilt from the likes/comments created inside it,
+retried every TRENDING_WARM_RETRY seconds until a load succeeds.
+"""
+
+import logging
+import math
+import os
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from core.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+TRENDING_BUCKET_SECONDS = int(os.environ.get("TRENDING_BUCKET_SECONDS", "300"))
+TRENDING_WINDOW = int(os.environ.get("TRENDING_WINDOW", str(24 * 3600)))
+TRENDING_HALF_LIFE = float(os.environ.get("TRENDING_HALF_LIFE", str(6 * 3600)))
+TRENDING_WARM_RETRY = float(os.environ.get("TRENDING_WARM_RETRY", "60"))
+
+# Engagement weights
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 3.0
+
+_PAGE_SIZE = 1000
+
+
+class TrendingCounter:
+    """Sliding window of per-bucket engagement counts with decayed scoring."""
+
+    def __init__(self, bucket_seconds: int, window: int, half_life: float):
+        self.bucket_seconds = bucket_seconds
+        self.window = window
+        self.decay = math.log(2) / half_life
+        # (bucket start, (post_id, kind) -> weighted count), oldest first
+        self._buckets: deque[tuple[int, Counter]] = deque()
+
+    def _bucket_start(self, ts: float) -> int:
+        return int(ts // self.bucket_seconds) * self.bucket_seconds
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._buckets and self._buckets[0][0] + self.bucket_seconds <= cutoff:
+            self._buckets.popleft()
+
+    def record(
+        self, post_id: str, weight: float, at: float | None = None, kind: str = "like"
+    ) -> None:
+        """Add ``weight`` of ``kind`` engagement; a negative weight retracts that kind only."""
+        if weight < 0:
+            self._retract((post_id, kind), -weight)
+            return
+        key = (post_id, kind)
+        now = time.time()
+        at = now if at is None else at
+        if at <= now - self.window:
+            return
+        start = self._bucket_start(at)
+        if self._buckets and self._buckets[-1][0] == start:
+            self._buckets[-1][1][key] += weight
+        elif not self._buckets or self._buckets[-1][0] < start:
+            self._buckets.append((start, Counter({key: weight})))
+        else:
+            # Out-of-order timestamp (warm-up): find or insert its bucket
+            for i, (bucket_start, counts) in enumerate(self._buckets):
+                if bucket_start == start:
+                    counts[key] += weight
+                    break
+                if bucket_start > start:
+                    self._buckets.insert(i, (start, Counter({key: weight})))
+                    break
+        self._expire(now)
+
+    def _retract(self, key: tuple[str, str], weight: float) -> None:
+        """Remove up to ``weight`` of a post's counts of one kind, newest bucket first."""
+        for _, counts in reversed(self._buckets):
+            if weight <= 0:
+                break
+            taken = min(counts.get(key, 0), weight)
+            if taken:
+                counts[key] -= taken
+                if counts[key] <= 0:
+                    del counts[key]
+                weight -= taken
+
+    def top(self, limit: int, exclude: set[str] | None = None) -> list[tuple[str, float]]:
+        """Highest-scoring posts, best first."""
+        now = time.time()
+        self._expire(now)
+        scores: Counter = Counter()
+        for start, counts in self._buckets:
+            age = now - (start + self.bucket_seconds / 2)
+            factor = math.exp(-self.decay * max(age, 0.0))
+            for (post_id, _), count in counts.items():
+                scores[post_id] += count * factor
+        exclude = exclude or set()
+        ranked = (
+            (post_id, round(score, 4))
+            for post_id, score in scores.most_common()
+            if score > 0 and post_id not in exclude
+        )
+        return [item for _, item in zip(range(limit), ranked)]
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+_counter = TrendingCounter(TRENDING_BUCKET_SECONDS, TRENDING_WINDOW, TRENDING_HALF_LIFE)
+_warmed = False
+_warm_retry_at = 0.0
+
+
+def _timestamp(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _warm_up() -> None:
+    """Rebuild the window from likes/comments created inside it.
+
+    Runs once per process; a failed load is dropped and retried after
+    TRENDING_WARM_RETRY seconds.
+    """
+    global _warmed, _warm_retry_at
+    if _warmed or time.monotonic() < _warm_retry_at:
+        return
+    sb = get_supabase()
+    since = datetime.fromtimestamp(time.time() - TRENDING_WINDOW).astimezone().isoformat()
+    try:
+        for table, kind, weight in (
+            ("sns_likes", "like", LIKE_WEIGHT),
+            ("sns_comments", "comment", COMMENT_WEIGHT),
+        ):
+            start = 0
+            while True:
+                page = (
+                    sb.table(table)
+                    .select("post_id, created_at")
+                    .gte("created_at", since)
+                    .order("created_at")
+                    .range(start, start + _PAGE_SIZE - 1)
+                    .execute()
+                )
+                for row in page.data:
+                    _counter.record(row["post_id"], weight, _timestamp(row["created_at"]), kind)
+                if len(page.data) < _PAGE_SIZE:
+                    break
+                start += _PAGE_SIZE
+    except Exception:
+        logger.exception("Failed to warm up trending counters")
+        # Drop the partial load; the retry reads the whole window again
+        _counter.clear()
+        _warm_retry_at = time.monotonic() + TRENDING_WARM_RETRY
+        return
+    _warmed = True
+
+
+def _record(post_id: str, kind: str, weight: float) -> None:
+    if not _warmed:
+        # The next successful warm-up reads the DB after this write, so it counts it
+        _warm_up()
+        return
+    _counter.record(post_id, weight, kind=kind)
+
+
+def record_like(post_id: str, delta: int = 1) -> None:
+    """Count a like (delta=-1 for an unlike). Call after the DB write."""
+    _record(post_id, "like", LIKE_WEIGHT * delta)
+
+
+def record_comment(post_id: str, delta: int = 1) -> None:
+    """Count a comment (delta=-1 when one is deleted). Call after the DB write."""
+    _record(post_id, "comment", COMMENT_WEIGHT * delta)
+
+
+def trending_posts(limit: int, exclude: set[str] | None = None) -> list[tuple[str, float]]:
+    """Top trending (post_id, score) pairs, best first."""
+    _warm_up()
+    return _counter.top(limit, exclude)
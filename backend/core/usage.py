@@ -0,0 +1,353 @@
+"""Per-persona, per-user and per-feature accounting of LLM usage.
+
+LLM calls carry a ``UsageCallback`` (a LangChain callback handler) that
+measures time to first token and total latency and reads prompt, completion
+and cached token counts from the response's usage metadata. Calls are
+aggregated in memory into buckets keyed by USAGE_BUCKET_SECONDS period,
+feature, model, persona and user, and a background flusher writes the
+buckets to ``llm_usage`` every USAGE_FLUSH_INTERVAL seconds and on
+shutdown. Rows get their id when they are cut from the buckets, so a
+retried insert (upsert, ignore duplicates) is stored once. The table has no
+foreign keys, so pending rows of a deleted persona still write and its cost
+history is kept.
+
+``track_tokens()`` additionally sums the tokens of all calls made inside it
+(including child tasks), which core.budget charges after each activity run.
+
+Features: "chat", "decision", "compose", "decision_batch" and
+"persona_gen". Batched decisions serve several personas in one request and
+are recorded without a persona.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterator
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from core.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+USAGE_BUCKET_SECONDS = int(os.environ.get("USAGE_BUCKET_SECONDS", "60"))
+USAGE_FLUSH_INTERVAL = float(os.environ.get("USAGE_FLUSH_INTERVAL", "30"))
+# Unwritten rows kept across failed flushes before the oldest are dropped
+USAGE_BUFFER_MAX = int(os.environ.get("USAGE_BUFFER_MAX", "5000"))
+
+# (period start, feature, model, persona id, user id)
+UsageKey = tuple[str, str, str, str | None, str | None]
+
+
+@dataclass
+class _UsageTotals:
+    calls: int = 0
+    errors: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    latency_ms_total: int = 0
+    latency_ms_max: int = 0
+    ttft_ms_total: int = 0
+    ttft_samples: int = 0
+
+
+def _period_start(now: float) -> str:
+    start = now - now % USAGE_BUCKET_SECONDS
+    return datetime.fromtimestamp(start, timezone.utc).isoformat()
+
+
+class UsageRecorder:
+    """In-memory usage buckets plus the flusher task that writes them out."""
+
+    def __init__(self, flush_interval: float, max_unwritten: int):
+        self.flush_interval = flush_interval
+        self.max_unwritten = max_unwritten
+        self._buckets: dict[UsageKey, _UsageTotals] = {}
+        self._unwritten: list[dict] = []
+        self._lock: asyncio.Lock | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.flushed = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def _ensure_started(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # sync caller; rows wait for the next flush
+        if self._task and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="llm-usage-flusher")
+
+    def record(
+        self,
+        *,
+        feature: str,
+        model: str,
+        persona_id: str | None = None,
+        user_id: str | None = None,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cached_tokens: int = 0,
+        latency_ms: int = 0,
+        ttft_ms: int | None = None,
+        error: bool = False,
+    ) -> None:
+        key = (_period_start(time.time()), feature, model, persona_id, user_id)
+        totals = self._buckets.setdefault(key, _UsageTotals())
+        totals.calls += 1
+        totals.errors += int(error)
+        totals.input_tokens += input_tokens
+        totals.output_tokens += output_tokens
+        totals.cached_tokens += cached_tokens
+        totals.latency_ms_total += latency_ms
+        totals.latency_ms_max = max(totals.latency_ms_max, latency_ms)
+        if ttft_ms is not None:
+            totals.ttft_ms_total += ttft_ms
+            totals.ttft_samples += 1
+        self._ensure_started()
+
+    def _cut_rows(self) -> None:
+        buckets, self._buckets = self._buckets, {}
+        for (period_start, feature, model, persona_id, user_id), totals in buckets.items():
+            self._unwritten.append({
+                "id": str(uuid.uuid4()),
+                "period_start": period_start,
+                "feature": feature,
+                "model": model,
+                "persona_id": persona_id,
+                "user_id": user_id,
+                **asdict(totals),
+            })
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write all buckets now. Returns the number of rows written."""
+        self._cut_rows()
+        if not self._unwritten:
+            return 0
+        self._ensure_started()
+        async with self._lock:
+            rows, self._unwritten = self._unwritten, []
+            if not rows:
+                return 0
+            try:
+                await asyncio.to_thread(_write_rows, rows)
+            except Exception:
+                self.failures += 1
+                logger.exception("Failed to flush %d llm_usage rows; will retry", len(rows))
+                self._unwritten[:0] = rows
+                overflow = len(self._unwritten) - self.max_unwritten
+                if overflow > 0:
+                    del self._unwritten[:overflow]
+                    self.dropped += overflow
+                    logger.error("LLM usage buffer full; dropped %d oldest rows", overflow)
+                return 0
+            self.flushed += len(rows)
+            return len(rows)
+
+    async def stop(self) -> None:
+        """Flush what is left and stop the flusher."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._loop is asyncio.get_running_loop():
+            await self.flush()
+        self._loop = None
+
+    def snapshot(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "unwritten": len(self._unwritten),
+            "flushed": self.flushed,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+
+def _write_rows(rows: list[dict]) -> None:
+    get_supabase().table("llm_usage").upsert(
+        rows, on_conflict="id", ignore_duplicates=True
+    ).execute()
+
+
+_recorder = UsageRecorder(USAGE_FLUSH_INTERVAL, USAGE_BUFFER_MAX)
+
+
+@dataclass
+class TokenTally:
+    total: int = 0
+
+
+_tally: ContextVar[TokenTally | None] = ContextVar("llm_token_tally", default=None)
+
+
+@contextmanager
+def track_tokens() -> Iterator[TokenTally]:
+    """Sum the input + output tokens of LLM calls recorded inside the block."""
+    tally = TokenTally()
+    token = _tally.set(tally)
+    try:
+        yield tally
+    finally:
+        _tally.reset(token)
+
+
+def _count(input_tokens: int, output_tokens: int) -> None:
+    tally = _tally.get()
+    if tally is not None:
+        tally.total += input_tokens + output_tokens
+
+
+@dataclass
+class _RunTiming:
+    started: float
+    model: str
+    first_token: float | None = None
+
+
+class UsageCallback(AsyncCallbackHandler):
+    """Records every chat model run it sees under one feature/persona/user."""
+
+    def __init__(self, feature: str, persona_id: str | None = None, user_id: str | None = None):
+        self.feature = feature
+        self.persona_id = persona_id
+        self.user_id = user_id
+        self._runs: dict[UUID, _RunTiming] = {}
+
+    async def on_chat_model_start(
+        self, serialized: dict[str, Any], messages: list, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or "unknown"
+        self._runs[run_id] = _RunTiming(started=time.monotonic(), model=model)
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is not None and run.first_token is None and token:
+            run.first_token = time.monotonic()
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        usage: dict = {}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or usage
+        model = (response.llm_output or {}).get("model_name") or run.model
+        self._record(run, model, usage)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            self._record(run, run.model, {}, error=True)
+
+    def _record(self, run: _RunTiming, model: str, usage: dict, *, error: bool = False) -> None:
+        now = time.monotonic()
+        _count(usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+        _recorder.record(
+            feature=self.feature,
+            model=model,
+            persona_id=self.persona_id,
+            user_id=self.user_id,
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+            cached_tokens=(usage.get("input_token_details") or {}).get("cache_read") or 0,
+            latency_ms=round((now - run.started) * 1000),
+            ttft_ms=None if run.first_token is None else round((run.first_token - run.started) * 1000),
+            error=error,
+        )
+
+
+def record_usage(
+    feature: str,
+    model: str,
+    started: float,
+    *,
+    persona_id: str | None = None,
+    user_id: str | None = None,
+    usage: Any = None,
+    error: bool = False,
+) -> None:
+    """Record a call made with the OpenAI client directly (no LangChain callbacks).
+
+    ``started`` is time.monotonic() at the start of the call; ``usage`` is the
+    response's ``usage`` object.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    input_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    output_tokens = getattr(usage, "completion_tokens", 0) or 0
+    _count(input_tokens, output_tokens)
+    _recorder.record(
+        feature=feature,
+        model=model,
+        persona_id=persona_id,
+        user_id=user_id,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+        latency_ms=round((time.monotonic() - started) * 1000),
+        error=error,
+    )
+
+
+async def flush_usage() -> int:
+    return await _recorder.flush()
+
+
+async def stop_usage() -> None:
+    await _recorder.stop()
+
+
+def usage_metrics() -> dict:
+    return {**_recorder.snapshot(), "flush_interval": USAGE_FLUSH_INTERVAL}
+
+
+def summarize_usage(rows: list[dict]) -> list[dict]:
+    """Sum ``llm_usage`` rows per feature and model."""
+    totals: dict[tuple[str, str], _UsageTotals] = {}
+    for row in rows:
+        t = totals.setdefault((row["feature"], row["model"]), _UsageTotals())
+        t.calls += row["calls"]
+        t.errors += row["errors"]
+        t.input_tokens += row["input_tokens"]
+        t.output_tokens += row["output_tokens"]
+        t.cached_tokens += row["cached_tokens"]
+        t.latency_ms_total += row["latency_ms_total"]
+        t.latency_ms_max = max(t.latency_ms_max, row["latency_ms_max"])
+        t.ttft_ms_total += row["ttft_ms_total"]
+        t.ttft_samples += row["ttft_samples"]
+    return [
+        {
+            "feature": feature,
+            "model": model,
+            "calls": t.calls,
+            "errors": t.errors,
+            "input_tokens": t.input_tokens,
+            "output_tokens": t.output_tokens,
+            "cached_tokens": t.cached_tokens,
+            "avg_latency_ms": round(t.latency_ms_total / max(1, t.calls)),
+            "max_latency_ms": t.latency_ms_max,
+            "avg_ttft_ms": round(t.ttft_ms_total / t.ttft_samples) if t.ttft_samples else None,
+        }
+        for (feature, model), t in sorted(totals.items())
+    ]
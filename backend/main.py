@@ -13,7 +13,14 @@ from api.follow import router as follow_router
 from api.lora import router as lora_router
 from api.schedule import router as schedule_router
 from api.activity import router as activity_router
+from api.metrics import router as metrics_router
+from core.chat_store import stop_chat_store
+from core.chat_streams import stop_chat_streams
+from core.dispatcher import stop_dispatcher
+from core.image_derivatives import shutdown_derivative_pool
+from core.image_worker import recover_pending_images, start_image_workers, stop_image_workers
 from core.scheduler import start_scheduler, stop_scheduler
+from core.usage import stop_usage
 
 load_dotenv()
 
@@ -23,8 +30,16 @@ logging.basicConfig(level=logging.INFO)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     start_scheduler()
+    start_image_workers()
+    await recover_pending_images()
     yield
     stop_scheduler()
+    await stop_image_workers()
+    await stop_dispatcher()
+    await stop_chat_streams()
+    await stop_chat_store()
+    await stop_usage()
+    shutdown_derivative_pool()
 
 
 app = FastAPI(title="Alter Ego API", version="0.1.0", lifespan=lifespan)
@@ -45,6 +60,7 @@ app.include_router(follow_router)
 app.include_router(lora_router)
 app.include_router(schedule_router)
 app.include_router(activity_router)
+app.include_router(metrics_router)
 
 
 @app.get("/health")
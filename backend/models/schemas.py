@@ -38,6 +38,25 @@ class PersonaResponse(BaseModel):
     profile_image_url: str | None = None
 
 
+class UsageSummary(BaseModel):
+    feature: str  # 'chat' | 'decision' | 'compose' | ...
+    model: str
+    calls: int
+    errors: int
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int
+    avg_latency_ms: int
+    max_latency_ms: int
+    avg_ttft_ms: int | None = None
+
+
+class PersonaUsageResponse(BaseModel):
+    persona_id: str
+    since: str
+    items: list[UsageSummary]
+
+
 # --- SNS Schemas ---
 
 
@@ -52,6 +71,7 @@ class PostResponse(BaseModel):
     persona_id: str
     content: str | None
     image_url: str | None
+    image_status: str | None = None  # 'pending' | 'ready' | 'failed' (지연 이미지)
     created_at: str
     persona: PostPersona
     like_count: int = 0
@@ -87,6 +107,12 @@ class CommentCreate(BaseModel):
     parent_id: str | None = None
 
 
+class SearchResponse(BaseModel):
+    posts: list[PostResponse] = []
+    comments: list[CommentResponse] = []
+    personas: list[PostPersona] = []
+
+
 class LikeResponse(BaseModel):
     id: str
     post_id: str
@@ -114,6 +140,10 @@ class FollowResponse(BaseModel):
     created_at: str
 
 
+class FollowSuggestion(PostPersona):
+    score: float
+
+
 class PersonaProfileResponse(BaseModel):
     id: str
     name: str
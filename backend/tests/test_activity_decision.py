@@ -0,0 +1,201 @@
+"""Tests for structured activity decisions (core.activity.decide_activity)."""
+
+from contextlib import contextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from core.activity import ActivityDecision, decide_activity
+
+POST_ID = "11111111-1111-1111-1111-111111111111"
+
+
+def _state(**overrides) -> dict:
+    state = {
+        "persona_id": "p1",
+        "command": "React to your feed",
+        "triggered_by": "auto",
+        "user_id": "u1",
+        "persona": {"name": "Bot"},
+        "recent_posts": [
+            {"id": POST_ID, "persona_id": "p2", "content": "hello", "personas": {"name": "Other"}},
+        ],
+        "recent_logs": [],
+    }
+    state.update(overrides)
+    return state
+
+
+def _decision(**fields) -> ActivityDecision:
+    base = {
+        "activity_type": "post",
+        "content": "",
+        "target_post_id": "",
+        "target_persona_id": "",
+        "needs_image": False,
+    }
+    return ActivityDecision(**{**base, **fields})
+
+
+def _output(parsed: ActivityDecision | None, error: Exception | None = None) -> dict:
+    return {"raw": AIMessage(content="{}"), "parsed": parsed, "parsing_error": error}
+
+
+@contextmanager
+def _llm_outputs(*outputs):
+    """LLM 구조화 응답을 호출 순서대로 돌려주도록 패치."""
+    runnables = []
+    for output in outputs:
+        runnable = MagicMock()
+        runnable.ainvoke = AsyncMock(return_value=output)
+        runnables.append(runnable)
+    with patch("core.activity._structured", side_effect=runnables) as structured, \
+            patch("core.activity._build_llm"):
+        yield structured
+
+
+@pytest.mark.asyncio
+async def test_valid_decision_uses_single_call():
+    """스키마에 맞고 유효한 결정은 한 번의 호출로 끝남."""
+    with _llm_outputs(_output(_decision(activity_type="like", target_post_id=POST_ID))) as llm:
+        result = await decide_activity(_state())
+
+    assert llm.call_count == 1
+    assert result["activity_type"] == "like"
+    assert result["target_post_id"] == POST_ID
+
+
+@pytest.mark.asyncio
+async def test_invalid_target_is_repaired_once():
+    """존재하지 않는 포스트 대상이면 한 번 수정 요청."""
+    with _llm_outputs(
+        _output(_decision(activity_type="comment", content="nice", target_post_id="made-up")),
+        _output(_decision(activity_type="comment", content="nice", target_post_id=POST_ID)),
+    ) as llm:
+        result = await decide_activity(_state())
+
+    assert llm.call_count == 2
+    assert result["activity_type"] == "comment"
+    assert result["target_post_id"] == POST_ID
+
+
+@pytest.mark.asyncio
+async def test_unrepairable_decision_skips_instead_of_posting():
+    """수정 후에도 실패하면 임의 포스트 대신 skip."""
+    with _llm_outputs(
+        _output(None, ValueError("bad json")),
+        _output(_decision(activity_type="post", content="  ")),
+    ):
+        result = await decide_activity(_state())
+
+    assert result["activity_type"] == "skip"
+    assert result["content"] == ""
+    assert result["result"]["skipped"] is True
+
+
+@pytest.mark.asyncio
+async def test_auto_decision_uses_fast_tier_and_composes_content():
+    """auto 트리거는 fast 티어로 결정하고, 포스트 본문은 quality 티어가 작성."""
+    from core.activity import route_decision
+
+    with _llm_outputs(_output(_decision(activity_type="post", content="share sunset"))), \
+            patch("core.activity._build_llm") as build:
+        result = await decide_activity(_state(triggered_by="auto"))
+
+    assert build.call_args.args[0] == "fast"
+    assert result["decision_tier"] == "fast"
+    assert route_decision({**_state(), **result}) == "compose_content"
+
+    with _llm_outputs(_output(_decision(activity_type="like", target_post_id=POST_ID))):
+        manual = await decide_activity(_state(triggered_by="manual"))
+    assert manual["decision_tier"] == "quality"
+    assert route_decision({**_state(), **manual}) == "execute_action"
+
+
+def test_batch_requests_respects_size_and_token_limits():
+    """배치는 최대 크기와 토큰 예산을 넘지 않도록 분할."""
+    import core.activity as activity
+
+    states = [_state(persona_id=f"p{i}") for i in range(5)]
+    sizes = [len(b) for b in activity.batch_requests(states, max_size=2, max_tokens=100_000)]
+    assert sizes == [2, 2, 1]
+
+    # 토큰 예산이 요청 두 개 분량이면 크기 제한과 무관하게 2개씩
+    per_request = (
+        activity.estimate_tokens(activity._batch_request_text("r00", states[0]))
+        + activity.BATCH_DECISION_OUTPUT_TOKENS
+    )
+    max_tokens = activity.estimate_tokens(activity.BATCH_DECISION_SYSTEM_PROMPT) + 2 * per_request + 10
+    sizes = [len(b) for b in activity.batch_requests(states, max_size=8, max_tokens=max_tokens)]
+    assert sizes == [2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_decide_batch_isolates_invalid_items():
+    """배치 내 잘못된 결정은 해당 페르소나만 None, 나머지는 유지."""
+    from core.activity import BatchDecision, BatchItemDecision, decide_batch
+
+    parsed = BatchDecision(decisions=[
+        BatchItemDecision(**_decision(activity_type="like", target_post_id=POST_ID).model_dump(),
+                          request_id="r0"),
+        BatchItemDecision(**_decision(activity_type="comment", content="", target_post_id=POST_ID).model_dump(),
+                          request_id="r1"),
+    ])
+    with patch("core.activity._build_llm") as build:
+        build.return_value.with_structured_output.return_value.ainvoke = AsyncMock(
+            return_value=_output(parsed),
+        )
+        results = await decide_batch([
+            _state(persona_id="a"), _state(persona_id="b"), _state(persona_id="c"),
+        ])
+
+    assert build.call_args.args[0] == "fast"
+    assert results[0]["activity_type"] == "like"
+    assert results[0]["decision_tier"] == "fast"
+    assert results[1] is None  # empty comment
+    assert results[2] is None  # missing from batch
+
+
+@pytest.mark.asyncio
+async def test_decide_batch_content_instruction_is_per_request():
+    """저하 모드 요청은 최종 본문, 나머지는 한 줄 메모를 요청하고 배치 전체 지시와 충돌하지 않음."""
+    from core.activity import BatchDecision, decide_batch
+
+    with patch("core.activity._build_llm") as build:
+        invoke = build.return_value.with_structured_output.return_value.ainvoke = AsyncMock(
+            return_value=_output(BatchDecision(decisions=[])),
+        )
+        await decide_batch([_state(persona_id="a"), _state(persona_id="b", degraded=True)])
+
+    user_msg = invoke.call_args.args[0][1].content
+    normal, degraded = user_msg.split("### request_id: r1")
+    assert "Content: a one-line note" in normal
+    assert "Content: write the final post/comment text" in degraded
+    assert "one-line note" not in degraded
+
+
+@pytest.mark.asyncio
+async def test_failed_compose_skips_instead_of_posting_the_note():
+    """본문 작성이 실패하거나 비어 있으면 fast 티어 메모를 게시하지 않고 skip."""
+    from core.activity import check_image, compose_content
+
+    state = {**_state(), "activity_type": "post", "content": "share sunset", "needs_image": True}
+
+    with patch("core.activity._build_llm") as build:
+        build.return_value.ainvoke = AsyncMock(side_effect=RuntimeError("timeout"))
+        failed = await compose_content(state)
+    assert failed["activity_type"] == "skip"
+    assert failed["content"] == ""
+    assert failed["result"]["skipped"] is True
+    assert check_image({**state, **failed}) == "execute_action"
+
+    with patch("core.activity._build_llm") as build:
+        build.return_value.ainvoke = AsyncMock(return_value=AIMessage(content="  "))
+        empty = await compose_content(state)
+    assert empty["activity_type"] == "skip"
+
+    with patch("core.activity._build_llm") as build:
+        build.return_value.ainvoke = AsyncMock(return_value=AIMessage(content="노을이 예쁘다"))
+        composed = await compose_content(state)
+    assert composed == {"content": "노을이 예쁘다"}
@@ -0,0 +1,68 @@
+"""Tests for autonomous activity budgets (core.budget)."""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from core.budget import ActivityBudget
+
+
+def test_runs_beyond_persona_budget_are_skipped_with_backoff():
+    """페르소나 실행 한도를 넘으면 건너뛰고, 연속으로 막히면 대기 시간을 늘림."""
+    budget = ActivityBudget()
+    with patch("core.budget.BUDGET_PERSONA_RUNS_PER_HOUR", 2), \
+            patch("core.budget.BUDGET_BACKOFF_BASE", 60):
+        assert budget.admit("u1", "p1", now=0).allowed
+        assert budget.admit("u1", "p1", now=1).allowed
+        first = budget.admit("u1", "p1", now=2)
+        assert not first.allowed
+        assert first.retry_after >= 60
+
+        # 대기 중에는 버킷을 보지 않고 바로 거절
+        assert budget.admit("u1", "p1", now=30).reason == "backing off"
+        # 다른 페르소나는 영향 없음
+        assert budget.admit("u1", "p2", now=30).allowed
+
+        # 한 시간에 2회 → 30분에 1회 충전
+        assert budget.admit("u1", "p1", now=2 + first.retry_after).allowed
+
+
+def test_low_token_budget_degrades_then_debt_blocks():
+    """토큰이 적게 남으면 저하 모드로 허용하고, 초과 사용(부채)이면 거절."""
+    budget = ActivityBudget()
+    with patch("core.budget.BUDGET_USER_TOKENS_PER_HOUR", 10_000):
+        assert not budget.admit("u1", "p1", now=0).degraded
+
+        budget.charge("u1", "p1", 8_000, now=0)
+        admission = budget.admit("u1", "p1", now=1)
+        assert admission.allowed and admission.degraded
+
+        budget.charge("u1", "p1", 5_000, now=1)
+        assert not budget.admit("u1", "p1", now=2).allowed
+        # 같은 유저의 다른 페르소나도 유저 예산에 묶임
+        assert not budget.admit("u1", "p2", now=2).allowed
+
+
+@pytest.mark.asyncio
+async def test_scheduled_run_is_skipped_when_budget_is_exhausted():
+    """예산이 없으면 스케줄 실행은 그래프를 돌리지 않고 skip."""
+    from core.activity import run_activity
+    from core.budget import Admission
+
+    with patch("core.activity.admit_activity",
+               return_value=Admission(False, retry_after=120, reason="budget exhausted")), \
+            patch("core.activity.activity_graph.ainvoke", AsyncMock()) as graph:
+        result = await run_activity("p1", "post something", "schedule", "u1")
+
+    graph.assert_not_called()
+    assert result["activity_type"] == "skip"
+    assert result["result"] == {"skipped": True, "reason": "budget exhausted", "retry_after": 120}
+
+
+def test_degraded_fast_decision_skips_compose():
+    """저하 모드에서는 fast 결정의 본문을 그대로 쓰고 quality 작성 단계를 건너뜀."""
+    from core.activity import route_decision
+
+    state = {"decision_tier": "fast", "activity_type": "post", "needs_image": False}
+    assert route_decision(state) == "compose_content"
+    assert route_decision({**state, "degraded": True}) == "execute_action"
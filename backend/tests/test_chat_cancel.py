@@ -0,0 +1,63 @@
+"""Tests for cancelling an in-flight chat generation (api.chat)."""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from api.chat import _stream_reply
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames: list[dict] = []
+
+    async def send_text(self, text: str) -> None:
+        self.frames.append(json.loads(text))
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_llm_stream_and_saves_partial_reply():
+    """생성 취소 시 LLM 스트림이 닫히고, 그때까지의 부분 응답만 저장."""
+    started = asyncio.Event()
+    closed = False
+
+    async def fake_stream_chat(**kwargs):
+        nonlocal closed
+        try:
+            yield "안녕"
+            yield "하세요"
+            started.set()
+            await asyncio.sleep(60)  # 긴 응답 생성 중
+            yield "never"
+        finally:
+            closed = True
+
+    ws = FakeWebSocket()
+    with patch("api.chat.stream_chat", fake_stream_chat), \
+            patch("api.chat.enqueue_message") as enqueue:
+        task = asyncio.create_task(_stream_reply(ws, "t1", "prompt", "hi", "c1"))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert closed
+    enqueue.assert_called_once_with("t1", "assistant", "안녕하세요", "c1:assistant")
+    assert "".join(f["content"] for f in ws.frames) == "안녕하세요"
+    assert not any(f.get("done") for f in ws.frames)
+
+
+@pytest.mark.asyncio
+async def test_completed_reply_is_saved_and_marked_done():
+    async def fake_stream_chat(**kwargs):
+        yield "hello"
+
+    ws = FakeWebSocket()
+    with patch("api.chat.stream_chat", fake_stream_chat), \
+            patch("api.chat.enqueue_message") as enqueue:
+        await _stream_reply(ws, "t1", "prompt", "hi", "c1")
+
+    enqueue.assert_called_once_with("t1", "assistant", "hello", "c1:assistant")
+    assert ws.frames[-1] == {"type": "stream", "content": "", "done": True}
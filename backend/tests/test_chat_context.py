@@ -0,0 +1,91 @@
+"""Tests for chat context hydration from chat_messages (core.graph)."""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from core import graph
+from core.graph import stream_chat
+
+
+def _sb(*results: list[dict]) -> MagicMock:
+    """조회마다 다음 결과(최신순 행)를 돌려주는 Supabase mock."""
+    sb = MagicMock()
+    query = (
+        sb.table.return_value.select.return_value.eq.return_value
+        .order.return_value.order.return_value.limit.return_value
+    )
+    query.execute.side_effect = [SimpleNamespace(data=rows) for rows in results]
+    return sb
+
+
+def _row(key: str, role: str, content: str) -> dict:
+    return {"id": f"id-{key}", "client_message_id": key, "role": role, "content": content}
+
+
+FIRST_TAIL = [
+    _row("c2", "user", "hello again"),  # 이번 턴 (이미 저장됨)
+    _row("c1:assistant", "assistant", "hi!"),
+    _row("c1", "user", "hi"),
+]
+
+
+def _fake_events(reply: list[str], seen: list):
+    async def astream_events(inputs, **kwargs):
+        seen.append(inputs["messages"])
+        for token in reply:
+            yield {"event": "on_chat_model_stream", "data": {"chunk": SimpleNamespace(content=token)}}
+    return astream_events
+
+
+@pytest.mark.asyncio
+async def test_context_is_hydrated_once_then_checked_cheaply():
+    """첫 턴에만 버퍼를 비우고 DB에서 복원, 이후 턴은 최신 행 하나만 확인하고 캐시 사용."""
+    graph._contexts.clear()
+    # 두 번째 턴: 최신 행은 이 워커가 쓴 어시스턴트 응답
+    sb = _sb(FIRST_TAIL, [_row("c2:assistant", "assistant", "yo")])
+    seen: list = []
+
+    with patch("core.graph.get_supabase", return_value=sb), \
+            patch("core.graph.flush_messages", AsyncMock()) as flush, \
+            patch.object(graph.chat_graph, "astream_events", _fake_events(["yo"], seen)):
+        chunks = [c async for c in stream_chat("You are Mina.", "hello again", "t1", client_message_id="c2")]
+        [c async for c in stream_chat("You are Mina.", "bye", "t1", client_message_id="c3")]
+
+    assert chunks == ["yo"]
+    assert flush.await_count == 1
+    assert sb.table.call_count == 2
+
+    first, second = seen
+    assert isinstance(first[0], SystemMessage)
+    assert [m.content for m in first[1:]] == ["hi", "hi!", "hello again"]
+    assert [type(m) for m in second[1:]] == [HumanMessage, AIMessage, HumanMessage, AIMessage, HumanMessage]
+    assert [m.content for m in second[1:]] == ["hi", "hi!", "hello again", "yo", "bye"]
+    graph._contexts.clear()
+
+
+@pytest.mark.asyncio
+async def test_turn_served_by_another_worker_rehydrates():
+    """최신 행이 이 워커가 모르는 메시지면(다른 워커의 턴) DB에서 다시 복원."""
+    graph._contexts.clear()
+    second_tail = [
+        _row("c4", "user", "bye"),  # 이번 턴 (이미 저장됨)
+        _row("x1:assistant", "assistant", "sure"),
+        _row("x1", "user", "elsewhere"),
+        _row("c2:assistant", "assistant", "yo"),
+        *FIRST_TAIL,
+    ]
+    sb = _sb(FIRST_TAIL, [_row("x1:assistant", "assistant", "sure")], second_tail)
+    seen: list = []
+
+    with patch("core.graph.get_supabase", return_value=sb), \
+            patch("core.graph.flush_messages", AsyncMock()) as flush, \
+            patch.object(graph.chat_graph, "astream_events", _fake_events(["yo"], seen)):
+        [c async for c in stream_chat("You are Mina.", "hello again", "t1", client_message_id="c2")]
+        [c async for c in stream_chat("You are Mina.", "bye", "t1", client_message_id="c4")]
+
+    assert flush.await_count == 2
+    assert [m.content for m in seen[1][1:]] == ["hi", "hi!", "hello again", "yo", "elsewhere", "sure", "bye"]
+    graph._contexts.clear()
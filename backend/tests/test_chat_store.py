@@ -0,0 +1,141 @@
+"""Tests for write-behind chat message persistence (core.chat_store)."""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.chat_store import ChatMessageBuffer, _write_batch
+
+
+def _row(i: int) -> dict:
+    return {"thread_id": "t1", "role": "user", "content": f"m{i}", "client_message_id": f"c{i}"}
+
+
+@pytest.mark.asyncio
+async def test_size_threshold_flushes_in_batches():
+    """flush_size 이상 쌓이면 배치 단위로 저장."""
+    written: list[list[dict]] = []
+    buffer = ChatMessageBuffer(flush_size=3, flush_interval=60, max_pending=100)
+
+    with patch("core.chat_store._write_batch", side_effect=lambda rows: written.append(rows)):
+        for i in range(7):
+            buffer.enqueue(_row(i))
+        # 크기 초과로 flusher가 깨어남 (GC 등으로 늦어질 수 있어 고정 대기 대신 폴링)
+        for _ in range(100):
+            if sum(map(len, written)) == 7:
+                break
+            await asyncio.sleep(0.01)
+
+        assert [len(b) for b in written] == [3, 3, 1]
+        assert [r["content"] for b in written for r in b] == [f"m{i}" for i in range(7)]
+        await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_and_stop_flushes():
+    """저장 실패 시 행을 유지했다가 재시도, 종료 시 남은 행 저장."""
+    written: list[dict] = []
+    calls = 0
+
+    def flaky(rows):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError("db down")
+        written.extend(rows)
+
+    buffer = ChatMessageBuffer(flush_size=10, flush_interval=60, max_pending=100)
+    with patch("core.chat_store._write_batch", side_effect=flaky):
+        buffer.enqueue(_row(0))
+        buffer.enqueue(_row(1))
+
+        assert await buffer.flush() == 0
+        assert buffer.snapshot()["pending"] == 2
+
+        await buffer.stop()
+
+    assert [r["client_message_id"] for r in written] == ["c0", "c1"]
+    assert buffer.snapshot() == {"pending": 0, "flushed": 2, "batches": 1, "failures": 1, "dropped": 0}
+
+
+@pytest.mark.asyncio
+async def test_buffer_drops_oldest_rows_when_full():
+    buffer = ChatMessageBuffer(flush_size=10, flush_interval=60, max_pending=2)
+    with patch("core.chat_store._write_batch", side_effect=ConnectionError("db down")):
+        for i in range(3):
+            buffer.enqueue(_row(i))
+        await buffer.flush()
+
+        assert buffer.snapshot()["dropped"] == 1
+        assert [r["content"] for r in buffer._pending] == ["m1", "m2"]
+        buffer._pending.clear()
+        await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_flush_waits_for_a_write_in_progress():
+    """다른 flush가 쓰는 중이면 끝날 때까지 기다린 뒤 반환 (이미 꺼낸 행도 저장 완료)."""
+    import threading
+
+    started, release = threading.Event(), threading.Event()
+    written: list[dict] = []
+
+    def slow(rows):
+        started.set()
+        release.wait(timeout=1)
+        written.extend(rows)
+
+    buffer = ChatMessageBuffer(flush_size=10, flush_interval=60, max_pending=100)
+    with patch("core.chat_store._write_batch", side_effect=slow):
+        buffer.enqueue(_row(0))
+        first = asyncio.create_task(buffer.flush())
+        await asyncio.to_thread(started.wait, 1)
+
+        second = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0.01)
+        assert not second.done()
+
+        release.set()
+        await asyncio.gather(first, second)
+        assert [r["content"] for r in written] == ["m0"]
+        await buffer.stop()
+
+
+class _ForeignKeyError(Exception):
+    code = "23503"
+
+
+@pytest.mark.asyncio
+async def test_rows_of_deleted_thread_do_not_block_the_batch():
+    """삭제된 스레드의 행 때문에 배치가 실패하면 나머지는 개별 저장하고 해당 행만 버림."""
+    written: list[dict] = []
+
+    def write(rows):
+        if any(r["thread_id"] == "gone" for r in rows):
+            raise _ForeignKeyError("violates foreign key constraint")
+        written.extend(rows)
+
+    buffer = ChatMessageBuffer(flush_size=10, flush_interval=60, max_pending=100)
+    with patch("core.chat_store._write_batch", side_effect=write):
+        buffer.enqueue(_row(0))
+        buffer.enqueue({**_row(1), "thread_id": "gone"})
+        buffer.enqueue(_row(2))
+
+        assert await buffer.flush() == 2
+        await buffer.stop()
+
+    assert [r["content"] for r in written] == ["m0", "m2"]
+    assert buffer.snapshot()["pending"] == 0
+    assert buffer.snapshot()["dropped"] == 1
+
+
+def test_duplicate_key_is_scoped_to_the_thread():
+    """client_message_id는 스레드 안에서만 멱등 키 (다른 스레드의 같은 id는 별도 메시지)."""
+    sb = MagicMock()
+    with patch("core.chat_store.get_supabase", return_value=sb):
+        _write_batch([_row(0), {**_row(0), "thread_id": "t2"}])
+
+    upsert = sb.table.return_value.upsert
+    assert upsert.call_args.kwargs["on_conflict"] == "thread_id,client_message_id"
+    assert len(upsert.call_args.args[0]) == 2
@@ -0,0 +1,99 @@
+"""Tests for resumable SSE chat streams (core.chat_streams)."""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from core import chat_streams
+from core.chat_streams import ChatStream, get_stream, start_stream
+
+
+async def _collect(stream: ChatStream, after: int = 0) -> list[int]:
+    ids = []
+    async for batch in stream.follow(after):
+        ids.extend(event_id for event_id, _, _ in batch)
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_events_after_last_event_id():
+    """Last-Event-ID 이후 이벤트만 재전송하고 스트림 종료까지 이어서 수신."""
+    release = asyncio.Event()
+
+    async def run(stream: ChatStream) -> None:
+        for i in range(3):
+            stream.append("delta", {"content": str(i)})
+        await release.wait()
+        stream.append("done", {"content": ""})
+
+    stream = ChatStream("s1", "t1", "u1")
+    stream.start(run)
+    await asyncio.sleep(0)
+
+    resumed = asyncio.create_task(_collect(stream, after=2))
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await resumed == [3, 4]
+    assert [e[1] for e in stream.events] == ["delta", "delta", "delta", "done"]
+    assert stream.done
+
+
+@pytest.mark.asyncio
+async def test_events_arriving_during_a_write_are_batched():
+    """구독자가 쓰는 동안 쌓인 이벤트는 한 배치로 전달."""
+    stream = ChatStream("s2", "t1", "u1")
+    batches = []
+
+    async def slow_reader():
+        async for batch in stream.follow():
+            batches.append([e[0] for e in batch])
+            await asyncio.sleep(0.02)
+
+    reader = asyncio.create_task(slow_reader())
+    stream.append("delta", {"content": "a"})
+    await asyncio.sleep(0.005)
+    for c in "bcd":
+        stream.append("delta", {"content": c})
+    stream.close()
+    await reader
+
+    assert batches == [[1], [2, 3, 4]]
+
+
+@pytest.mark.asyncio
+async def test_orphaned_stream_is_cancelled_after_grace():
+    """구독자가 없는 채로 유예 시간이 지나면 생성 취소."""
+    cancelled = asyncio.Event()
+
+    async def run(stream: ChatStream) -> None:
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with patch("core.chat_streams.SSE_RESUME_GRACE", 0.01):
+        stream = ChatStream("s3", "t1", "u1")
+        stream.start(run)
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+    await asyncio.gather(stream.task, return_exceptions=True)
+    assert stream.done
+
+
+@pytest.mark.asyncio
+async def test_stream_ids_are_scoped_to_the_user():
+    """다른 사용자가 같은 스트림 id를 써도 서로의 스트림을 덮어쓰거나 찾지 않음."""
+    async def run(stream: ChatStream) -> None:
+        stream.append("done", {"content": stream.user_id})
+
+    with patch.object(chat_streams, "_streams", {}):
+        mine = start_stream("same", "t1", "u1", run)
+        theirs = start_stream("same", "t2", "u2", run)
+
+        assert get_stream("u1", "same") is mine
+        assert get_stream("u2", "same") is theirs
+        assert get_stream("u3", "same") is None
+        await asyncio.gather(mine.task, theirs.task)
@@ -0,0 +1,86 @@
+"""Tests for the priority-aware generation dispatcher (core.dispatcher)."""
+
+import asyncio
+
+import pytest
+
+from core.dispatcher import Priority, ProviderQueue, QueueFullError, TokenBucket
+
+
+def test_token_bucket_refills(monkeypatch):
+    """토큰 소진 후 rate에 따라 다시 채워짐."""
+    now = [0.0]
+    monkeypatch.setattr("core.dispatcher.time.monotonic", lambda: now[0])
+
+    bucket = TokenBucket(rate=2.0, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.wait_time() == pytest.approx(0.5)
+
+    now[0] += 0.5
+    assert bucket.try_acquire()
+
+
+@pytest.mark.asyncio
+async def test_higher_priority_runs_first():
+    """대기 중인 작업은 우선순위(interactive > auto) 순으로 실행."""
+    queue = ProviderQueue(
+        "test", rate_per_minute=6000, burst=100, concurrency=1, max_queue_per_priority=10,
+    )
+    order: list[str] = []
+    gate = asyncio.Event()
+
+    async def blocker():
+        await gate.wait()
+
+    def job(name):
+        async def run():
+            order.append(name)
+        return run
+
+    first = asyncio.create_task(queue.submit(Priority.AUTO, blocker))
+    await asyncio.sleep(0)
+    tasks = [
+        asyncio.create_task(queue.submit(Priority.AUTO, job("auto"))),
+        asyncio.create_task(queue.submit(Priority.SCHEDULE, job("schedule"))),
+        asyncio.create_task(queue.submit(Priority.INTERACTIVE, job("interactive"))),
+    ]
+    await asyncio.sleep(0.01)
+    gate.set()
+    await asyncio.gather(first, *tasks)
+    await queue.stop()
+
+    assert order == ["interactive", "schedule", "auto"]
+
+
+@pytest.mark.asyncio
+async def test_full_priority_class_is_rejected():
+    """우선순위별 큐가 가득 차면 QueueFullError, 다른 우선순위는 영향 없음."""
+    queue = ProviderQueue(
+        "test", rate_per_minute=6000, burst=100, concurrency=1, max_queue_per_priority=1,
+    )
+    gate = asyncio.Event()
+
+    async def blocker():
+        await gate.wait()
+        return "ok"
+
+    running = asyncio.create_task(queue.submit(Priority.AUTO, blocker))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(queue.submit(Priority.AUTO, blocker))
+    await asyncio.sleep(0)
+
+    with pytest.raises(QueueFullError):
+        await queue.submit(Priority.AUTO, blocker)
+    interactive = asyncio.create_task(queue.submit(Priority.INTERACTIVE, blocker))
+    await asyncio.sleep(0)
+
+    gate.set()
+    assert await asyncio.gather(running, waiting, interactive) == ["ok"] * 3
+    snapshot = queue.snapshot()
+    await queue.stop()
+
+    assert snapshot["priorities"]["auto"]["rejected"] == 1
+    assert snapshot["priorities"]["auto"]["completed"] == 2
+    assert snapshot["priorities"]["interactive"]["completed"] == 1
@@ -0,0 +1,50 @@
+"""Tests for friends-of-friends follow suggestions (core.follow_graph)."""
+
+import math
+
+from core.follow_graph import FollowGraph
+
+
+def test_csr_adjacency():
+    """CSR 구조에서 팔로잉 목록과 out-degree 조회."""
+    graph = FollowGraph([("a", "b"), ("a", "c"), ("b", "c"), ("a", "b")])
+    a, b, c = (graph.index[x] for x in "abc")
+
+    assert sorted(graph.following(a)) == [b, c]  # 중복 엣지 제거
+    assert graph.out_degree(b) == 1
+    assert graph.out_degree(c) == 0
+
+
+def test_suggest_excludes_self_and_followed():
+    """자기 자신과 이미 팔로우한 페르소나는 추천에서 제외."""
+    graph = FollowGraph([
+        ("me", "f1"), ("me", "f2"),
+        ("f1", "me"), ("f1", "f2"), ("f1", "x"),
+        ("f2", "x"), ("f2", "y"),
+    ])
+
+    suggestions = graph.suggest(graph.index["me"], top_n=10)
+
+    ids = [pid for pid, _ in suggestions]
+    assert ids[0] == "x"  # 두 명의 팔로잉이 모두 팔로우
+    assert set(ids) == {"x", "y"}
+
+
+def test_suggest_downweights_prolific_followers():
+    """많이 팔로우하는 중간 페르소나를 통한 경로는 가중치가 낮음."""
+    edges = [("me", "hub"), ("me", "picky"), ("picky", "quiet")]
+    edges += [("hub", f"n{i}") for i in range(20)]
+    graph = FollowGraph(edges)
+
+    suggestions = dict(graph.suggest(graph.index["me"], top_n=30))
+
+    assert suggestions["quiet"] > suggestions["n0"]
+
+
+def test_suggest_all_skips_personas_without_follows():
+    graph = FollowGraph([("a", "b"), ("b", "c")])
+
+    result = graph.suggest_all(top_n=5)
+
+    assert result["a"] == [("c", round(1 / math.log(3), 4))]
+    assert "c" not in result
@@ -0,0 +1,114 @@
+"""Tests for generation coalescing and result caching (core.cache, core.image_gen)."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from core.cache import SingleFlight, TTLCache
+
+
+def test_ttl_cache_expires(monkeypatch):
+    """TTL이 지나면 캐시 항목 만료."""
+    now = [100.0]
+    monkeypatch.setattr("core.cache.time.monotonic", lambda: now[0])
+
+    cache: TTLCache[str, int] = TTLCache(ttl=10)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+    now[0] += 11
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_evicts_oldest():
+    """maxsize 초과 시 가장 오래된 항목 제거."""
+    cache: TTLCache[str, int] = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # a를 최근 사용으로
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    """동시에 들어온 동일 키 요청은 한 번만 실행."""
+    flight: SingleFlight[str] = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    assert calls == 1
+    assert [r for r, _ in results] == ["result"] * 5
+    assert sum(shared for _, shared in results) == 4
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_errors():
+    """실행 실패 시 대기 중인 호출도 같은 예외를 받음."""
+    flight: SingleFlight[str] = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(
+        flight.do("k", fail), flight.do("k", fail), return_exceptions=True,
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_generation_key_normalizes_prompt():
+    """공백/대소문자만 다른 프롬프트는 같은 키."""
+    from core.image_gen import generation_key
+
+    a = generation_key("dall-e-3", None, "A  cat\non a Sofa ", {"size": "1024x1024"})
+    b = generation_key("dall-e-3", None, "a cat on a sofa", {"size": "1024x1024"})
+    c = generation_key("dall-e-3", "alter-ego/x:1", "a cat on a sofa", {"size": "1024x1024"})
+    assert a == b
+    assert a != c
+
+
+@pytest.mark.asyncio
+async def test_generate_image_to_storage_serves_repeats_from_cache():
+    """동일 요청 반복 시 모델은 한 번만 호출하고 blob 참조만 추가."""
+    import core.image_gen as image_gen
+
+    uploaded = {
+        "file_path": "images/abc.png",
+        "public_url": "https://cdn.example/images/abc.png",
+        "size": 10,
+        "sha256": "abc",
+        "variants": None,
+        "deduplicated": False,
+    }
+    image_gen._generation_cache.clear()
+
+    with patch.object(image_gen, "generate_dalle_image", AsyncMock(return_value="https://x/y.png")) as dalle, \
+            patch.object(image_gen, "upload_image_to_storage", AsyncMock(return_value=uploaded)), \
+            patch.object(image_gen, "acquire_blob", return_value={"created": False, "variants": None}) as acquire, \
+            patch.object(image_gen, "get_supabase", return_value=MagicMock()):
+        first = await image_gen.generate_image_to_storage(
+            prompt="sunset", persona_id="p1", user_id="u1",
+        )
+        second = await image_gen.generate_image_to_storage(
+            prompt="Sunset ", persona_id="p1", user_id="u1",
+        )
+
+    assert dalle.await_count == 1
+    assert acquire.call_count == 1
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["file_path"] == first["file_path"]
+    image_gen._generation_cache.clear()
@@ -0,0 +1,92 @@
+"""Tests for thumbnail derivatives (core.image_derivatives)."""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+from PIL import Image
+
+from core import image_derivatives
+from core.image_derivatives import (
+    _render_derivatives,
+    create_derivatives,
+    derivative_path,
+    variant_path,
+    variant_url,
+)
+
+VARIANTS = {"sm": {"webp": "derivatives/a/b/sm.webp"}, "md": {"webp": "derivatives/a/b/md.webp"}}
+
+
+def _png(size: tuple[int, int], mode: str = "RGB") -> bytes:
+    buf = io.BytesIO()
+    Image.new(mode, size).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _serving(body: bytes):
+    """원본 다운로드를 가로채는 httpx.Client 팩토리."""
+    real_client = httpx.Client
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+
+    def factory(*args, **kwargs):
+        return real_client(transport=transport)
+
+    return factory
+
+
+def test_derivative_path_is_deterministic():
+    """원본 경로에서 확장자를 뗀 위치에 크기·포맷별 경로 생성."""
+    assert derivative_path("a/b.png", "sm", "webp") == "derivatives/a/b/sm.webp"
+    assert derivative_path("a/b.png", "md", "avif") == "derivatives/a/b/md.avif"
+
+
+def test_variant_path_falls_back_to_original():
+    """full 요청, 파생본 없음, 해당 크기·포맷 없음이면 원본 경로."""
+    assert variant_path("a/b.png", VARIANTS, "sm") == "derivatives/a/b/sm.webp"
+    assert variant_path("a/b.png", VARIANTS, "full") == "a/b.png"
+    assert variant_path("a/b.png", None, "sm") == "a/b.png"
+    assert variant_path("a/b.png", {"md": VARIANTS["md"]}, "sm") == "a/b.png"
+    assert variant_path("a/b.png", VARIANTS, "sm", "avif") == "a/b.png"
+
+
+def test_variant_url_uses_variant_path():
+    sb = MagicMock()
+    bucket = sb.storage.from_.return_value
+    bucket.get_public_url.side_effect = lambda path: f"https://cdn.example/{path}"
+
+    assert variant_url(sb, "a/b.png", VARIANTS, "md") == "https://cdn.example/derivatives/a/b/md.webp"
+    assert variant_url(sb, "a/b.png", None, "md") == "https://cdn.example/a/b.png"
+
+
+def test_render_derivatives_fits_each_size():
+    """긴 변 기준으로 크기별 썸네일을 만들고, 팔레트 이미지도 변환해서 인코딩."""
+    with patch("core.image_derivatives.httpx.Client", _serving(_png((1000, 500), "P"))):
+        rendered = _render_derivatives("https://cdn.example/a/b.png")
+
+    assert set(rendered) == {"sm", "md"}
+    for size, edge in image_derivatives.DERIVATIVE_SIZES.items():
+        assert set(rendered[size]) == set(image_derivatives.DERIVATIVE_FORMATS)
+        thumb = Image.open(io.BytesIO(rendered[size]["webp"]))
+        assert thumb.format == "WEBP"
+        assert thumb.size == (edge, edge // 2)
+
+
+@pytest.mark.asyncio
+async def test_create_derivatives_uploads_every_variant():
+    """렌더링한 파생본을 결정적 경로로 업로드하고 variants 맵을 반환."""
+    sb = MagicMock()
+    bucket = sb.storage.from_.return_value
+    bucket.get_public_url.return_value = "https://cdn.example/a/b.png"
+
+    with ThreadPoolExecutor(1) as pool, \
+            patch("core.image_derivatives._get_pool", return_value=pool), \
+            patch("core.image_derivatives.get_supabase", return_value=sb), \
+            patch("core.image_derivatives.httpx.Client", _serving(_png((64, 64)))):
+        variants = await create_derivatives("a/b.png")
+
+    assert variants["sm"]["webp"] == "derivatives/a/b/sm.webp"
+    uploaded = {c.kwargs["path"] for c in bucket.upload.call_args_list}
+    assert uploaded == {path for formats in variants.values() for path in formats.values()}
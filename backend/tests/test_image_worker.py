@@ -0,0 +1,78 @@
+"""Tests for the deferred post image worker (core.image_worker)."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from core.image_worker import attach_post_image, recover_pending_images
+
+JOB = {
+    "post_id": "post-1",
+    "persona": {"name": "Mina"},
+    "persona_id": "p1",
+    "user_id": "u1",
+    "content": "바다 사진",
+    "triggered_by": "schedule",
+}
+UPLOADED = {
+    "public_url": "https://cdn.example/p1/img.png",
+    "file_path": "p1/img.png",
+    "variants": {"sm": {"webp": "derivatives/p1/img/sm.webp"}},
+}
+
+
+def _sb(updated: list[dict], remaining: int) -> MagicMock:
+    sb = MagicMock()
+    sb.table.return_value.update.return_value.eq.return_value.eq.return_value.execute.return_value.data = updated
+    sb.rpc.return_value.execute.return_value.data = remaining
+    return sb
+
+
+@pytest.mark.asyncio
+async def test_image_is_attached_to_pending_post():
+    sb = _sb([{"id": "post-1"}], remaining=1)
+    with patch("core.image_worker.get_supabase", return_value=sb), \
+            patch("core.image_worker.generate_image_to_storage", AsyncMock(return_value=UPLOADED)):
+        await attach_post_image(JOB)
+
+    updates = sb.table.return_value.update.call_args.args[0]
+    assert updates["image_status"] == "ready"
+    assert updates["image_variants"] == UPLOADED["variants"]
+    sb.rpc.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_image_of_deleted_post_is_released():
+    """생성 중 포스트가 삭제되면 blob 참조를 반환하고 남은 참조가 없으면 파일 삭제."""
+    sb = _sb([], remaining=0)
+    with patch("core.image_worker.get_supabase", return_value=sb), \
+            patch("core.image_worker.generate_image_to_storage", AsyncMock(return_value=UPLOADED)), \
+            patch("core.image_worker.schedule_derivatives") as derivatives:
+        await attach_post_image(JOB)
+
+    sb.rpc.assert_called_once_with("release_image_blob", {"p_file_path": "p1/img.png"})
+    sb.storage.from_.return_value.remove.assert_called_once_with(
+        ["p1/img.png", "derivatives/p1/img/sm.webp"]
+    )
+    derivatives.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_pending_posts_are_recovered_at_startup():
+    """유실된 작업의 pending 포스트는 다시 큐에 넣고, 페르소나가 없으면 failed 처리."""
+    sb = MagicMock()
+    pending = sb.table.return_value.select.return_value.eq.return_value.lt.return_value.order.return_value
+    pending.execute.return_value.data = [
+        {"id": "post-1", "persona_id": "p1", "content": "바다 사진",
+         "personas": {"id": "p1", "name": "Mina", "user_id": "u1"}},
+        {"id": "post-2", "persona_id": "p2", "content": "산", "personas": None},
+    ]
+    with patch("core.image_worker.get_supabase", return_value=sb), \
+            patch("core.image_worker.enqueue_post_image", return_value=True) as enqueue:
+        recovered = await recover_pending_images()
+
+    assert recovered == 1
+    job = enqueue.call_args.args[0]
+    assert (job["post_id"], job["user_id"], job["persona"]["name"]) == ("post-1", "u1", "Mina")
+    sb.table.return_value.update.assert_called_once_with({"image_status": "failed"})
+    sb.table.return_value.update.return_value.eq.assert_called_once_with("id", "post-2")
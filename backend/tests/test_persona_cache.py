@@ -0,0 +1,45 @@
+"""Tests for the chat system prompt cache (core.persona_cache)."""
+
+from unittest.mock import MagicMock
+
+from core import persona_cache
+from core.persona_cache import get_system_prompt, invalidate_system_prompt
+
+
+def _sb(rows: list[dict]) -> tuple[MagicMock, MagicMock]:
+    sb = MagicMock()
+    query = sb.table.return_value.select.return_value.eq.return_value.eq.return_value.limit.return_value
+    query.execute.return_value.data = rows
+    return sb, query
+
+
+def test_prompt_is_cached_until_invalidated():
+    """두 번째 조회는 DB 없이 캐시에서, 무효화 후에는 다시 DB 조회."""
+    persona_cache._prompts.clear()
+    sb, query = _sb([{"user_id": "u1", "system_prompt": "You are Mina."}])
+
+    assert get_system_prompt(sb, "p1", "u1") == "You are Mina."
+    assert get_system_prompt(sb, "p1", "u1") == "You are Mina."
+    assert query.execute.call_count == 1
+
+    invalidate_system_prompt("p1")
+    get_system_prompt(sb, "p1", "u1")
+    assert query.execute.call_count == 2
+    persona_cache._prompts.clear()
+
+
+def test_cached_prompt_is_not_served_to_other_users():
+    """캐시된 페르소나라도 소유자가 아니면 None."""
+    persona_cache._prompts.clear()
+    sb, query = _sb([{"user_id": "u1", "system_prompt": "You are Mina."}])
+    get_system_prompt(sb, "p1", "u1")
+
+    assert get_system_prompt(sb, "p1", "intruder") is None
+    assert query.execute.call_count == 1
+
+    # 없는 페르소나는 캐시하지 않음
+    sb, query = _sb([])
+    assert get_system_prompt(sb, "p2", "u1") is None
+    assert get_system_prompt(sb, "p2", "u1") is None
+    assert query.execute.call_count == 2
+    persona_cache._prompts.clear()
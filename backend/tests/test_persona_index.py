@@ -0,0 +1,64 @@
+"""Tests for the persona embedding index (core.persona_index)."""
+
+from core.persona_index import PersonaIndex, _source_hash, persona_text
+
+
+def test_top_k_orders_by_similarity_and_excludes():
+    """가장 유사한 순서로 반환하고 제외 목록은 건너뜀."""
+    index = PersonaIndex()
+    index.upsert("me", [1.0, 0.0, 0.0])
+    index.upsert("close", [0.9, 0.1, 0.0])
+    index.upsert("mid", [0.5, 0.5, 0.0])
+    index.upsert("far", [0.0, 0.0, 1.0])
+    index.upsert("followed", [1.0, 0.0, 0.01])
+
+    top = index.top_k(index.get("me"), k=2, exclude={"me", "followed"})
+
+    assert [pid for pid, _ in top] == ["close", "mid"]
+    assert top[0][1] > top[1][1]
+
+
+def test_remove_keeps_positions_consistent():
+    """삭제 후에도 나머지 벡터 조회가 올바름."""
+    index = PersonaIndex()
+    for i, vec in enumerate(([1, 0], [0, 1], [1, 1])):
+        index.upsert(f"p{i}", vec)
+
+    index.remove("p0")
+
+    assert len(index) == 2
+    assert index.get("p0") is None
+    assert index.top_k(index.get("p2"), k=1, exclude={"p2"})[0][0] == "p1"
+
+
+def test_source_hash_tracks_embedded_fields_only():
+    """임베딩 대상 필드가 바뀔 때만 해시 변경."""
+    persona = {"personality": "cheerful", "background": "baker", "speaking_style": "casual"}
+    base = _source_hash(persona_text(persona))
+
+    assert _source_hash(persona_text({**persona, "speaking_style": "formal"})) == base
+    assert _source_hash(persona_text({**persona, "background": "pilot"})) != base
+
+
+def test_top_k_with_fewer_candidates_than_k():
+    """후보가 k보다 적으면 제외되지 않은 페르소나만 모두 반환."""
+    index = PersonaIndex()
+    for i in range(100):  # 초기 용량(64)을 넘겨 행렬 확장
+        index.upsert(f"p{i}", [1.0, i / 100])
+
+    top = index.top_k(index.get("p0"), k=200, exclude={f"p{i}" for i in range(3, 100)})
+
+    assert [pid for pid, _ in top] == ["p0", "p1", "p2"]
+    assert index.top_k(index.get("p0"), k=5, exclude={f"p{i}" for i in range(100)}) == []
+
+
+def test_similarities_skip_personas_without_embeddings():
+    """임베딩이 있는 페르소나에 대해서만 코사인 유사도를 반환."""
+    index = PersonaIndex()
+    index.upsert("me", [1.0, 0.0])
+    index.upsert("same", [2.0, 0.0])
+    index.upsert("orthogonal", [0.0, 1.0])
+
+    scores = index.similarities(index.get("me"), {"same", "orthogonal", "missing"})
+
+    assert scores == {"same": 1.0, "orthogonal": 0.0}
@@ -0,0 +1,52 @@
+"""Tests for prompt-prefix caching layout and cache-hit metrics."""
+
+import time
+from collections import deque
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from core import activity, graph
+from core.llm_metrics import llm_metrics, record_llm_call, reset_llm_metrics
+
+
+def test_decision_prompt_starts_with_shared_instructions():
+    """결정 프롬프트는 페르소나와 무관한 지시문이 앞에 오고 프로필은 뒤에 붙음."""
+    a = activity.DECISION_SYSTEM_PROMPT.format(**activity._profile_fields({"name": "Mina"}))
+    b = activity.DECISION_SYSTEM_PROMPT.format(**activity._profile_fields({"name": "Joon"}))
+
+    shared = len(a) - len(activity.PERSONA_PROFILE.format(**activity._profile_fields({"name": "Mina"})))
+    assert a[:shared] == b[:shared]
+    assert activity.DECISION_INSTRUCTIONS in a[:shared]
+
+
+def test_context_window_is_trimmed_in_blocks():
+    """창이 넘칠 때만 여러 개를 한 번에 덜어내서 앞부분이 턴마다 바뀌지 않음."""
+    context = deque((str(i), HumanMessage(content=str(i))) for i in range(5))
+    with patch("core.graph.CHAT_CONTEXT_MESSAGES", 4), patch("core.graph.CHAT_CONTEXT_TRIM", 2):
+        graph._trim(context)
+        assert [m.content for _, m in context] == ["3", "4"]
+
+        context.extend([("5", HumanMessage(content="5")), ("6", HumanMessage(content="6"))])
+        graph._trim(context)
+        assert [m.content for _, m in context] == ["3", "4", "5", "6"]
+
+
+def test_cache_reads_are_reported_per_tier():
+    """usage_metadata의 cache_read를 티어별 캐시 적중으로 집계."""
+    reset_llm_metrics()
+    hit = AIMessage(content="", usage_metadata={
+        "input_tokens": 2000, "output_tokens": 10, "total_tokens": 2010,
+        "input_token_details": {"cache_read": 1536},
+    })
+    miss = AIMessage(content="", usage_metadata={
+        "input_tokens": 2000, "output_tokens": 10, "total_tokens": 2010,
+    })
+    record_llm_call("chat", time.monotonic(), hit)
+    record_llm_call("chat", time.monotonic(), miss)
+
+    stats = llm_metrics()["chat"]
+    assert stats["cached_input_tokens"] == 1536
+    assert stats["cache_hit_calls"] == 1
+    assert stats["cached_input_ratio"] == 0.384
+    reset_llm_metrics()
@@ -0,0 +1,72 @@
+"""Tests for ranked feed scoring (core.ranking)."""
+
+from collections import Counter
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from core import ranking
+from core.ranking import ranked_post_ids, score_candidates
+
+NOW = 1_700_000_000.0
+
+
+def _post(post_id: str, author: str, age_hours: float, likes: int = 0, comments: int = 0) -> dict:
+    created = datetime.fromtimestamp(NOW - age_hours * 3600, tz=timezone.utc).isoformat()
+    return {
+        "id": post_id,
+        "persona_id": author,
+        "created_at": created,
+        "sns_likes": [{"count": likes}],
+        "sns_comments": [{"count": comments}],
+    }
+
+
+def _scores(posts, following=(), liked=None, similarity=None) -> dict[str, float]:
+    scores = score_candidates(
+        posts,
+        now=NOW,
+        following=set(following),
+        liked_authors=Counter(liked or {}),
+        similarity=similarity or {},
+    )
+    return {p["id"]: s for p, s in zip(posts, scores)}
+
+
+def test_recency_and_engagement():
+    """참여가 같으면 최신 포스트가, 시간이 같으면 참여가 많은 포스트가 우선."""
+    scores = _scores([
+        _post("new", "a", 1), _post("old", "a", 48),
+        _post("busy", "b", 5, likes=10, comments=2), _post("quiet", "b", 5),
+    ])
+
+    assert scores["new"] > scores["old"]
+    assert scores["busy"] > scores["quiet"]
+
+
+def test_affinity_and_similarity_boost_authors():
+    """팔로우·좋아요 이력·임베딩 유사도가 높은 작성자의 포스트가 우선."""
+    posts = [_post("followed", "f", 3), _post("liked", "l", 3),
+             _post("similar", "s", 3), _post("stranger", "x", 3)]
+    scores = _scores(posts, following={"f"}, liked={"l": 5}, similarity={"s": 0.9, "x": -0.5})
+
+    assert scores["followed"] > scores["stranger"]
+    assert scores["liked"] > scores["stranger"]
+    assert scores["similar"] > scores["stranger"]
+
+
+def test_ranked_order_is_cached_per_viewer():
+    """랭킹은 피드·뷰어별로 캐시되어 다음 페이지에서 재계산하지 않음."""
+    ranking._rankings.clear()
+    sb = MagicMock()
+    candidates = sb.table.return_value.select.return_value.order.return_value.limit.return_value
+    candidates.execute.return_value.data = [
+        _post("fresh", "a", 0), _post("popular", "b", 2, likes=50, comments=10),
+    ]
+
+    first = ranked_post_ids(sb, "all", None)
+    second = ranked_post_ids(sb, "all", None)
+
+    assert set(first) == {"fresh", "popular"}
+    assert first == second
+    assert candidates.execute.call_count == 1
+    ranking._rankings.clear()
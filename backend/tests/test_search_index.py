@@ -0,0 +1,94 @@
+"""Tests for the full-text search index (core.search_index)."""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from core import search_index
+from core.search_index import SearchIndex, analyze, apply_changes
+
+
+def _index() -> SearchIndex:
+    index = SearchIndex()
+    index.replace_all([
+        ("post", "p1", "오늘 고양이를 만났다"),
+        ("post", "p2", "고양이사진 모음"),
+        ("post", "p3", "바다에서 수영했어요"),
+        ("comment", "c1", "고양이 너무 귀여워"),
+        ("persona", "u1", "Mina 고양이를 좋아하는 사진작가"),
+    ])
+    return index
+
+
+def test_analyze_strips_particles_and_adds_bigrams():
+    """조사를 제거한 어간과 한글 바이그램을 색인어로 생성."""
+    terms = analyze("고양이를 Cats!")
+
+    assert "고양이를" in terms
+    assert "고양이" in terms  # 조사 '를' 제거
+    assert "양이" in terms  # 바이그램
+    assert "cats" in terms
+
+
+def test_search_matches_stems_across_particles():
+    """'고양이가' 검색이 '고양이를'·'고양이사진' 포스트와 매칭."""
+    ids = [doc_id for doc_id, _ in _index().search("고양이가", "post", 10)]
+
+    assert ids[0] == "p1"
+    assert "p2" in ids
+    assert "p3" not in ids
+
+
+def test_search_filters_by_kind_and_prefix():
+    """종류별로 분리 검색되고, 마지막 단어는 접두어로 확장."""
+    index = _index()
+
+    assert [d for d, _ in index.search("고양이", "comment", 10)] == ["c1"]
+    assert [d for d, _ in index.search("min", "persona", 10)] == ["u1"]
+    assert [d for d, _ in index.search("바다", "post", 10)] == ["p3"]
+
+
+def test_incremental_add_and_remove():
+    index = _index()
+
+    index.add("post", "p4", "바다 고양이")
+    assert "p4" in [d for d, _ in index.search("바다", "post", 10)]
+
+    index.remove("post", "p3")
+    index.remove("post", "p4")
+    assert index.search("바다", "post", 10) == []
+    assert len(index) == 4
+
+
+def test_apply_changes_updates_and_removes():
+    """변경 로그의 문서를 다시 색인하고, 삭제된 문서(text=None)는 제거."""
+    index = _index()
+
+    apply_changes(index, [("post", "p3", "산에 갔어요"), ("post", "p1", None)])
+
+    assert index.search("바다", "post", 10) == []
+    assert [d for d, _ in index.search("산에", "post", 10)] == ["p3"]
+    assert "p1" not in [d for d, _ in index.search("고양이", "post", 10)]
+
+
+@pytest.mark.asyncio
+async def test_first_search_loads_once_then_refresh_applies_deltas():
+    """첫 검색은 전체 적재를 한 번만 하고, 이후에는 변경분만 반영."""
+    loaded = _index()
+    with patch.object(search_index, "_index", SearchIndex()), \
+            patch.object(search_index, "_cursor", None), \
+            patch("core.search_index._load_all", return_value=(loaded, "c1")) as load_all, \
+            patch("core.search_index._fetch_changes",
+                  return_value=([("post", "p5", "바다 사진")], "c2")) as fetch:
+        first, second = await asyncio.gather(
+            search_index.search("바다", "post", 10), search_index.search("바다", "post", 10)
+        )
+        assert first == second and [d for d, _ in first] == ["p3"]
+
+        await search_index.refresh_search_index()
+
+        assert load_all.call_count == 1
+        fetch.assert_called_once_with("c1")
+        assert search_index._cursor == "c2"
+        assert {d for d, _ in await search_index.search("바다", "post", 10)} == {"p3", "p5"}
@@ -0,0 +1,182 @@
+"""Tests for streaming Storage ingest (core.storage, core.image_store)."""
+
+import hashlib
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+
+from core.image_store import release_images
+from core.storage import ImageTooLargeError, stream_url_to_storage
+
+SOURCE_URL = "https://provider.example/output.png"
+IMAGE_BYTES = b"\x89PNG" + b"x" * 200_000
+
+
+def _mock_client(uploaded: dict, body: bytes = IMAGE_BYTES):
+    """다운로드/업로드 요청을 가로채는 httpx.AsyncClient 팩토리."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, content=body)
+        data = b""
+        async for chunk in request.stream:
+            data += chunk
+        uploaded["path"] = request.url.path
+        uploaded["data"] = data
+        uploaded["headers"] = request.headers
+        return httpx.Response(200, json={"Key": "ok"})
+
+    real_client = httpx.AsyncClient
+
+    def factory(*args, **kwargs):
+        return real_client(transport=httpx.MockTransport(handler))
+
+    return factory
+
+
+@pytest.fixture(autouse=True)
+def storage_env(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "https://project.supabase.co")
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "service-key")
+
+
+@pytest.mark.asyncio
+async def test_stream_upload_with_hash():
+    """스트리밍 업로드 후 크기와 SHA-256이 원본과 일치."""
+    uploaded: dict = {}
+    with patch("core.storage.httpx.AsyncClient", _mock_client(uploaded)):
+        result = await stream_url_to_storage(
+            SOURCE_URL, "images/test.png", hash_content=True,
+        )
+
+    assert result["size"] == len(IMAGE_BYTES)
+    assert result["sha256"] == hashlib.sha256(IMAGE_BYTES).hexdigest()
+    assert uploaded["data"] == IMAGE_BYTES
+    assert uploaded["path"].endswith("/storage/v1/object/persona-images/images/test.png")
+    assert uploaded["headers"]["x-upsert"] == "false"
+
+
+@pytest.mark.asyncio
+async def test_stream_upload_without_hash():
+    """hash_content=False면 sha256은 None."""
+    uploaded: dict = {}
+    with patch("core.storage.httpx.AsyncClient", _mock_client(uploaded)):
+        result = await stream_url_to_storage(SOURCE_URL, "images/test.png")
+
+    assert result["sha256"] is None
+    assert result["size"] == len(IMAGE_BYTES)
+
+
+@pytest.mark.asyncio
+async def test_stream_upload_size_cap():
+    """크기 제한 초과 시 ImageTooLargeError."""
+    uploaded: dict = {}
+    with patch("core.storage.httpx.AsyncClient", _mock_client(uploaded)):
+        with pytest.raises(ImageTooLargeError):
+            await stream_url_to_storage(
+                SOURCE_URL, "images/test.png", max_bytes=1024,
+            )
+
+
+# --- content-addressed blob index (core.image_store) ---
+
+
+def _rpc_sb(return_values: dict):
+    """release_image_blob RPC 결과를 경로별로 돌려주는 Supabase mock."""
+    sb = MagicMock()
+
+    def rpc(name, params):
+        call = MagicMock()
+        call.execute.return_value.data = return_values[params["p_file_path"]]
+        return call
+
+    sb.rpc.side_effect = rpc
+    return sb
+
+
+def test_release_images_keeps_referenced_blobs():
+    """다른 행이 참조 중인 blob은 삭제 대상에서 제외."""
+    variants = {"sm": {"webp": "derivatives/images/a/sm.webp"}}
+    sb = _rpc_sb({"images/a.png": 1, "images/b.png": 0, "images/legacy.png": -1})
+
+    removable = release_images(sb, [
+        ("images/a.png", variants),
+        ("images/b.png", {"sm": {"webp": "derivatives/images/b/sm.webp"}}),
+        ("images/legacy.png", None),
+    ])
+
+    assert "images/a.png" not in removable
+    assert "derivatives/images/a/sm.webp" not in removable
+    assert removable == [
+        "images/b.png",
+        "derivatives/images/b/sm.webp",
+        "images/legacy.png",
+    ]
+
+
+def _store_sb(move_error: Exception | None):
+    """acquire_image_blob은 새 blob 생성, move는 move_error를 던지는 Supabase mock."""
+    sb = MagicMock()
+    sb.rpc.return_value.execute.return_value.data = [
+        {"file_path": "images/abc.png", "ref_count": 1, "variants": None, "created": True}
+    ]
+    bucket = sb.storage.from_.return_value
+    if move_error is not None:
+        bucket.move.side_effect = move_error
+    return sb, bucket
+
+
+@pytest.mark.asyncio
+async def test_store_image_conflict_keeps_existing_object():
+    """같은 주소에 이미 객체가 있으면(409) 임시 업로드만 지우고 blob 유지."""
+    from storage3.exceptions import StorageApiError
+
+    from core.image_store import store_image
+
+    sb, bucket = _store_sb(StorageApiError("The resource already exists", "Duplicate", 409))
+    stored = {"sha256": "abc", "size": 3}
+    with patch("core.image_store.get_supabase", return_value=sb), \
+            patch("core.image_store.stream_url_to_storage", AsyncMock(return_value=stored)):
+        result = await store_image(SOURCE_URL)
+
+    assert result["file_path"] == "images/abc.png"
+    bucket.remove.assert_called_once()
+    assert [c.args[0] for c in sb.rpc.call_args_list] == ["acquire_image_blob"]
+
+
+@pytest.mark.asyncio
+async def test_store_image_failed_move_releases_blob():
+    """다른 이유로 move가 실패하면 참조를 되돌리고 예외를 다시 던짐."""
+    from core.image_store import store_image
+
+    sb, bucket = _store_sb(RuntimeError("storage down"))
+    stored = {"sha256": "abc", "size": 3}
+    with patch("core.image_store.get_supabase", return_value=sb), \
+            patch("core.image_store.stream_url_to_storage", AsyncMock(return_value=stored)):
+        with pytest.raises(RuntimeError):
+            await store_image(SOURCE_URL)
+
+    assert [c.args[0] for c in sb.rpc.call_args_list] == ["acquire_image_blob", "release_image_blob"]
+    bucket.remove.assert_called_once()
+
+
+def test_acquire_existing_blob_skips_unindexed_paths():
+    """인덱스에 있는 경로만 참조를 획득하고, 없는 경로는 None."""
+    from core.image_store import acquire_existing_blob
+
+    sb = MagicMock()
+    lookup = sb.table.return_value.select.return_value.eq.return_value.limit.return_value
+    lookup.execute.return_value.data = [{"sha256": "abc", "size": 3}]
+    sb.rpc.return_value.execute.return_value.data = [
+        {"file_path": "images/abc.png", "ref_count": 2, "variants": None, "created": False}
+    ]
+    assert acquire_existing_blob(sb, "images/abc.png")["ref_count"] == 2
+    sb.rpc.assert_called_once_with(
+        "acquire_image_blob", {"p_sha256": "abc", "p_file_path": "images/abc.png", "p_size": 3},
+    )
+
+    sb.rpc.reset_mock()
+    lookup.execute.return_value.data = []
+    assert acquire_existing_blob(sb, "personas/p1/legacy.png") is None
+    sb.rpc.assert_not_called()
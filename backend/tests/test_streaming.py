@@ -0,0 +1,79 @@
+"""Tests for the coalescing WebSocket stream sender (core.streaming)."""
+
+import asyncio
+import json
+
+import pytest
+
+from core.streaming import StreamSender
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_coalesced_into_fewer_frames():
+    """짧은 윈도우 안에 도착한 청크는 한 프레임으로 합쳐 전송."""
+    frames: list[str] = []
+
+    async def send_text(text: str) -> None:
+        frames.append(json.loads(text)["content"])
+
+    sender = StreamSender(send_text, window=0.05, max_chars=1000)
+    for token in ["안", "녕", "하", "세", "요"]:
+        sender.push(token)
+    full = await sender.finish()
+
+    assert full == "안녕하세요"
+    assert frames == ["안녕하세요"]
+    assert sender.chunks == 5 and sender.frames == 1
+
+
+@pytest.mark.asyncio
+async def test_max_chars_caps_batch_size():
+    """배치가 max_chars에 도달하면 윈도우를 기다리지 않고 전송."""
+    frames: list[str] = []
+
+    async def send_text(text: str) -> None:
+        frames.append(json.loads(text)["content"])
+
+    sender = StreamSender(send_text, window=10, max_chars=4)
+    for token in ["ab", "cd"]:
+        sender.push(token)
+    await asyncio.sleep(0.01)
+    assert frames == ["abcd"]
+
+    sender.push("e")
+    assert await sender.finish() == "abcde"
+    assert frames == ["abcd", "e"]
+
+
+@pytest.mark.asyncio
+async def test_slow_client_widens_window():
+    """전송이 느리면 윈도우가 늘어나고, 빠르면 기본값으로 복귀."""
+    delay = 0.03
+
+    async def send_text(text: str) -> None:
+        await asyncio.sleep(delay)
+
+    sender = StreamSender(send_text, window=0.001, max_window=0.1, slow_send=0.01)
+    sender.push("a")
+    await asyncio.sleep(0.05)
+    assert sender.window > 0.001
+
+    delay = 0
+    for _ in range(10):
+        sender.push("b")
+        await asyncio.sleep(sender.window + 0.01)
+    assert sender.window == pytest.approx(0.001)
+    await sender.finish()
+
+
+@pytest.mark.asyncio
+async def test_send_failure_surfaces_on_push():
+    async def send_text(text: str) -> None:
+        raise ConnectionError("client gone")
+
+    sender = StreamSender(send_text, window=0)
+    sender.push("a")
+    await asyncio.sleep(0.01)
+    with pytest.raises(ConnectionError):
+        sender.push("b")
+    await sender.aclose()
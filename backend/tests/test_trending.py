@@ -0,0 +1,102 @@
+"""Tests for sliding-window trending counters (core.trending)."""
+
+from unittest.mock import MagicMock, patch
+
+from core import trending
+from core.trending import TrendingCounter
+
+NOW = 1_700_000_000.0
+
+
+def _counter() -> TrendingCounter:
+    return TrendingCounter(bucket_seconds=60, window=3600, half_life=600)
+
+
+def test_recent_engagement_outranks_older():
+    """같은 참여량이면 최근 포스트가 더 높은 점수."""
+    counter = _counter()
+    with patch("core.trending.time.time", return_value=NOW):
+        counter.record("old", 5, at=NOW - 1800)
+        counter.record("new", 5, at=NOW - 60)
+        top = counter.top(10)
+
+    assert [post_id for post_id, _ in top] == ["new", "old"]
+    assert top[0][1] > top[1][1]
+
+
+def test_engagement_outside_window_expires():
+    """윈도우를 벗어난 참여는 점수에서 제외."""
+    counter = _counter()
+    with patch("core.trending.time.time", return_value=NOW):
+        counter.record("a", 3)
+    with patch("core.trending.time.time", return_value=NOW + 3600 + 120):
+        assert counter.top(10) == []
+        counter.record("b", 1)
+        assert [post_id for post_id, _ in counter.top(10)] == ["b"]
+
+
+def test_unlike_cancels_and_exclude_filters():
+    """취소된 좋아요는 0점으로 빠지고, exclude·limit 적용."""
+    counter = _counter()
+    with patch("core.trending.time.time", return_value=NOW):
+        counter.record("a", 1)
+        counter.record("a", -1)
+        counter.record("b", 2)
+        counter.record("c", 3)
+        counter.record("d", 4)
+
+        assert [post_id for post_id, _ in counter.top(10)] == ["d", "c", "b"]
+        assert [post_id for post_id, _ in counter.top(1, exclude={"d"})] == ["c"]
+
+
+def test_unlike_never_drives_score_negative():
+    """기록보다 많이 취소돼도 0 아래로 내려가지 않고, 최신 버킷부터 차감."""
+    counter = _counter()
+    with patch("core.trending.time.time", return_value=NOW):
+        counter.record("a", 1, at=NOW - 1800)
+        counter.record("a", 1)
+        counter.record("a", -1)
+        older_only = dict(counter.top(10))["a"]
+        assert older_only < 1  # 감쇠된 예전 좋아요만 남음
+
+        counter.record("a", -1)
+        counter.record("a", -1)  # 기록되지 않은 좋아요 취소 (예: 윈도우 밖)
+        counter.record("b", 1)
+        assert [post_id for post_id, _ in counter.top(10)] == ["b"]
+        counter.record("a", 1)
+        assert dict(counter.top(10))["a"] == dict(counter.top(10))["b"]
+
+
+def test_unlike_leaves_comment_weight():
+    """좋아요 취소는 좋아요 가중치만 차감하고 댓글 가중치는 그대로."""
+    counter = _counter()
+    with patch("core.trending.time.time", return_value=NOW):
+        counter.record("a", 3, kind="comment")
+        counter.record("a", -1, kind="like")
+        assert dict(counter.top(10))["a"] > 2.9
+
+        counter.record("a", -3, kind="comment")
+        assert counter.top(10) == []
+
+
+def test_failed_warm_up_is_retried_after_backoff():
+    """적재 실패 시 부분 적재분을 버리고, 재시도 간격이 지난 뒤 다시 적재."""
+    sb = MagicMock()
+    page = sb.table.return_value.select.return_value.gte.return_value.order.return_value.range.return_value
+    page.execute.side_effect = [
+        MagicMock(data=[{"post_id": "a", "created_at": "2023-11-14T22:13:00+00:00"}]),
+        RuntimeError("db down"),
+        MagicMock(data=[{"post_id": "a", "created_at": "2023-11-14T22:13:00+00:00"}]),
+        MagicMock(data=[]),
+    ]
+    counter = _counter()
+    with patch.object(trending, "_counter", counter), \
+            patch.object(trending, "_warmed", False), \
+            patch.object(trending, "_warm_retry_at", 0.0), \
+            patch("core.trending.get_supabase", return_value=sb), \
+            patch("core.trending.time.time", return_value=NOW), \
+            patch("core.trending.time.monotonic", side_effect=[100.0, 100.0, 130.0, 200.0]):
+        assert trending.trending_posts(10) == []
+        assert trending.trending_posts(10) == []  # 재시도 대기 중
+        assert [post_id for post_id, _ in trending.trending_posts(10)] == ["a"]
+        assert trending._warmed
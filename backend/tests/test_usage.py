@@ -0,0 +1,77 @@
+"""Tests for LLM usage accounting (core.usage)."""
+
+import uuid
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from core.usage import UsageCallback, UsageRecorder, summarize_usage
+
+
+def _result(input_tokens: int, output_tokens: int, cached: int = 0) -> LLMResult:
+    message = AIMessage(content="hi", usage_metadata={
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+        "input_token_details": {"cache_read": cached},
+    })
+    return LLMResult(generations=[[ChatGeneration(message=message)]], llm_output={"model_name": "gpt-4o"})
+
+
+async def _run(callback: UsageCallback, result: LLMResult, *, stream: bool = True) -> None:
+    run_id = uuid.uuid4()
+    await callback.on_chat_model_start({}, [], run_id=run_id, invocation_params={"model": "gpt-4o"})
+    if stream:
+        await callback.on_llm_new_token("h", run_id=run_id)
+    await callback.on_llm_end(result, run_id=run_id)
+
+
+@pytest.mark.asyncio
+async def test_callback_aggregates_calls_per_persona_and_feature():
+    """같은 기간/기능/모델/페르소나 호출은 한 버킷으로 합산해 한 행으로 저장."""
+    recorder = UsageRecorder(flush_interval=60, max_unwritten=100)
+    written: list[list[dict]] = []
+
+    with patch("core.usage._recorder", recorder), \
+            patch("core.usage._write_rows", side_effect=written.append):
+        chat = UsageCallback("chat", "p1", "u1")
+        await _run(chat, _result(1000, 20, cached=768))
+        await _run(chat, _result(1200, 30))
+        await _run(UsageCallback("decision", "p1", "u1"), _result(500, 40), stream=False)
+        assert await recorder.flush() == 2
+        await recorder.stop()
+
+    rows = {row["feature"]: row for row in written[0]}
+    assert rows["chat"]["calls"] == 2
+    assert rows["chat"]["input_tokens"] == 2200
+    assert rows["chat"]["cached_tokens"] == 768
+    assert rows["chat"]["ttft_samples"] == 2
+    assert rows["chat"]["persona_id"] == "p1"
+    assert rows["decision"]["ttft_samples"] == 0  # 스트리밍이 아니면 TTFT 없음
+
+    summary = {s["feature"]: s for s in summarize_usage(written[0])}
+    assert summary["chat"]["output_tokens"] == 50
+    assert summary["decision"]["avg_ttft_ms"] is None
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_retries_same_rows():
+    """저장 실패 시 같은 id로 재시도 (upsert로 중복 저장 방지)."""
+    recorder = UsageRecorder(flush_interval=60, max_unwritten=100)
+    attempts: list[list[dict]] = []
+
+    def write(rows):
+        attempts.append(rows)
+        if len(attempts) == 1:
+            raise RuntimeError("db down")
+
+    with patch("core.usage._recorder", recorder), patch("core.usage._write_rows", side_effect=write):
+        recorder.record(feature="chat", model="gpt-4o", persona_id="p1", input_tokens=10)
+        assert await recorder.flush() == 0
+        assert await recorder.flush() == 1
+        await recorder.stop()
+
+    assert attempts[0][0]["id"] == attempts[1][0]["id"]
+    assert recorder.snapshot()["failures"] == 1
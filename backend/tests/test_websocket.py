@@ -81,3 +81,66 @@ def test_websocket_chat_streaming(client, chat_setup):
     roles = [m["role"] for m in msgs.data]
     assert "user" in roles
     assert "assistant" in roles
+
+
+def test_thread_messages_pagination(client, auth_headers, chat_setup):
+    """메시지 기록은 최신순 페이지 + before 커서, since는 이후 메시지만."""
+    sb = get_supabase()
+    thread_id = chat_setup["thread_id"]
+    sb.table("chat_messages").insert([
+        {
+            "thread_id": thread_id,
+            "role": "user",
+            "content": f"m{i}",
+            "created_at": f"2025-01-01T00:00:0{i}+00:00",
+        }
+        for i in range(5)
+    ]).execute()
+    url = f"/api/chat/thread/{thread_id}/messages"
+
+    first = client.get(url, params={"limit": 2}, headers=auth_headers).json()
+    assert [m["content"] for m in first["items"]] == ["m4", "m3"]
+    assert first["next_cursor"]
+
+    second = client.get(
+        url, params={"limit": 2, "before": first["next_cursor"]}, headers=auth_headers
+    ).json()
+    assert [m["content"] for m in second["items"]] == ["m2", "m1"]
+
+    delta = client.get(
+        url, params={"since": second["items"][0]["created_at"]}, headers=auth_headers
+    ).json()
+    assert [m["content"] for m in delta["items"]] == ["m3", "m4"]
+    assert delta["next_cursor"] is None
+
+
+def test_thread_messages_pagination_with_shared_timestamps(client, auth_headers, chat_setup):
+    """같은 created_at을 가진 메시지도 (created_at, id) 커서로 빠짐없이 페이지네이션."""
+    sb = get_supabase()
+    thread_id = chat_setup["thread_id"]
+    sb.table("chat_messages").insert([
+        {
+            "thread_id": thread_id,
+            "role": "user",
+            "content": f"m{i}",
+            "created_at": "2025-01-01T00:00:00+00:00",
+        }
+        for i in range(5)
+    ]).execute()
+    url = f"/api/chat/thread/{thread_id}/messages"
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"before": cursor} if cursor else {})}
+        page = client.get(url, params=params, headers=auth_headers).json()
+        seen += [m["content"] for m in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == [f"m{i}" for i in range(5)]
+
+    first = client.get(url, params={"limit": 2}, headers=auth_headers).json()
+    delta = client.get(
+        url, params={"since": first["next_cursor"]}, headers=auth_headers
+    ).json()
+    assert [m["content"] for m in delta["items"]] == [m["content"] for m in first["items"]][:1]
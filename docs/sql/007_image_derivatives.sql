@@ -0,0 +1,8 @@
+-- 이미지 파생본 (썸네일 WebP/AVIF) 경로
+-- 형식: {"sm": {"webp": "derivatives/...", "avif": "..."}, "md": {...}}
+
+ALTER TABLE persona_images
+ADD COLUMN variants jsonb;              -- 프로필/갤러리 이미지 썸네일 경로
+
+ALTER TABLE sns_posts
+ADD COLUMN image_variants jsonb;        -- 포스트 이미지 썸네일 경로
@@ -0,0 +1,60 @@
+-- 이미지 콘텐츠 주소 기반 중복 제거 (SHA-256 → Storage 경로 인덱스 + 참조 카운트)
+-- persona_images.file_path / sns_posts.image_file_path 가 같은 blob을 공유
+
+CREATE TABLE image_blobs (
+    sha256 text PRIMARY KEY,
+    file_path text NOT NULL UNIQUE,         -- images/{sha256}.png
+    size bigint,
+    ref_count integer NOT NULL DEFAULT 0 CHECK (ref_count >= 0),
+    variants jsonb,                         -- 썸네일 경로 (007 형식과 동일)
+    created_at timestamptz DEFAULT now()
+);
+
+-- 서비스 롤 전용 (정책 없음)
+ALTER TABLE image_blobs ENABLE ROW LEVEL SECURITY;
+
+-- 참조 획득: 없으면 생성(ref_count=1), 있으면 +1. created = 새 blob 여부
+CREATE OR REPLACE FUNCTION acquire_image_blob(p_sha256 text, p_file_path text, p_size bigint)
+RETURNS TABLE (file_path text, ref_count integer, variants jsonb, created boolean)
+LANGUAGE sql
+AS $$
+    INSERT INTO image_blobs AS b (sha256, file_path, size, ref_count)
+    VALUES (p_sha256, p_file_path, p_size, 1)
+    ON CONFLICT (sha256) DO UPDATE SET ref_count = b.ref_count + 1
+    RETURNING b.file_path, b.ref_count, b.variants, (xmax = 0) AS created;
+$$;
+
+-- 참조 해제: 남은 참조 수 반환. 0이면 인덱스에서 삭제, blob이 아닌 경로는 -1
+CREATE OR REPLACE FUNCTION release_image_blob(p_file_path text)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    remaining integer;
+BEGIN
+    UPDATE image_blobs SET ref_count = ref_count - 1
+    WHERE file_path = p_file_path
+    RETURNING ref_count INTO remaining;
+
+    IF NOT FOUND THEN
+        RETURN -1;
+    END IF;
+
+    IF remaining <= 0 THEN
+        DELETE FROM image_blobs WHERE file_path = p_file_path;
+    END IF;
+    RETURN remaining;
+END;
+$$;
+
+-- 기존 이미지 backfill: 이 마이그레이션 이전에 저장된 경로도 참조 카운트 대상으로 등록.
+-- 해시를 모르는 객체라 sha256 자리에 'legacy:' || 경로를 키로 사용 (새 업로드와 겹치지 않음)
+INSERT INTO image_blobs (sha256, file_path, ref_count, variants)
+SELECT 'legacy:' || file_path, file_path, count(*), (array_agg(variants) FILTER (WHERE variants IS NOT NULL))[1]
+FROM (
+    SELECT file_path, variants FROM persona_images
+    UNION ALL
+    SELECT image_file_path, image_variants FROM sns_posts WHERE image_file_path IS NOT NULL
+) refs
+GROUP BY file_path
+ON CONFLICT (file_path) DO NOTHING;
@@ -0,0 +1,6 @@
+-- 포스트 이미지 지연 생성 상태
+-- 스케줄/자동 활동은 텍스트로 먼저 게시 후 이미지 워커가 이미지를 첨부
+
+ALTER TABLE sns_posts
+ADD COLUMN image_status text            -- NULL: 이미지 없음/즉시 생성
+    CHECK (image_status IN ('pending', 'ready', 'failed'));
@@ -0,0 +1,13 @@
+-- 페르소나 임베딩 (personality + background)
+-- 페르소나 생성/수정 시 계산, 서버 메모리 인덱스로 로드해 팔로우 후보 검색에 사용
+
+CREATE TABLE persona_embeddings (
+    persona_id uuid PRIMARY KEY REFERENCES personas(id) ON DELETE CASCADE,
+    model text NOT NULL,                    -- 임베딩 모델 (예: text-embedding-3-small)
+    embedding real[] NOT NULL,              -- L2 정규화된 벡터
+    source_hash text NOT NULL,              -- 임베딩한 텍스트의 SHA-256 (변경 시에만 재계산)
+    updated_at timestamptz DEFAULT now()
+);
+
+-- 서비스 롤 전용 (정책 없음)
+ALTER TABLE persona_embeddings ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,11 @@
+-- 팔로우 추천 (친구의 친구, 주기적 배치 작업이 계산)
+-- 페르소나당 한 행: 상위 N개 후보를 점수 순으로 저장
+
+CREATE TABLE follow_suggestions (
+    persona_id uuid PRIMARY KEY REFERENCES personas(id) ON DELETE CASCADE,
+    suggestions jsonb NOT NULL DEFAULT '[]',  -- [{"id": uuid, "score": float}, ...] 점수 내림차순
+    computed_at timestamptz DEFAULT now()
+);
+
+-- 서비스 롤 전용 (정책 없음)
+ALTER TABLE follow_suggestions ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,12 @@
+-- 채팅 메시지 write-behind 저장 (배치 upsert의 멱등 키)
+-- 같은 스레드에서 클라이언트 메시지 id가 같으면 재전송/재시도되어도 한 번만 저장.
+-- id는 클라이언트가 정하므로 스레드 단위로만 유일 (다른 스레드/유저의 같은 id와 충돌하지 않음)
+
+ALTER TABLE chat_messages ADD COLUMN client_message_id text;
+
+-- 기존 행은 NULL (UNIQUE는 NULL 중복 허용)
+ALTER TABLE chat_messages
+    ADD CONSTRAINT chat_messages_thread_client_message_id_key UNIQUE (thread_id, client_message_id);
+
+-- 스레드별 시간순 조회
+CREATE INDEX idx_chat_messages_thread_created ON chat_messages(thread_id, created_at);
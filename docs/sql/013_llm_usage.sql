@@ -0,0 +1,28 @@
+-- LLM 사용량 집계 (core/usage.py가 기간 버킷 단위로 기록)
+-- 기능(chat/decision/compose/decision_batch/persona_gen) × 모델 × 페르소나 × 유저
+-- 회계 기록이라 persona_id/user_id에 FK 없음: 페르소나/유저가 삭제돼도 비용 이력은 남고,
+-- 삭제 직후 남은 버킷이 배치 저장 전체를 실패시키지 않음
+
+CREATE TABLE llm_usage (
+    id uuid PRIMARY KEY,                    -- 서버에서 생성 (재시도 시 중복 저장 방지)
+    period_start timestamptz NOT NULL,      -- 버킷 시작 시각 (USAGE_BUCKET_SECONDS 단위)
+    feature text NOT NULL,
+    model text NOT NULL,
+    persona_id uuid,                        -- 배치 결정/페르소나 생성은 NULL
+    user_id uuid,                           -- 배치 결정은 NULL
+    calls integer NOT NULL DEFAULT 0,
+    errors integer NOT NULL DEFAULT 0,
+    input_tokens bigint NOT NULL DEFAULT 0,
+    output_tokens bigint NOT NULL DEFAULT 0,
+    cached_tokens bigint NOT NULL DEFAULT 0,   -- input_tokens 중 프롬프트 캐시 적중분
+    latency_ms_total bigint NOT NULL DEFAULT 0,
+    latency_ms_max integer NOT NULL DEFAULT 0,
+    ttft_ms_total bigint NOT NULL DEFAULT 0,   -- 첫 토큰까지 시간 (스트리밍 호출만)
+    ttft_samples integer NOT NULL DEFAULT 0
+);
+
+CREATE INDEX idx_llm_usage_persona_period ON llm_usage(persona_id, period_start);
+CREATE INDEX idx_llm_usage_user_period ON llm_usage(user_id, period_start);
+
+-- 서비스 롤 전용 (정책 없음)
+ALTER TABLE llm_usage ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,43 @@
+-- 검색 인덱스 변경 로그 (core/search_index.py가 주기적으로 읽어 증분 반영)
+-- 포스트/댓글/페르소나의 검색 대상 컬럼이 바뀌면 트리거가 한 행씩 기록
+-- 워커마다 인덱스를 전체 재적재하지 않고 changed_at 이후 변경분만 가져감
+
+CREATE TABLE search_changes (
+    id bigserial PRIMARY KEY,
+    kind text NOT NULL,                     -- post | comment | persona
+    doc_id uuid NOT NULL,
+    deleted boolean NOT NULL DEFAULT false,
+    changed_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX idx_search_changes_changed_at ON search_changes(changed_at);
+
+-- 서비스 롤 전용 (정책 없음)
+ALTER TABLE search_changes ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION log_search_change()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO search_changes (kind, doc_id, deleted) VALUES (TG_ARGV[0], OLD.id, true);
+        RETURN OLD;
+    END IF;
+    INSERT INTO search_changes (kind, doc_id) VALUES (TG_ARGV[0], NEW.id);
+    RETURN NEW;
+END;
+$$;
+
+-- CASCADE 삭제(페르소나 → 포스트/댓글)도 행 단위로 기록됨
+CREATE TRIGGER sns_posts_search_change
+    AFTER INSERT OR DELETE OR UPDATE OF content ON sns_posts
+    FOR EACH ROW EXECUTE FUNCTION log_search_change('post');
+
+CREATE TRIGGER sns_comments_search_change
+    AFTER INSERT OR DELETE OR UPDATE OF content ON sns_comments
+    FOR EACH ROW EXECUTE FUNCTION log_search_change('comment');
+
+CREATE TRIGGER personas_search_change
+    AFTER INSERT OR DELETE OR UPDATE OF name, personality, background ON personas
+    FOR EACH ROW EXECUTE FUNCTION log_search_change('persona');
@@ -2,7 +2,21 @@ import { useEffect, useRef, useState } from 'react'
 import { MessageBubble } from './MessageBubble'
 import { useWebSocket } from '../hooks/useWebSocket'
 import { useI18n } from '../hooks/useI18n'
-import type { Persona } from '../types'
+import type { ChatMessagePage, Persona } from '../types'
+
+const HISTORY_PAGE_SIZE = 50
+
+async function fetchHistory(threadId: string, token: string, before?: string | null) {
+  const params = new URLSearchParams({ limit: String(HISTORY_PAGE_SIZE) })
+  if (before) params.set('before', before)
+  const res = await fetch(`/api/chat/thread/${threadId}/messages?${params}`, {
+    headers: { Authorization: `Bearer ${token}` },
+  })
+  if (!res.ok) throw new Error('Failed to load messages')
+  const page: ChatMessagePage = await res.json()
+  // 서버는 최신순 → 화면은 오래된 순
+  return { messages: [...page.items].reverse(), nextCursor: page.next_cursor }
+}
 
 interface ChatWindowProps {
   persona: Persona
@@ -14,9 +28,18 @@ export function ChatWindow({ persona, token, onBack }: ChatWindowProps) {
   const { t } = useI18n()
   const [input, setInput] = useState('')
   const [threadId, setThreadId] = useState<string | null>(null)
+  const [olderCursor, setOlderCursor] = useState<string | null>(null)
   const bottomRef = useRef<HTMLDivElement>(null)
-  const { messages, isStreaming, connect, sendMessage, disconnect, loadMessages } =
-    useWebSocket(token)
+  const {
+    messages,
+    isStreaming,
+    connect,
+    sendMessage,
+    stopGeneration,
+    disconnect,
+    loadMessages,
+    prependMessages,
+  } = useWebSocket(token)
 
   useEffect(() => {
     let cancelled = false
@@ -36,15 +59,15 @@ export function ChatWindow({ persona, token, onBack }: ChatWindowProps) {
         const data = await res.json()
         if (cancelled) return
 
-        // 이전 메시지 로딩
-        const msgRes = await fetch(`/api/chat/thread/${data.id}/messages`, {
-          headers: { Authorization: `Bearer ${token}` },
-        })
-        if (msgRes.ok) {
-          const history = await msgRes.json()
-          if (!cancelled && history.length > 0) {
-            loadMessages(history)
+        // 최근 메시지 한 페이지만 로딩 (이전 메시지는 버튼으로)
+        try {
+          const history = await fetchHistory(data.id, token)
+          if (!cancelled) {
+            loadMessages(history.messages)
+            setOlderCursor(history.nextCursor)
           }
+        } catch (err) {
+          console.error(err)
         }
         if (cancelled) return
 
@@ -63,9 +86,22 @@ export function ChatWindow({ persona, token, onBack }: ChatWindowProps) {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [persona.id, token])
 
+  // 마지막 메시지가 바뀔 때만 스크롤 (이전 메시지 로딩 시에는 유지)
+  const lastMessage = messages[messages.length - 1]
   useEffect(() => {
     bottomRef.current?.scrollIntoView({ behavior: 'smooth' })
-  }, [messages])
+  }, [lastMessage])
+
+  const loadOlder = async () => {
+    if (!threadId || !olderCursor) return
+    try {
+      const history = await fetchHistory(threadId, token, olderCursor)
+      prependMessages(history.messages)
+      setOlderCursor(history.nextCursor)
+    } catch (err) {
+      console.error(err)
+    }
+  }
 
   const handleSend = () => {
     const text = input.trim()
@@ -100,6 +136,14 @@ export function ChatWindow({ persona, token, onBack }: ChatWindowProps) {
 
       {/* Messages */}
       <div className="flex-1 overflow-y-auto bg-gray-50 p-4 space-y-3">
+        {olderCursor && (
+          <button
+            onClick={loadOlder}
+            className="block mx-auto text-xs text-gray-500 hover:text-gray-700"
+          >
+            {t('chat.loadOlder')}
+          </button>
+        )}
         {messages.map((msg, i) => (
           <MessageBubble key={i} message={msg} />
         ))}
@@ -118,13 +162,22 @@ export function ChatWindow({ persona, token, onBack }: ChatWindowProps) {
             disabled={!threadId}
             className="flex-1 px-3 py-2 border border-gray-300 rounded-md text-sm focus:outline-none focus:ring-2 focus:ring-blue-500 disabled:opacity-50"
           />
-          <button
-            onClick={handleSend}
-            disabled={isStreaming || !input.trim() || !threadId}
-            className="px-4 py-2 bg-blue-600 text-white rounded-md text-sm font-medium hover:bg-blue-700 disabled:opacity-50"
-          >
-            {t('chat.send')}
-          </button>
+          {isStreaming ? (
+            <button
+              onClick={stopGeneration}
+              className="px-4 py-2 bg-gray-600 text-white rounded-md text-sm font-medium hover:bg-gray-700"
+            >
+              {t('chat.stop')}
+            </button>
+          ) : (
+            <button
+              onClick={handleSend}
+              disabled={!input.trim() || !threadId}
+              className="px-4 py-2 bg-blue-600 text-white rounded-md text-sm font-medium hover:bg-blue-700 disabled:opacity-50"
+            >
+              {t('chat.send')}
+            </button>
+          )}
         </div>
       </div>
     </div>
@@ -87,6 +87,12 @@ export function useWebSocket(token: string | undefined) {
     []
   )
 
+  // 진행 중인 응답 생성 중단 (서버가 done 신호로 마무리)
+  const stopGeneration = useCallback(() => {
+    if (!wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) return
+    wsRef.current.send(JSON.stringify({ type: 'stop' }))
+  }, [])
+
   const disconnect = useCallback(() => {
     wsRef.current?.close()
     wsRef.current = null
@@ -96,5 +102,20 @@ export function useWebSocket(token: string | undefined) {
 
   const loadMessages = useCallback((msgs: ChatMessage[]) => setMessages(msgs), [])
 
-  return { messages, isStreaming, connect, sendMessage, disconnect, clearMessages, loadMessages }
+  const prependMessages = useCallback(
+    (msgs: ChatMessage[]) => setMessages((prev) => [...msgs, ...prev]),
+    []
+  )
+
+  return {
+    messages,
+    isStreaming,
+    connect,
+    sendMessage,
+    stopGeneration,
+    disconnect,
+    clearMessages,
+    loadMessages,
+    prependMessages,
+  }
 }
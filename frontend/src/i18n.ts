@@ -53,6 +53,8 @@ const ko = {
   'chat.placeholder': '메시지를 입력하세요...',
   'chat.connecting': '연결 중...',
   'chat.send': '전송',
+  'chat.stop': '중지',
+  'chat.loadOlder': '이전 메시지 보기',
 
   // Image
   'image.title': '프로필 이미지',
@@ -212,6 +214,8 @@ const en: Record<keyof typeof ko, string> = {
   'chat.placeholder': 'Type a message...',
   'chat.connecting': 'Connecting...',
   'chat.send': 'Send',
+  'chat.stop': 'Stop',
+  'chat.loadOlder': 'Load earlier messages',
 
   // Image
   'image.title': 'Profile Image',
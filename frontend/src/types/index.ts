@@ -27,12 +27,19 @@ export interface ChatMessage {
   id?: string
   role: 'user' | 'assistant'
   content: string
+  created_at?: string
+}
+
+export interface ChatMessagePage {
+  items: ChatMessage[]
+  next_cursor: string | null
 }
 
 export interface StreamMessage {
   type: 'stream' | 'error'
   content: string
   done?: boolean
+  stopped?: boolean
 }
 
 // --- SNS Types ---
@@ -48,6 +55,7 @@ export interface Post {
   persona_id: string
   content: string | null
   image_url: string | null
+  image_status?: 'pending' | 'ready' | 'failed' | null
   created_at: string
   persona: PostPersona
   like_count: number